@@ -6,7 +6,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from dotenv import load_dotenv
 
-db = SQLAlchemy()
+from .tenants import TenantSession, load_tenants
+
+db = SQLAlchemy(session_options={"class_": TenantSession})
 login_manager = LoginManager()
 
 
@@ -17,8 +19,6 @@ def create_app():
     base_dir = os.path.abspath(os.path.dirname(__file__))
     load_dotenv(os.path.join(base_dir, "..", ".env"))
 
-    print("Loaded .env from:", os.path.join(base_dir, "..", ".env"))
-
     app = Flask(__name__)
 
     # -------------------------
@@ -38,13 +38,103 @@ def create_app():
     admins_list = [email.strip().lower() for email in admins_raw.split(",") if email.strip()]
     app.config["ADMINS"] = admins_list
 
-    print("Super Admins:", app.config["ADMINS"])
-    print("Allowed Domain:", app.config["ALLOWED_DOMAIN"])
-
+    # Login / activity timestamps are buffered and written in batches
+    app.config["ACTIVITY_FLUSH_SECONDS"] = int(os.getenv("ACTIVITY_FLUSH_SECONDS", "30"))
+    app.config["ACTIVITY_TOUCH_SECONDS"] = int(os.getenv("ACTIVITY_TOUCH_SECONDS", "60"))
+
+    # Background scheduler (slot expiry, stats sweep); one leader across workers
+    app.config["SCHEDULER_ENABLED"] = os.getenv("SCHEDULER_ENABLED", "1") != "0"
+    app.config["SCHEDULER_TICK_SECONDS"] = int(os.getenv("SCHEDULER_TICK_SECONDS", "5"))
+
+    # Replay store for retried POST /attendance/mark (Idempotency-Key)
+    app.config["IDEMPOTENCY_TTL_SECONDS"] = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+    app.config["IDEMPOTENCY_MAX_ENTRIES"] = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+    # Offline mark queue: ticket lifetime, lateness allowed past end_time, batch size
+    app.config["OFFLINE_TICKET_MAX_AGE"] = int(os.getenv("OFFLINE_TICKET_MAX_AGE", str(24 * 3600)))
+    app.config["OFFLINE_GRACE_SECONDS"] = int(os.getenv("OFFLINE_GRACE_SECONDS", "60"))
+    app.config["OFFLINE_SYNC_MAX_MARKS"] = int(os.getenv("OFFLINE_SYNC_MAX_MARKS", "50"))
+
+    # Admission control on /attendance/mark and /attendance/sync ("count/seconds").
+    # RATELIMIT_STORAGE_URL=redis://... shares buckets across workers.
+    # The per-IP buckets (*_IP) are off by default: a campus behind one NAT
+    # is one address, and 300/60 would throttle every student at once. Set
+    # them only when clients have their own addresses, i.e. behind a proxy
+    # that sends X-Forwarded-For with RATELIMIT_TRUST_PROXY=1, sized for the
+    # busiest address you expect.
+    app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1") != "0"
+    app.config["RATELIMIT_STORAGE_URL"] = os.getenv("RATELIMIT_STORAGE_URL", "memory://")
+    app.config["RATELIMIT_TRUST_PROXY"] = os.getenv("RATELIMIT_TRUST_PROXY", "0") == "1"
+    app.config["RATELIMITS"] = {
+        "mark_user": os.getenv("RATELIMIT_MARK_USER", "10/60"),
+        "mark_ip": os.getenv("RATELIMIT_MARK_IP", ""),
+        "mark_slot": os.getenv("RATELIMIT_MARK_SLOT", "1200/60"),
+        "pin_user": os.getenv("RATELIMIT_PIN_USER", "5/300"),
+        "pin_ip": os.getenv("RATELIMIT_PIN_IP", ""),
+        "sync_user": os.getenv("RATELIMIT_SYNC_USER", "6/60"),
+        "sync_ip": os.getenv("RATELIMIT_SYNC_IP", ""),
+    }
+
+    # Where archived terms are written (gzip'd JSON lines)
+    app.config["ARCHIVE_DIR"] = os.getenv("ARCHIVE_DIR", os.path.join(app.instance_path, "archive"))
+
+    # Optional append-only event log for marks (group-commit fsync, async projection).
+    # EVENT_LOG_PROJECTOR=inline runs the projector as a scheduler job; "external"
+    # leaves it to projector.py.
+    app.config["EVENT_LOG_ENABLED"] = os.getenv("EVENT_LOG_ENABLED", "0") == "1"
+    app.config["EVENT_LOG_DIR"] = os.getenv("EVENT_LOG_DIR", os.path.join(app.instance_path, "eventlog"))
+    app.config["EVENT_LOG_SEGMENT_BYTES"] = int(os.getenv("EVENT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+    app.config["EVENT_LOG_GROUP_COMMIT_MS"] = float(os.getenv("EVENT_LOG_GROUP_COMMIT_MS", "2"))
+    app.config["EVENT_LOG_PROJECTOR"] = os.getenv("EVENT_LOG_PROJECTOR", "inline")
+
+    # Room stats sweep for slots missed by the close-time update
+    app.config["STATS_SWEEP_SECONDS"] = int(os.getenv("STATS_SWEEP_SECONDS", "60"))
+
+    # Tagged read cache. memory:// is per worker (TTLs bound staleness across
+    # workers); unix:///path/cache.sock shares one store run by cache_server.py.
+    app.config["CACHE_ENABLED"] = os.getenv("CACHE_ENABLED", "1") != "0"
+    app.config["CACHE_URL"] = os.getenv("CACHE_URL", "memory://")
+    app.config["CACHE_MAX_ENTRIES"] = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+    app.config["DASHBOARD_CACHE_SECONDS"] = int(os.getenv("DASHBOARD_CACHE_SECONDS", "30"))
+    app.config["ACTIVE_SLOT_CACHE_SECONDS"] = int(os.getenv("ACTIVE_SLOT_CACHE_SECONDS", "5"))
+
+    # Presence bitmaps (app.presence): "auto" uses them only with a shared cache
+    # (CACHE_URL=unix://...), "1" also with the per-process one (single worker)
+    app.config["PRESENCE_ENABLED"] = os.getenv("PRESENCE_ENABLED", "auto")
+    app.config["PRESENCE_ROSTER_SECONDS"] = int(os.getenv("PRESENCE_ROSTER_SECONDS", "600"))
+
+    # Timetable: entries are local times in TIMETABLE_TIMEZONE; their slot row is
+    # created TIMETABLE_LEAD_SECONDS early. PUBLIC_URL (e.g. https://attend.example.edu)
+    # lets the scheduler pre-render QR codes outside a request.
+    app.config["TIMETABLE_TIMEZONE"] = os.getenv("TIMETABLE_TIMEZONE", "UTC")
+    app.config["TIMETABLE_LEAD_SECONDS"] = int(os.getenv("TIMETABLE_LEAD_SECONDS", "30"))
+    app.config["PUBLIC_URL"] = os.getenv("PUBLIC_URL")
+
+    # Tenancy: TENANTS_FILE (JSON, see tenants.load_tenants) adds institutions, each
+    # with its own database, email domains and hostnames. Without it there is one
+    # tenant: DATABASE_URL + ALLOWED_DOMAIN.
+    app.config["TENANTS"] = load_tenants(os.getenv("TENANTS_FILE"))
+
+    # Static assets (build_assets.py): "missing" builds app/static/dist on boot
+    # only when there is no manifest, "always" rebuilds (development), "never" skips
+    app.config["ASSETS_BUILD"] = os.getenv("ASSETS_BUILD", "missing")
+
+    # Profiler (admin, /admin/profiler): sampling interval, longest session, and
+    # where the flamegraphs and tables are written
+    app.config["PROFILER_DIR"] = os.getenv("PROFILER_DIR", os.path.join(app.instance_path, "profiles"))
+    app.config["PROFILER_INTERVAL_MS"] = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+    app.config["PROFILER_MAX_SECONDS"] = int(os.getenv("PROFILER_MAX_SECONDS", "120"))
+
+    # Startup: "create" makes missing tables when schema_version is behind,
+    # "strict" refuses to boot, "off" skips the check (one SELECT otherwise)
+    app.config["SCHEMA_CHECK"] = os.getenv("SCHEMA_CHECK", "create")
 
     # -------------------------
     # Init extensions
     # -------------------------
+    from .tenants import init_tenants
+    init_tenants(app)
+
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
@@ -53,34 +143,61 @@ def create_app():
     # User Loader
     # -------------------------
     from .models import User
+    from .activity import tracker, init_activity
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        user = User.query.get(int(user_id))
+        if user:
+            tracker.apply_pending(user)
+        return user
+
+    init_activity(app)
+
+    from .scheduler import init_scheduler
+    from .stats import init_stats
+    init_scheduler(app)
+    init_stats(app)
+
+    from .idempotency import init_idempotency
+    from .ratelimit import init_ratelimit
+    init_idempotency(app)
+    init_ratelimit(app)
+
+    from .eventlog import init_eventlog
+    init_eventlog(app)
+
+    from .cache import init_cache
+    from .presence import init_presence
+    init_cache(app)
+    init_presence(app)
+
+    from .timetable import init_timetable
+    init_timetable(app)
+
+    from .assets import init_assets
+    init_assets(app)
+
+    from .profiler import init_profiler
+    init_profiler(app)
 
     # -------------------------
     # Register Blueprints
     # -------------------------
-    from .auth import auth_bp, init_oauth
+    from .auth import auth_bp
     from .main import main_bp
     from .admin import admin_bp
     from .teacher import teacher_bp
 
-    # VERY IMPORTANT: init OAuth after app is created
-    init_oauth(app)
-
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp, url_prefix="/admin")
     app.register_blueprint(teacher_bp, url_prefix="/teacher")
 
-    print("\n" + "="*60)
-    print("REGISTERED BLUEPRINTS:")
-    print("="*60)
-    for blueprint_name, blueprint in app.blueprints.items():
-        print(f"✓ {blueprint_name:15} -> {blueprint.url_prefix or '/'}")
-    print("="*60 + "\n")
+    app.logger.debug("Blueprints: %s", ", ".join(
+        f"{name} -> {bp.url_prefix or '/'}" for name, bp in app.blueprints.items()
+    ))
 
     # -------------------------
     # Custom Error Handlers
@@ -96,13 +213,9 @@ def create_app():
         return render_template("errors/404.html"), 404
 
     # -------------------------
-    # Create DB Tables
+    # Schema version check (replaces create_all on every boot)
     # -------------------------
-    with app.app_context():
-        try:
-            db.create_all()
-            print("Database tables checked/created.")
-        except Exception as e:
-            print("Error creating tables:", e)
+    from .startup import check_schema
+    check_schema(app)
 
     return app
\ No newline at end of file
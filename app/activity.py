@@ -0,0 +1,149 @@
+# app/activity.py
+
+import atexit
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import g
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import db
+from .models import User
+from .tenants import current_tenant, tenant_context
+
+
+class ActivityTracker:
+    """
+    Buffers users.last_login / users.last_active_at in memory and writes
+    them back in one batched UPDATE every few seconds, so a login burst
+    does not turn into one commit per user.
+    """
+
+    def __init__(self):
+        self._pending = {}          # (tenant, user_id) -> {"last_login": dt, "last_active_at": dt}
+        self._lock = threading.Lock()
+        self._app = None
+        self._interval = 30
+        self._touch_every = timedelta(seconds=60)
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self._app = app
+        self._interval = app.config["ACTIVITY_FLUSH_SECONDS"]
+        self._touch_every = timedelta(seconds=app.config["ACTIVITY_TOUCH_SECONDS"])
+        atexit.register(self._flush_at_exit)
+
+    # -------------------------
+    # Recording (memory only)
+    # -------------------------
+    def record_login(self, user_id, when=None):
+        when = when or datetime.utcnow()
+        with self._lock:
+            entry = self._pending.setdefault((current_tenant(), user_id), {})
+            entry["last_login"] = when
+            entry["last_active_at"] = when
+        self._ensure_flusher()
+
+    def record_activity(self, user, when=None):
+        """Note a request from `user`; skipped if seen recently."""
+        when = when or datetime.utcnow()
+        seen = self.pending_for(user.id).get("last_active_at") or user.last_active_at
+        if seen and when - seen < self._touch_every:
+            return
+        with self._lock:
+            self._pending.setdefault((current_tenant(), user.id), {})["last_active_at"] = when
+        self._ensure_flusher()
+
+    def pending_for(self, user_id):
+        with self._lock:
+            return dict(self._pending.get((current_tenant(), user_id), {}))
+
+    def apply_pending(self, user):
+        """Overlay buffered timestamps on a loaded user without dirtying it."""
+        for key, value in self.pending_for(user.id).items():
+            set_committed_value(user, key, value)
+        return user
+
+    # -------------------------
+    # Flushing
+    # -------------------------
+    def flush(self):
+        """Write all buffered timestamps, one executemany UPDATE per tenant."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        by_tenant = {}
+        for (tenant, user_id), values in pending.items():
+            by_tenant.setdefault(tenant, []).append({"id": user_id, **values})
+
+        written, error = 0, None
+        for tenant, rows in by_tenant.items():
+            # Bulk UPDATE by primary key groups rows by their column set
+            with tenant_context(self._app, tenant):
+                try:
+                    db.session.execute(update(User), rows)
+                    db.session.commit()
+                    written += len(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    self._requeue(tenant, rows)
+                    error = e
+        if error:
+            raise error
+        return written
+
+    def _requeue(self, tenant, rows):
+        with self._lock:
+            for row in rows:
+                key = (tenant, row["id"])
+                merged = {k: v for k, v in row.items() if k != "id"}
+                merged.update(self._pending.get(key, {}))
+                self._pending[key] = merged
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork(), so restart per worker process
+        if self._thread_pid == os.getpid() or self._app is None:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="activity-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self._app.logger.warning("Activity flush failed: %s", e)
+
+    def _flush_at_exit(self):
+        if self._app is None:
+            return
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+tracker = ActivityTracker()
+
+
+def init_activity(app):
+    """Called by create_app() inside __init__.py"""
+    tracker.init_app(app)
+
+    @app.after_request
+    def touch_last_active(response):
+        # Only if the request already loaded the user; never adds a query
+        user = g.get("_login_user")
+        if user is not None and user.is_authenticated:
+            tracker.record_activity(user)
+        return response
@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from functools import wraps
-from .models import User, Room, AttendanceSlot, AttendanceRecord
+from .models import User, Room, AttendanceSlot, AttendanceRecord, Term
 from . import db
+from .cache import cached
+from datetime import datetime
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates/admin")
 
@@ -19,14 +21,21 @@ def admin_required(f):
     return wrapper
 
 
+@cached(60, tags=("users",))
+def _user_counts():
+    return (
+        User.query.count(),
+        User.query.filter_by(role="student").count(),
+        User.query.filter_by(role="teacher").count(),
+        User.query.filter_by(is_banned=True).count(),
+    )
+
+
 @admin_bp.route("/")
 @login_required
 @admin_required
 def index():
-    total_users = User.query.count()
-    total_students = User.query.filter_by(role="student").count()
-    total_teachers = User.query.filter_by(role="teacher").count()
-    banned_count = User.query.filter_by(is_banned=True).count()
+    total_users, total_students, total_teachers, banned_count = _user_counts()
     latest = User.query.order_by(User.created_at.desc()).limit(6).all()
 
     return render_template("admin/dashboard.html",
@@ -99,6 +108,149 @@ def unban(uid):
     return jsonify({"ok": True, "msg": f"{u.email} has been unbanned"})
 
 
+@admin_bp.route("/terms", methods=["GET", "POST"])
+@login_required
+@admin_required
+def terms():
+    """List terms, create new ones"""
+    if request.method == "POST":
+        name = request.form.get("name", "").strip()
+        try:
+            start = datetime.strptime(request.form.get("start_date", ""), "%Y-%m-%d")
+            end = datetime.strptime(request.form.get("end_date", ""), "%Y-%m-%d")
+        except ValueError:
+            flash("Dates must be YYYY-MM-DD", "danger")
+            return redirect(url_for("admin.terms"))
+        if not name or end <= start:
+            flash("Term needs a name and an end date after its start", "danger")
+            return redirect(url_for("admin.terms"))
+        if Term.query.filter_by(name=name).first():
+            flash("A term with that name already exists", "danger")
+            return redirect(url_for("admin.terms"))
+        db.session.add(Term(name=name, start_date=start, end_date=end))
+        db.session.commit()
+        flash(f"Term {name} created", "success")
+        return redirect(url_for("admin.terms"))
+
+    all_terms = Term.query.order_by(Term.start_date.desc()).all()
+    return render_template("admin/terms.html", terms=all_terms, now=datetime.utcnow())
+
+
+@admin_bp.route("/terms/<int:term_id>/archive", methods=["POST"])
+@login_required
+@admin_required
+def archive_term(term_id):
+    """Move a finished term's slots and records into its archive file"""
+    from .archive import archive_term as do_archive, ArchiveError
+
+    term = Term.query.get_or_404(term_id)
+    try:
+        do_archive(term)
+    except ArchiveError as e:
+        return jsonify({"ok": False, "msg": str(e)}), 400
+    return jsonify({
+        "ok": True,
+        "msg": f"Archived {term.sessions_archived} sessions and {term.records_archived} records from {term.name}"
+    })
+
+
+@admin_bp.route("/metrics")
+@login_required
+@admin_required
+def metrics():
+    """In-process counters for monitoring (per worker)"""
+    from .idempotency import store as idempotency_store
+    from .ratelimit import limiter
+    from .eventlog import event_log
+    from .cache import cache
+    from .presence import presence
+
+    return jsonify({
+        "ok": True,
+        "idempotency": idempotency_store.stats(),
+        "ratelimit": limiter.stats(),
+        "event_log": event_log.stats(),
+        "cache": cache.stats(),
+        "presence": presence.stats(),
+    })
+
+
+@admin_bp.route("/profiler")
+@login_required
+@admin_required
+def profiler_page():
+    """Sampling profiler for this worker: start/stop, download results"""
+    from .profiler import profiler
+
+    endpoints = sorted({rule.endpoint for rule in current_app.url_map.iter_rules()
+                        if rule.endpoint != "static"})
+    return render_template("admin/profiler.html", status=profiler.status(),
+                           files=profiler.files(), endpoints=endpoints,
+                           max_seconds=current_app.config["PROFILER_MAX_SECONDS"])
+
+
+@admin_bp.route("/profiler/start", methods=["POST"])
+@login_required
+@admin_required
+def profiler_start():
+    """Profile this worker for N seconds, or the next N requests to one endpoint"""
+    from .profiler import profiler
+
+    data = request.get_json(silent=True) or request.form
+    endpoint = (data.get("endpoint") or "").strip() or None
+    try:
+        seconds = int(data.get("seconds") or 0)
+        count = int(data.get("requests") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "msg": "seconds and requests must be whole numbers"}), 400
+
+    if endpoint:
+        if endpoint not in current_app.view_functions:
+            return jsonify({"ok": False, "msg": f"Unknown endpoint {endpoint}"}), 400
+        if count <= 0:
+            return jsonify({"ok": False, "msg": "Profile at least one request"}), 400
+    elif seconds <= 0:
+        return jsonify({"ok": False, "msg": "Profile for at least one second"}), 400
+
+    try:
+        status = profiler.start(seconds=seconds, endpoint=endpoint, requests=count if endpoint else None)
+    except RuntimeError as e:
+        return jsonify({"ok": False, "msg": str(e)}), 409
+
+    what = f"the next {count} requests to {endpoint}" if endpoint else f"{status['seconds_left']:.0f}s"
+    return jsonify({"ok": True, "msg": f"Profiling worker {status['pid']} for {what}", "status": status})
+
+
+@admin_bp.route("/profiler/stop", methods=["POST"])
+@login_required
+@admin_required
+def profiler_stop():
+    from .profiler import profiler
+
+    if not profiler.stop():
+        return jsonify({"ok": False, "msg": "No profiling session in this worker"}), 400
+    return jsonify({"ok": True, "msg": "Profiler stopped; results are being written"})
+
+
+@admin_bp.route("/profiler/status")
+@login_required
+@admin_required
+def profiler_status():
+    from .profiler import profiler
+
+    return jsonify({"ok": True, "status": profiler.status(), "files": profiler.files()})
+
+
+@admin_bp.route("/profiler/files/<path:name>")
+@login_required
+@admin_required
+def profiler_file(name):
+    from flask import send_from_directory
+    from .profiler import profiler
+
+    return send_from_directory(profiler.directory, name, as_attachment=not name.endswith(".svg"))
+
+
 @admin_bp.route("/route-tester")
 @login_required
 @admin_required
@@ -0,0 +1,182 @@
+# app/archive.py
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, func, insert
+
+from . import db
+from .models import (
+    AttendanceSlot, AttendanceRecord, Room, Term,
+    TermRoomSummary, TermStudentSummary,
+)
+from .tenants import tenant_dir
+
+CHUNK = 500
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir():
+    path = tenant_dir(current_app.config["ARCHIVE_DIR"])
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _term_slot_ids(term):
+    return [sid for (sid,) in db.session.query(AttendanceSlot.id).filter(
+        AttendanceSlot.start_time >= term.start_date,
+        AttendanceSlot.start_time < term.end_date,
+        AttendanceSlot.is_active == False
+    ).order_by(AttendanceSlot.id)]
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _write_archive(term, slot_ids, path):
+    """Dump the term's slots and records as gzip'd JSON lines; returns record count."""
+    records = 0
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as out:
+        out.write(json.dumps({"type": "term", "id": term.id, "name": term.name,
+                              "start": _iso(term.start_date), "end": _iso(term.end_date)}) + "\n")
+        for i in range(0, len(slot_ids), CHUNK):
+            chunk = slot_ids[i:i + CHUNK]
+            for s in db.session.query(AttendanceSlot).filter(AttendanceSlot.id.in_(chunk)).order_by(AttendanceSlot.id):
+                out.write(json.dumps({
+                    "type": "slot", "id": s.id, "room_id": s.room_id, "opened_by": s.opened_by,
+                    "start_time": _iso(s.start_time), "end_time": _iso(s.end_time),
+                    "closed_at": _iso(s.closed_at), "final_count": s.final_count,
+                    "require_pin": s.require_pin,
+                }) + "\n")
+            rows = db.session.query(
+                AttendanceRecord.id, AttendanceRecord.slot_id, AttendanceRecord.student_id,
+                AttendanceRecord.timestamp, AttendanceRecord.fingerprint_hash, AttendanceRecord.method
+            ).filter(AttendanceRecord.slot_id.in_(chunk)).order_by(AttendanceRecord.id)
+            for r in rows.yield_per(5000):
+                out.write(json.dumps({
+                    "type": "record", "id": r.id, "slot_id": r.slot_id, "student_id": r.student_id,
+                    "timestamp": _iso(r.timestamp), "fingerprint_hash": r.fingerprint_hash,
+                    "method": r.method,
+                }) + "\n")
+                records += 1
+    os.replace(tmp, path)
+    return records
+
+
+def _build_summaries(term, slot_ids):
+    room_rows = {}
+    student_rows = {}
+    for i in range(0, len(slot_ids), CHUNK):
+        chunk = slot_ids[i:i + CHUNK]
+
+        for room_id, n in db.session.query(
+            AttendanceSlot.room_id, func.count(AttendanceSlot.id)
+        ).filter(AttendanceSlot.id.in_(chunk)).group_by(AttendanceSlot.room_id):
+            room_rows.setdefault(room_id, {"term_id": term.id, "room_id": room_id, "sessions": 0, "marks": 0})
+            room_rows[room_id]["sessions"] += n
+
+        for room_id, student_id, n in db.session.query(
+            AttendanceSlot.room_id, AttendanceRecord.student_id, func.count(AttendanceRecord.id)
+        ).join(AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id).filter(
+            AttendanceRecord.slot_id.in_(chunk)
+        ).group_by(AttendanceSlot.room_id, AttendanceRecord.student_id):
+            key = (room_id, student_id)
+            student_rows.setdefault(key, {"term_id": term.id, "room_id": room_id,
+                                          "student_id": student_id, "attended": 0})
+            student_rows[key]["attended"] += n
+            room_rows[room_id]["marks"] += n
+
+    if room_rows:
+        db.session.execute(insert(TermRoomSummary), list(room_rows.values()))
+    if student_rows:
+        db.session.execute(insert(TermStudentSummary), list(student_rows.values()))
+
+
+def archive_term(term):
+    """
+    Move a finished term out of the hot tables: write its closed slots
+    and records to <ARCHIVE_DIR>/term_<id>.jsonl.gz, store per-room and
+    per-student summary rows, then delete the originals in one
+    transaction. Works the same on SQLite and Postgres.
+    """
+    if term.is_archived:
+        raise ArchiveError(f"Term {term.name} is already archived")
+    if term.end_date > datetime.utcnow():
+        raise ArchiveError(f"Term {term.name} has not ended yet")
+
+    slot_ids = _term_slot_ids(term)
+    path = os.path.join(archive_dir(), f"term_{term.id}.jsonl.gz")
+    records = _write_archive(term, slot_ids, path)
+
+    try:
+        _build_summaries(term, slot_ids)
+        for i in range(0, len(slot_ids), CHUNK):
+            chunk = slot_ids[i:i + CHUNK]
+            db.session.execute(delete(AttendanceRecord).where(AttendanceRecord.slot_id.in_(chunk)))
+            db.session.execute(delete(AttendanceSlot).where(AttendanceSlot.id.in_(chunk)))
+
+        term.archived_at = datetime.utcnow()
+        term.archive_path = path
+        term.sessions_archived = len(slot_ids)
+        term.records_archived = records
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(path)
+        raise
+
+    return term
+
+
+def read_archive(term):
+    """Iterate the archived rows of a term (dicts, as written)."""
+    with gzip.open(term.archive_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+# ---------------------------------------------------------------------
+# SUMMARY READS (historical pages)
+# ---------------------------------------------------------------------
+def archived_totals_for_student(student_id):
+    """(sessions, attended) across archived terms; sessions spans all rooms, like the live figure."""
+    attended = db.session.query(func.coalesce(func.sum(TermStudentSummary.attended), 0)).filter(
+        TermStudentSummary.student_id == student_id
+    ).scalar()
+    sessions = db.session.query(func.coalesce(func.sum(TermRoomSummary.sessions), 0)).scalar()
+    return sessions, attended
+
+
+def archived_history_for_student(student_id):
+    return db.session.query(TermStudentSummary, TermRoomSummary, Room, Term).join(
+        TermRoomSummary,
+        (TermRoomSummary.term_id == TermStudentSummary.term_id)
+        & (TermRoomSummary.room_id == TermStudentSummary.room_id)
+    ).join(Room, Room.id == TermStudentSummary.room_id).join(
+        Term, Term.id == TermStudentSummary.term_id
+    ).filter(TermStudentSummary.student_id == student_id).order_by(
+        Term.start_date.desc(), Room.name
+    ).all()
+
+
+def archived_terms_for_room(room_id):
+    return db.session.query(TermRoomSummary, Term).join(
+        Term, Term.id == TermRoomSummary.term_id
+    ).filter(TermRoomSummary.room_id == room_id).order_by(Term.start_date.desc()).all()
+
+
+def archived_totals_for_teacher(teacher_id):
+    """(sessions, marks) across archived terms for a teacher's rooms."""
+    row = db.session.query(
+        func.coalesce(func.sum(TermRoomSummary.sessions), 0),
+        func.coalesce(func.sum(TermRoomSummary.marks), 0),
+    ).join(Room, Room.id == TermRoomSummary.room_id).filter(Room.created_by == teacher_id).one()
+    return row[0], row[1]
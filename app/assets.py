@@ -0,0 +1,208 @@
+# app/assets.py
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import Blueprint, request, send_from_directory, abort
+from markupsafe import Markup
+from werkzeug.security import safe_join
+
+from . import tailwind
+
+FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "frontend")
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+# Fetched into frontend/vendor by `build_assets.py --fetch-vendor`
+VENDOR = {
+    "vendor/fp.min.js": "https://cdn.jsdelivr.net/npm/@fingerprintjs/fingerprintjs@3/dist/fp.min.js",
+}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+assets_bp = Blueprint("assets", __name__)
+
+
+# ---------------------------------------------------------------------
+# BUILD
+# ---------------------------------------------------------------------
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip() + "\n"
+
+
+def _stylesheet(template_paths):
+    """Preflight + component CSS + the utilities used by `template_paths`."""
+    found = set()
+    for path in template_paths + glob.glob(os.path.join(FRONTEND_DIR, "*.js")):
+        found |= tailwind.candidates(_read(path))
+    utilities, _ = tailwind.generate(found)
+    return _minify_css(tailwind.PREFLIGHT + _read(os.path.join(FRONTEND_DIR, "app.css")) + utilities)
+
+
+def bundles():
+    """Logical asset name -> bytes."""
+    templates = sorted(glob.glob(os.path.join(TEMPLATES_DIR, "**", "*.html"), recursive=True))
+    out = {
+        "app.css": _stylesheet(templates).encode("utf-8"),
+        # Critical CSS for the QR mark page, inlined there
+        "qr.css": _stylesheet([os.path.join(TEMPLATES_DIR, "student", "qr_mark.html")]).encode("utf-8"),
+        "app.js": _read(os.path.join(FRONTEND_DIR, "app.js")).encode("utf-8"),
+    }
+    for name in VENDOR:
+        path = os.path.join(FRONTEND_DIR, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                out[name] = f.read()
+    return out
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def build(dest):
+    """
+    Write every bundle as <name>.<hash>.<ext> plus .gz (and .br when
+    the optional `brotli` package is installed) and a manifest.json
+    mapping logical names to hashed files. Returns the manifest.
+
+    The previous build's files are kept (older ones are removed), so
+    pages rendered or cached before a deploy still load their assets.
+    """
+    os.makedirs(dest, exist_ok=True)
+    manifest_path = os.path.join(dest, "manifest.json")
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    brotli = _brotli()
+    manifest = {}
+    for name, data in bundles().items():
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{digest}{ext}"
+        path = os.path.join(dest, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[name] = hashed
+
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+
+    keep = {os.path.join(dest, hashed) for hashed in (*previous.values(), *manifest.values())}
+    for old in glob.glob(os.path.join(dest, "**", "*"), recursive=True):
+        if os.path.isfile(old) and old != manifest_path and re.sub(r"\.(gz|br)$", "", old) not in keep:
+            os.remove(old)
+    return manifest
+
+
+def fetch_vendor():
+    """Download the third-party scripts once, so pages never load them from a CDN."""
+    from urllib.request import urlopen
+
+    fetched = []
+    for name, url in VENDOR.items():
+        path = os.path.join(FRONTEND_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urlopen(url, timeout=30) as resp:
+            data = resp.read()
+        with open(path, "wb") as f:
+            f.write(data)
+        fetched.append(name)
+    return fetched
+
+
+# ---------------------------------------------------------------------
+# RUNTIME
+# ---------------------------------------------------------------------
+class Assets:
+    def __init__(self):
+        self.dest = None
+        self.manifest = {}
+        self.version = ""       # digest of the manifest, for ETags of pages that link assets
+
+    def init_app(self, app):
+        self.dest = os.path.join(app.static_folder, "dist")
+        mode = app.config["ASSETS_BUILD"]
+        manifest_path = os.path.join(self.dest, "manifest.json")
+        if mode == "always" or (mode == "missing" and not os.path.exists(manifest_path)):
+            self.manifest = build(self.dest)
+            app.logger.info("Built %d static assets into %s", len(self.manifest), self.dest)
+        elif os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        raw = json.dumps(self.manifest, sort_keys=True)
+        self.version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def url(self, name, fallback=None):
+        hashed = self.manifest.get(name)
+        if hashed:
+            return f"/assets/{hashed}"
+        if fallback:
+            return fallback
+        raise KeyError(f"Unknown asset {name!r}; run build_assets.py")
+
+    def inline(self, name):
+        """Contents of a built asset, for <style>/<script> inlining."""
+        with open(os.path.join(self.dest, self.manifest[name]), encoding="utf-8") as f:
+            return Markup(f.read())
+
+
+assets = Assets()
+
+
+@assets_bp.route("/assets/<path:filename>")
+def serve(filename):
+    """Hashed assets: immutable caching, precompressed variants when accepted."""
+    if filename.endswith((".gz", ".br")) or filename == "manifest.json":
+        abort(404)
+    path = safe_join(assets.dest, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, filename = candidate, filename + suffix
+            break
+
+    mimetype = "text/css" if path.endswith(".css") else "application/javascript" if path.endswith(".js") else None
+    resp = send_from_directory(assets.dest, filename, mimetype=mimetype, max_age=31536000)
+    resp.headers["Cache-Control"] = IMMUTABLE
+    resp.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
+
+
+def init_assets(app):
+    """Called by create_app() inside __init__.py"""
+    assets.init_app(app)
+    app.register_blueprint(assets_bp)
+    app.jinja_env.globals["asset_url"] = assets.url
+    app.jinja_env.globals["inline_asset"] = assets.inline
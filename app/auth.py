@@ -2,27 +2,77 @@
 
 from flask import Blueprint, redirect, url_for, session, request, flash, current_app, render_template
 from flask_login import login_user, logout_user, current_user
-from authlib.integrations.flask_client import OAuth
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from .models import User
+from .activity import tracker
+from .tenants import tenants, activate
 from . import db
-import requests
 from datetime import datetime
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
-oauth = OAuth()
+_oauth = None
+
+
+def google():
+    """
+    The Google OAuth client, built on first use so Authlib (and
+    requests) are only imported by workers that handle a login.
+    """
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.flask_client import OAuth
+
+        app = current_app._get_current_object()
+        oauth = OAuth(app)
+        oauth.register(
+            name="google",
+            client_id=app.config["GOOGLE_CLIENT_ID"],
+            client_secret=app.config["GOOGLE_CLIENT_SECRET"],
+            server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+            client_kwargs={"scope": "openid email profile"},
+        )
+        _oauth = oauth
+    return _oauth.google
+
+
+def get_or_create_user(email, name):
+    """
+    Return the user for `email`, creating it with a single
+    INSERT .. ON CONFLICT DO NOTHING when missing, so concurrent
+    first logins of the same account never race into two commits.
+    """
+    user = User.query.filter_by(email=email).first()
+    if user:
+        return user
+
+    now = datetime.utcnow()
+    values = dict(
+        name=name or email.split("@")[0],
+        email=email,
+        role="student",
+        is_banned=False,
+        created_at=now,
+        last_login=now,
+        last_active_at=now,
+    )
 
-def init_oauth(app):
-    """Called by create_app() inside __init__.py"""
-    oauth.init_app(app)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = pg_insert(User).values(**values).on_conflict_do_nothing(index_elements=["email"])
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(User).values(**values).on_conflict_do_nothing(index_elements=["email"])
+    else:
+        stmt = None
 
-    oauth.register(
-        name="google",
-        client_id=app.config["GOOGLE_CLIENT_ID"],
-        client_secret=app.config["GOOGLE_CLIENT_SECRET"],
-        server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
-        client_kwargs={"scope": "openid email profile"},
-    )
+    if stmt is not None:
+        db.session.execute(stmt)
+    else:
+        db.session.add(User(**values))
+    db.session.commit()
+
+    return User.query.filter_by(email=email).first()
 
 
 # -----------------------
@@ -46,7 +96,7 @@ def login_google():
     
     try:
         redirect_uri = url_for("auth.callback", _external=True)
-        return oauth.google.authorize_redirect(redirect_uri)
+        return google().authorize_redirect(redirect_uri)
     except Exception as e:
         flash(f"Login failed, please try again. Error: {e}", "danger")
         return redirect(url_for("auth.login"))
@@ -61,8 +111,8 @@ def callback():
     """Handles the Google OAuth callback"""
     try:
         # 1️⃣ Step: Exchange code for token
-        token = oauth.google.authorize_access_token()
-        client = oauth.google
+        client = google()
+        token = client.authorize_access_token()
 
         # 2️⃣ Fetch Google OpenID metadata
         metadata = client.load_server_metadata()
@@ -75,6 +125,8 @@ def callback():
             return redirect(url_for("auth.login"))
 
         # 4️⃣ Request user info
+        import requests
+
         resp = requests.get(
             userinfo_url,
             headers={"Authorization": f"Bearer {token['access_token']}"}
@@ -94,31 +146,25 @@ def callback():
             flash("Login failed, please try again.", "danger")
             return redirect(url_for("auth.login"))
 
-        # 5️⃣ Domain check
-        allowed = current_app.config.get("ALLOWED_DOMAIN")
-        if allowed and allowed.lower() != email.split("@")[-1].lower():
+        # 5️⃣ Domain check: the email domain picks the institution (tenant)
+        tenant = tenants.for_email(email)
+        host_tenant = tenants.for_host(request.host)
+        if tenant is None or (host_tenant and host_tenant != tenant):
             flash("Only institutional emails are allowed.", "danger")
             return redirect(url_for("auth.login"))
+        activate(tenant)
 
-        # 6️⃣ Check if user exists
-        user = User.query.filter_by(email=email).first()
-        if not user:
-            user = User(
-                name=name or email.split("@")[0],
-                email=email,
-                role="student"
-            )
-            db.session.add(user)
-            db.session.commit()
+        # 6️⃣ Fetch or create (one upsert for first logins)
+        user = get_or_create_user(email, name)
 
         # 7️⃣ Check if banned
         if user.is_banned:
             flash("Your account has been banned. Contact administrator.", "danger")
             return redirect("/")
 
-        # Update last login
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        # Update last login (buffered, flushed in batches)
+        tracker.record_login(user.id)
+        tracker.apply_pending(user)
 
         login_user(user)
         flash("Logged in successfully.", "success")
@@ -143,5 +189,6 @@ def callback():
 @auth_bp.route("/logout")
 def logout():
     logout_user()
+    session.pop("tenant", None)
     flash("Logged out successfully.", "success")
     return redirect("/")
\ No newline at end of file
@@ -0,0 +1,462 @@
+# app/cache.py
+
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from sqlalchemy import event
+
+from .tenants import tenant_scoped
+
+
+# ---------------------------------------------------------------------
+# BACKENDS
+# ---------------------------------------------------------------------
+class MemoryBackend:
+    """
+    LRU map of key -> (expires_at, built_at, tags, value) with a tag
+    index. A tag ending in '*' matches every tag with that prefix.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}                 # tag -> set of keys
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def get(self, key):
+        """Returns (value, built_at) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if entry[0] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[3], entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        built_at = time.time()
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (built_at + ttl, built_at, tuple(tags), value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return built_at
+
+    def invalidate(self, tags):
+        dropped = 0
+        with self._lock:
+            for tag in tags:
+                if tag.endswith("*"):
+                    matched = [t for t in self._tags if t.startswith(tag[:-1])]
+                else:
+                    matched = [tag]
+                for t in matched:
+                    for key in list(self._tags.get(t, ())):
+                        self._drop(key)
+                        dropped += 1
+        return dropped
+
+    def info(self):
+        return {"size": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions}
+
+    # Bitmaps: sets of small ints (e.g. user ids) changed in place, atomically.
+    # "complete" is False while the set only holds bits added since it was
+    # created (not yet loaded), so only a set bit is conclusive.
+    def _bitmap(self, key, ttl=None):
+        entry = self._entries.get(key)
+        if entry and entry[0] <= time.time():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            if ttl is None:
+                return None
+            now = time.time()
+            self._entries[key] = entry = (now + ttl, now, (), {"bits": bytearray(), "count": 0, "complete": False})
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        self._entries.move_to_end(key)
+        return entry[3]
+
+    @staticmethod
+    def _isset(bm, bit):
+        byte = bit >> 3
+        return byte < len(bm["bits"]) and bool(bm["bits"][byte] & (1 << (bit & 7)))
+
+    @staticmethod
+    def _setbit(bm, bit):
+        byte = bit >> 3
+        if byte >= len(bm["bits"]):
+            bm["bits"].extend(bytes(byte + 1 - len(bm["bits"])))
+        if not bm["bits"][byte] & (1 << (bit & 7)):
+            bm["bits"][byte] |= 1 << (bit & 7)
+            bm["count"] += 1
+            return True
+        return False
+
+    def bitmap_add(self, key, bit, ttl):
+        """Set `bit`; returns (was_set, complete)."""
+        with self._lock:
+            bm = self._bitmap(key, ttl)
+            return not self._setbit(bm, bit), bm["complete"]
+
+    def bitmap_test(self, key, bit):
+        """(is_set, complete), or None when there is no bitmap."""
+        with self._lock:
+            bm = self._bitmap(key)
+            return None if bm is None else (self._isset(bm, bit), bm["complete"])
+
+    def bitmap_discard(self, key, bit):
+        with self._lock:
+            bm = self._bitmap(key)
+            if bm is not None and self._isset(bm, bit):
+                bm["bits"][bit >> 3] &= ~(1 << (bit & 7))
+                bm["count"] -= 1
+
+    def bitmap_load(self, key, bits, ttl):
+        """Add every bit in `bits` and mark the bitmap complete; returns the count."""
+        with self._lock:
+            bm = self._bitmap(key, ttl)
+            for bit in bits:
+                self._setbit(bm, bit)
+            bm["complete"] = True
+            return bm["count"]
+
+    def bitmap_count(self, key):
+        """(count, complete), or None."""
+        with self._lock:
+            bm = self._bitmap(key)
+            return None if bm is None else (bm["count"], bm["complete"])
+
+    def bitmap_missing(self, key, bits):
+        """([bits of `bits` not set], complete), or None."""
+        with self._lock:
+            bm = self._bitmap(key)
+            return None if bm is None else ([b for b in bits if not self._isset(bm, b)], bm["complete"])
+
+
+def _send(sock, obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _recv(sock):
+    def exact(n):
+        buf = b""
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("cache socket closed")
+            buf += chunk
+        return buf
+
+    (length,) = struct.unpack("!I", exact(4))
+    return pickle.loads(exact(length))
+
+
+class SocketBackend:
+    """
+    Client for a MemoryBackend served on a Unix socket by
+    cache_server.py, so all workers on the host share entries and see
+    each other's invalidations. One connection per thread; any socket
+    error is raised to TaggedCache, which treats it as a miss.
+    """
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _call(self, op, *args):
+        sock = getattr(self._local, "sock", None)
+        if sock is None or getattr(self._local, "pid", None) != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock, self._local.pid = sock, os.getpid()
+        try:
+            _send(sock, (op, args))
+            ok, result = _recv(sock)
+        except Exception:
+            sock.close()
+            self._local.sock = None
+            raise
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def get(self, key):
+        return self._call("get", key)
+
+    def set(self, key, value, ttl, tags=()):
+        return self._call("set", key, value, ttl, tuple(tags))
+
+    def invalidate(self, tags):
+        return self._call("invalidate", list(tags))
+
+    def info(self):
+        return self._call("info")
+
+    def bitmap_add(self, key, bit, ttl):
+        return self._call("bitmap_add", key, bit, ttl)
+
+    def bitmap_test(self, key, bit):
+        return self._call("bitmap_test", key, bit)
+
+    def bitmap_discard(self, key, bit):
+        return self._call("bitmap_discard", key, bit)
+
+    def bitmap_load(self, key, bits, ttl):
+        return self._call("bitmap_load", key, list(bits), ttl)
+
+    def bitmap_count(self, key):
+        return self._call("bitmap_count", key)
+
+    def bitmap_missing(self, key, bits):
+        return self._call("bitmap_missing", key, list(bits))
+
+
+OPS = ("get", "set", "invalidate", "info", "bitmap_add", "bitmap_test", "bitmap_discard",
+       "bitmap_load", "bitmap_count", "bitmap_missing")
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        backend = self.server.backend
+        while True:
+            try:
+                op, args = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            if op not in OPS:
+                _send(self.request, (False, f"unknown op {op!r}"))
+                continue
+            try:
+                _send(self.request, (True, getattr(backend, op)(*args)))
+            except Exception as e:
+                _send(self.request, (False, str(e)))
+
+
+def serve(path, max_entries=50000):
+    """Run a shared MemoryBackend on a Unix socket (blocks)."""
+    if os.path.exists(path):
+        os.remove(path)
+    server = socketserver.ThreadingUnixStreamServer(path, _Handler)
+    server.daemon_threads = True
+    server.backend = MemoryBackend(max_entries)
+    # Values are pickled: only this user may connect
+    os.chmod(path, 0o600)
+    return server
+
+
+# ---------------------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------------------
+class TaggedCache:
+    """
+    Read cache with TTL, LRU eviction and tags. Tags are table names
+    (e.g. "rooms") plus finer row tags from ROW_TAGS; they are
+    invalidated automatically after a commit that wrote to them, see
+    _track_writes. Cache plain data (tuples, dicts), never ORM objects.
+
+    Hit/miss counters are per worker and keyed by namespace (the part
+    of the key before the first ':'). Keys and tags are prefixed with
+    the current tenant, so institutions never share an entry.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.enabled = True
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.errors = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.enabled = app.config["CACHE_ENABLED"]
+        url = app.config["CACHE_URL"]
+        if url.startswith("unix://"):
+            self.backend = SocketBackend(url[len("unix://"):])
+        else:
+            self.backend = MemoryBackend(app.config["CACHE_MAX_ENTRIES"])
+
+    def get_or_set(self, key, build, ttl, tags=()):
+        """Cached (value, built_at); build() runs on a miss."""
+        namespace = key.split(":", 1)[0]
+        key = tenant_scoped(key)
+        tags = [tenant_scoped(tag) for tag in tags]
+        if self.enabled:
+            try:
+                found = self.backend.get(key)
+            except Exception:
+                self.errors += 1
+                found = None
+            if found is not None:
+                self.hits[namespace] += 1
+                return found
+        self.misses[namespace] += 1
+
+        value = build()
+        built_at = time.time()
+        if self.enabled:
+            try:
+                built_at = self.backend.set(key, value, ttl, tags)
+            except Exception:
+                self.errors += 1
+        return value, built_at
+
+    def invalidate(self, *tags):
+        if not tags:
+            return
+        try:
+            self.invalidations += self.backend.invalidate([tenant_scoped(tag) for tag in tags])
+        except Exception:
+            self.errors += 1
+
+    def stats(self):
+        try:
+            backend = self.backend.info()
+        except Exception:
+            backend = None
+        namespaces = {}
+        for ns in sorted(set(self.hits) | set(self.misses)):
+            lookups = self.hits[ns] + self.misses[ns]
+            namespaces[ns] = {
+                "hits": self.hits[ns],
+                "misses": self.misses[ns],
+                "hit_ratio": round(self.hits[ns] / lookups, 3) if lookups else 0.0,
+            }
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "store": backend,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+            "namespaces": namespaces,
+        }
+
+
+cache = TaggedCache()
+
+
+def student_tag(student_id):
+    """Row tag for one student's attendance records."""
+    return f"attendance_records:student:{student_id}"
+
+
+# Finer tags than the table one, from a row's column values
+ROW_TAGS = {
+    "attendance_records": lambda get: [student_tag(get("student_id"))],
+}
+
+
+def cached(ttl, tags=()):
+    """
+    Cache a function's return value keyed on its positional args.
+    `tags` is a tuple or a callable taking the same args.
+    wrapper.uncached is the original function.
+    """
+    def decorator(f):
+        namespace = f"{f.__module__.rsplit('.', 1)[-1]}.{f.__name__}"
+
+        @wraps(f)
+        def wrapper(*args):
+            entry_tags = tags(*args) if callable(tags) else tags
+            return cache.get_or_set(f"{namespace}:{args!r}", lambda: f(*args), ttl, entry_tags)[0]
+        wrapper.uncached = f
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------
+# AFTER-COMMIT INVALIDATION
+# ---------------------------------------------------------------------
+def _row_tags(table, get):
+    tags = {table}
+    rule = ROW_TAGS.get(table)
+    if rule:
+        tags.update(rule(get))
+    return tags
+
+
+def _track_writes(session_target):
+    """
+    Collect the tags touched by each transaction (ORM flushes and
+    bulk insert/update/delete statements) and invalidate them once it
+    commits; a rollback discards them.
+    """
+    def pending(session):
+        return session.info.setdefault("cache_tags", set())
+
+    @event.listens_for(session_target, "after_flush")
+    def after_flush(session, flush_context):
+        tags = pending(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, "__tablename__", None)
+            if table:
+                tags.update(_row_tags(table, lambda attr: getattr(obj, attr, None)))
+
+    @event.listens_for(session_target, "do_orm_execute")
+    def do_orm_execute(state):
+        if not (state.is_insert or state.is_update or state.is_delete):
+            return
+        table = getattr(state.statement, "table", None)
+        if table is None:
+            return
+        tags = pending(state.session)
+        tags.add(table.name)
+        params = state.parameters
+        rows = params if isinstance(params, list) else [params] if params else []
+        if state.is_insert and rows:
+            for row in rows:
+                tags.update(_row_tags(table.name, row.get))
+        elif table.name in ROW_TAGS:
+            # Rows unknown: drop every row tag of the table
+            tags.add(f"{table.name}:*")
+
+    @event.listens_for(session_target, "after_commit")
+    def after_commit(session):
+        tags = session.info.pop("cache_tags", None)
+        if tags:
+            cache.invalidate(*tags)
+
+    @event.listens_for(session_target, "after_rollback")
+    def after_rollback(session):
+        session.info.pop("cache_tags", None)
+
+
+def init_cache(app):
+    """Called by create_app() inside __init__.py"""
+    from . import db
+
+    cache.init_app(app)
+    if not getattr(db, "_cache_tracking", False):
+        _track_writes(db.session)
+        db._cache_tracking = True
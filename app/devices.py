@@ -0,0 +1,89 @@
+# app/devices.py
+
+import hashlib
+from collections import defaultdict
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord, User
+
+
+def fingerprint_hash(fingerprint):
+    """Fixed-size (64 hex chars) digest of a browser fingerprint."""
+    if not fingerprint:
+        return None
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def used_by_other_student(slot_id, fp_hash, student_id):
+    """True if another student already marked `slot_id` from this device."""
+    if not fp_hash:
+        return False
+    return db.session.query(
+        AttendanceRecord.query.filter(
+            AttendanceRecord.slot_id == slot_id,
+            AttendanceRecord.fingerprint_hash == fp_hash,
+            AttendanceRecord.student_id != student_id
+        ).exists()
+    ).scalar()
+
+
+# ---------------------------------------------------------------------
+# OFFLINE: SHARED DEVICE CLUSTERS
+# ---------------------------------------------------------------------
+def shared_device_clusters(since=None, until=None, min_students=2):
+    """
+    Group students who marked from the same device within a date range
+    (e.g. one term). Students are linked through any shared fingerprint
+    hash, so A~B on one phone and B~C on another end up in one cluster.
+
+    Returns a list of {"students": [User], "devices": int, "marks": int},
+    largest clusters first.
+    """
+    q = db.session.query(
+        AttendanceRecord.fingerprint_hash, AttendanceRecord.student_id
+    ).filter(AttendanceRecord.fingerprint_hash.isnot(None))
+    if since or until:
+        q = q.join(AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id)
+        if since:
+            q = q.filter(AttendanceSlot.start_time >= since)
+        if until:
+            q = q.filter(AttendanceSlot.start_time < until)
+
+    # one pass over (device, student) pairs, streamed from the DB
+    students_by_device = defaultdict(set)
+    marks_by_device = defaultdict(int)
+    for fp_hash, student_id in q.yield_per(5000):
+        students_by_device[fp_hash].add(student_id)
+        marks_by_device[fp_hash] += 1
+
+    # union-find over students sharing a device
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    shared = {h: s for h, s in students_by_device.items() if len(s) > 1}
+    for students in shared.values():
+        first, *rest = students
+        for other in rest:
+            parent[find(other)] = find(first)
+
+    groups = defaultdict(lambda: {"students": set(), "devices": 0, "marks": 0})
+    for fp_hash, students in shared.items():
+        g = groups[find(next(iter(students)))]
+        g["students"] |= students
+        g["devices"] += 1
+        g["marks"] += marks_by_device[fp_hash]
+
+    clusters = [g for g in groups.values() if len(g["students"]) >= min_students]
+    clusters.sort(key=lambda g: (len(g["students"]), g["marks"]), reverse=True)
+
+    ids = {sid for g in clusters for sid in g["students"]}
+    users = {u.id: u for u in User.query.filter(User.id.in_(ids))} if ids else {}
+    for g in clusters:
+        g["students"] = sorted((users[s] for s in g["students"] if s in users), key=lambda u: u.email)
+    return clusters
@@ -0,0 +1,304 @@
+# app/eventlog.py
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, tuple_, update
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord, EventLogOffset
+from .tenants import tenant_dir
+
+
+class EventLog:
+    """
+    Optional append-only log of attendance marks (EVENT_LOG_ENABLED=1).
+
+    Each worker process appends JSON lines to its own segment files in
+    EVENT_LOG_DIR (a subdirectory per tenant, so each institution's
+    projector checkpoints against its own database). Concurrent appends are group-committed: one writer
+    thread writes everything queued so far and calls fsync once, then
+    releases all the waiting requests. A mark is acknowledged once its
+    line is on disk; the projector copies it into the tables later.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.segment_bytes = 64 * 1024 * 1024
+        self.window = 0.002
+        self._cond = threading.Condition()
+        self._buffer = []           # (directory, line)
+        self._open_batch = 1
+        self._synced_batch = 0
+        self._failed = {}           # batch -> [exception, waiters yet to raise it]
+        self._files = {}            # directory -> open segment
+        self._file_pid = None
+        self._thread_pid = None
+        self.appends = 0
+        self.fsyncs = 0
+
+    def init_app(self, app):
+        self.enabled = app.config["EVENT_LOG_ENABLED"]
+        self.directory = app.config["EVENT_LOG_DIR"]
+        self.segment_bytes = app.config["EVENT_LOG_SEGMENT_BYTES"]
+        self.window = app.config["EVENT_LOG_GROUP_COMMIT_MS"] / 1000.0
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    # -------------------------
+    # Append (request threads)
+    # -------------------------
+    def append(self, event_type, **data):
+        """Durably append one event; returns it once fsync'd."""
+        event = {"id": uuid.uuid4().hex, "type": event_type, "at": datetime.utcnow().isoformat(), **data}
+        line = json.dumps(event, default=str) + "\n"
+        directory = tenant_dir(self.directory)
+
+        self._ensure_writer()
+        with self._cond:
+            self._buffer.append((directory, line))
+            batch = self._open_batch
+            self._cond.notify_all()
+            while self._synced_batch < batch:
+                self._cond.wait(1.0)
+            # Every request in a failed batch raises, not just the first
+            failed = self._failed.get(batch)
+            if failed:
+                failed[1] -= 1
+                if not failed[1]:
+                    del self._failed[batch]
+        if failed:
+            raise failed[0]
+        return event
+
+    # -------------------------
+    # Writer thread
+    # -------------------------
+    def _ensure_writer(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="event-log", daemon=True).start()
+
+    def _segment(self, directory):
+        if self._file_pid != os.getpid():
+            self._files = {}        # inherited across fork(): the parent owns them
+            self._file_pid = os.getpid()
+        f = self._files.get(directory)
+        if f is None or f.tell() >= self.segment_bytes:
+            if f is not None:
+                f.close()
+            os.makedirs(directory, exist_ok=True)
+            name = f"{int(time.time() * 1000):013d}-{socket.gethostname()}-{os.getpid()}.log"
+            f = self._files[directory] = open(os.path.join(directory, name), "ab")
+        return f
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer:
+                    self._cond.wait()
+            # Let concurrent requests join this batch
+            if self.window:
+                time.sleep(self.window)
+            with self._cond:
+                lines, self._buffer = self._buffer, []
+                batch = self._open_batch
+                self._open_batch += 1
+
+            by_dir = {}
+            for directory, line in lines:
+                by_dir.setdefault(directory, []).append(line)
+
+            error = None
+            try:
+                for directory, chunk in by_dir.items():
+                    f = self._segment(directory)
+                    f.write("".join(chunk).encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.fsyncs += 1
+                self.appends += len(lines)
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                if error:
+                    self._failed[batch] = [error, len(lines)]
+                self._synced_batch = batch
+                self._cond.notify_all()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "appends": self.appends,
+            "fsyncs": self.fsyncs,
+            "events_per_fsync": round(self.appends / self.fsyncs, 2) if self.fsyncs else 0.0,
+        }
+
+
+event_log = EventLog()
+
+
+# ---------------------------------------------------------------------
+# PROJECTOR
+# ---------------------------------------------------------------------
+def segments(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(n for n in os.listdir(directory) if n.endswith(".log"))
+
+
+def _read_events(path, offset, max_events):
+    """Complete lines from `offset`; returns (events, new_offset)."""
+    events = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break               # still being written
+            offset += len(raw)
+            events.append(json.loads(raw))
+            if len(events) >= max_events:
+                break
+    return events, offset
+
+
+def apply_marks(events, late_marks=True):
+    """
+    Insert mark events not yet in attendance_records (keyed on
+    slot + student, so replays are harmless) and, unless `late_marks`
+    is False, update the aggregates of slots that were already
+    finalised.
+    """
+    from .slots import account_late_marks, insert_marks
+
+    marks = [e for e in events if e.get("type") == "mark"]
+    if not marks:
+        return 0
+
+    slot_ids = {e["slot_id"] for e in marks}
+    slots = {s.id: s for s in AttendanceSlot.query.filter(
+        AttendanceSlot.id.in_(slot_ids)
+    ).with_for_update()}
+
+    pairs = {(e["slot_id"], e["student_id"]) for e in marks}
+    existing = set(db.session.query(AttendanceRecord.slot_id, AttendanceRecord.student_id).filter(
+        tuple_(AttendanceRecord.slot_id, AttendanceRecord.student_id).in_(pairs)
+    ).all())
+
+    rows = []
+    for e in marks:
+        key = (e["slot_id"], e["student_id"])
+        if key in existing or e["slot_id"] not in slots:
+            continue
+        existing.add(key)
+        ts = datetime.fromisoformat(e["timestamp"])
+        rows.append({
+            "slot_id": e["slot_id"],
+            "student_id": e["student_id"],
+            "timestamp": ts,
+            "fingerprint_hash": e.get("fingerprint_hash"),
+            "method": e.get("method"),
+        })
+
+    if rows:
+        stored = insert_marks(rows)
+        if not late_marks:
+            return len(stored)
+        late = {}
+        for row in stored:
+            late.setdefault(row["slot_id"], []).append(row["timestamp"])
+        for slot_id, stamps in late.items():
+            account_late_marks(slots[slot_id], stamps)
+        rows = stored
+    return len(rows)
+
+
+def project(directory, max_events=5000, late_marks=True):
+    """
+    Apply new events from every segment. Rows and the segment offset
+    are committed together, so a crash never applies a batch twice
+    or skips one. Returns the number of events read.
+    """
+    total = 0
+    checkpoints = {c.segment: c for c in EventLogOffset.query.all()}
+    for name in segments(directory):
+        checkpoint = checkpoints.get(name)
+        offset = checkpoint.offset if checkpoint else 0
+        if offset >= os.path.getsize(os.path.join(directory, name)):
+            continue
+
+        while True:
+            events, new_offset = _read_events(os.path.join(directory, name), offset, max_events)
+            if not events:
+                break
+            apply_marks(events, late_marks)
+            if checkpoint is None:
+                checkpoint = EventLogOffset(segment=name)
+                db.session.add(checkpoint)
+            checkpoint.offset = new_offset
+            checkpoint.updated_at = datetime.utcnow()
+            db.session.commit()
+            offset = new_offset
+            total += len(events)
+    return total
+
+
+def replay(directory, max_events=5000):
+    """
+    Re-apply the whole log (rebuild / audit): delete the rows it
+    projected, forget all checkpoints and project it again without
+    late-mark accounting, then rebuild final_count and RoomStats from
+    the tables (app/rebuild.py). Returns the number of events read.
+    """
+    from .rebuild import finish, plan, run_partition
+
+    slot_ids = set()
+    for name in segments(directory):
+        path, offset = os.path.join(directory, name), 0
+        while True:
+            events, offset = _read_events(path, offset, max_events)
+            if not events:
+                break
+            pairs = {(e["slot_id"], e["student_id"]) for e in events if e.get("type") == "mark"}
+            if pairs:
+                db.session.execute(delete(AttendanceRecord).where(
+                    tuple_(AttendanceRecord.slot_id, AttendanceRecord.student_id).in_(pairs)))
+                slot_ids.update(slot_id for slot_id, _ in pairs)
+
+    # Recounted by the rebuild below, which also sets stats_applied again
+    slot_ids = sorted(slot_ids)
+    for i in range(0, len(slot_ids), max_events):
+        db.session.execute(
+            update(AttendanceSlot)
+            .where(AttendanceSlot.id.in_(slot_ids[i:i + max_events]))
+            .values(final_count=None, stats_applied=False)
+        )
+    EventLogOffset.query.delete()
+    db.session.commit()
+
+    total = project(directory, max_events, late_marks=False)
+
+    as_of = datetime.utcnow()
+    finish([run_partition(part, as_of)[0] for part in plan()], as_of)
+    return total
+
+
+def init_eventlog(app):
+    """Called by create_app() inside __init__.py"""
+    from .scheduler import scheduler
+
+    event_log.init_app(app)
+    if event_log.enabled and app.config["EVENT_LOG_PROJECTOR"] == "inline":
+        directory = app.config["EVENT_LOG_DIR"]
+        scheduler.add_job("project_events", 1, lambda: project(tenant_dir(directory)))
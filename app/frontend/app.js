@@ -0,0 +1,65 @@
+// Shared page helpers (toasts, attendance marks, offline queue)
+
+function showToast(msg, kind="info") {
+  const t = document.createElement("div");
+  t.className = "toast-item";
+  t.style.borderLeftColor = kind === "success" ? "#14B8A6" : "#EF4444";
+  t.innerText = msg;
+  document.getElementById("toast").appendChild(t);
+  setTimeout(()=> t.remove(), 5000);
+}
+
+// POST an attendance mark, retrying network failures with the same
+// Idempotency-Key so the server replays instead of re-running it
+async function postMark(payload, retries = 3) {
+  const key = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : Date.now() + "-" + Math.random().toString(16).slice(2);
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const res = await fetch("/attendance/mark", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Idempotency-Key": key },
+        body: JSON.stringify(payload)
+      });
+      if (res.status !== 409 || attempt >= retries) return res;
+    } catch (e) {
+      if (attempt >= retries) throw e;
+    }
+    await new Promise(r => setTimeout(r, 1000 * (attempt + 1)));
+  }
+}
+
+// Offline queue: marks that could not be sent are kept with their
+// signed ticket and synced in one batch once the network is back
+const MARK_QUEUE = "pendingMarks";
+
+function queueMark(ticket, fingerprint) {
+  const q = JSON.parse(localStorage.getItem(MARK_QUEUE) || "[]");
+  q.push({ ticket: ticket, fingerprint: fingerprint });
+  localStorage.setItem(MARK_QUEUE, JSON.stringify(q));
+}
+
+async function syncQueuedMarks() {
+  const q = JSON.parse(localStorage.getItem(MARK_QUEUE) || "[]");
+  if (!q.length || !navigator.onLine) return;
+  try {
+    const res = await fetch("/attendance/sync", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ marks: q })
+    });
+    if (!res.ok) return;
+    const data = await res.json();
+    localStorage.removeItem(MARK_QUEUE);
+    const saved = data.results.filter(r => r.ok).length;
+    if (saved) showToast(`Synced ${saved} queued attendance mark(s)`, "success");
+  } catch (e) {
+    // still offline; try again later
+  }
+}
+
+// Confirmation for destructive actions
+function confirmAction(message) {
+  return confirm(message);
+}
@@ -0,0 +1,171 @@
+# app/idempotency.py
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, current_app, jsonify
+
+from .tenants import current_tenant
+
+# Refusals the client is told to retry (rate limited, still in
+# progress, ...): never stored, so the retry runs for real
+RETRYABLE = {408, 409, 423, 425, 429}
+
+
+class IdempotencyStore:
+    """
+    Bounded, TTL-evicting map of (user, key) -> finished response.
+    Lives per worker process; a retry that lands on another worker
+    just runs the request again (the DB duplicate check still holds).
+    """
+
+    def __init__(self, max_entries=10000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, response tuple | None, Event)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config["IDEMPOTENCY_MAX_ENTRIES"]
+        self.ttl = app.config["IDEMPOTENCY_TTL_SECONDS"]
+
+    def _evict(self, now):
+        # Oldest first: drop expired entries, then trim to size
+        while self._entries:
+            key, (expires, _, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def begin(self, key):
+        """
+        Returns ("hit", response), ("wait", event) or ("run", None).
+        "run" reserves the key; the caller must finish() or abort() it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry:
+                _, response, done = entry
+                if response is not None:
+                    self.hits += 1
+                    return "hit", response
+                self.waits += 1
+                return "wait", done
+            self.misses += 1
+            self._entries[key] = (now + self.ttl, None, threading.Event())
+            return "run", None
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else None
+
+    def finish(self, key, response):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, response, entry[2] if entry else threading.Event())
+            self._entries[key][2].set()
+
+    def abort(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry:
+            entry[2].set()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+store = IdempotencyStore()
+
+
+def _client_key():
+    """
+    The store key for this request, None when it carries no
+    Idempotency-Key; ValueError when the key is not a short string.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key and request.is_json:
+        data = request.get_json(silent=True)
+        key = data.get("idempotency_key") if isinstance(data, dict) else None
+    if key is None or key == "":
+        return None
+    if not isinstance(key, str) or len(key) > 100:
+        raise ValueError("Idempotency-Key must be a string of at most 100 characters")
+    # Scope to the logged-in user from the session cookie (no DB load)
+    return (session.get("_user_id"), current_tenant(), request.endpoint, key)
+
+
+def _replay(response):
+    body, status, mimetype = response
+    resp = current_app.response_class(body, status=status, mimetype=mimetype)
+    resp.headers["Idempotent-Replay"] = "true"
+    return resp
+
+
+def idempotent(f):
+    """
+    Replay the stored response when a request repeats an Idempotency-Key.
+    Put it above @rate_limited (and @login_required), so a replay is not
+    charged again; it only reads the session cookie, and requests
+    without a logged-in session are never stored.
+    Only final outcomes are stored: errors (5xx) and RETRYABLE refusals
+    run again when the client retries with the same key.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            key = _client_key()
+        except ValueError as e:
+            return jsonify({"ok": False, "msg": str(e)}), 400
+        if key is None or key[0] is None:
+            return f(*args, **kwargs)
+
+        state, value = store.begin(key)
+        if state == "hit":
+            return _replay(value)
+        if state == "wait":
+            # First attempt still running: wait for its result
+            value.wait(timeout=10)
+            response = store.lookup(key)
+            if response is not None:
+                return _replay(response)
+            return jsonify({"ok": False, "msg": "Request in progress, retry"}), 409
+
+        try:
+            resp = current_app.make_response(f(*args, **kwargs))
+        except Exception:
+            store.abort(key)
+            raise
+
+        if resp.status_code < 500 and resp.status_code not in RETRYABLE and not resp.is_streamed:
+            store.finish(key, (resp.get_data(), resp.status_code, resp.mimetype))
+        else:
+            store.abort(key)
+        return resp
+    return wrapper
+
+
+def init_idempotency(app):
+    """Called by create_app() inside __init__.py"""
+    store.init_app(app)
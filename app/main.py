@@ -1,10 +1,23 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, session
 from flask_login import login_required, current_user
 from .models import Room, AttendanceSlot, AttendanceRecord, User
 from . import db
-from datetime import datetime
-import qrcode
-import io
+from . import stats
+from .slots import find_markable_slot, qr_png
+from .idempotency import idempotent
+from .ratelimit import rate_limited
+from .offline import issue_ticket, sync_marks
+from .eventlog import event_log
+from .devices import fingerprint_hash, used_by_other_student
+from .archive import archived_totals_for_student, archived_history_for_student, archived_terms_for_room
+from .queries import sessions_with_counts, session_summaries, enrolled_students, history_page, active_sessions
+from .cache import cache, student_tag
+from .presence import presence
+from .assets import assets
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
+import hashlib
+import json
 
 main_bp = Blueprint("main", __name__)
 
@@ -32,32 +45,87 @@ def dashboard():
     elif current_user.role == "admin":
         return redirect(url_for("admin.index"))
     
-    # Student Dashboard
-    now = datetime.utcnow()
+    # Student Dashboard: served from the cached summary, revalidated by ETag
+    # (with the asset build, so a deploy never revives links to old assets)
+    summary, built_at = _student_summary(current_user.id)
+    etag = _summary_etag(summary, current_user.name, assets.version)
+    if request.if_none_match.contains(etag) and not session.get("_flashes"):
+        return _not_modified(etag)
 
-    active = AttendanceSlot.query.filter(
-        AttendanceSlot.is_active == True,
-        AttendanceSlot.start_time <= now,
-        AttendanceSlot.end_time >= now
-    ).order_by(AttendanceSlot.start_time.desc()).first()
+    resp = current_app.make_response(render_template("student/dashboard.html", user=current_user, **summary))
+    return _revalidate(resp, etag, built_at)
 
-    # student stats
-    total_sessions = AttendanceSlot.query.count()
-    attended_count = AttendanceRecord.query.filter_by(student_id=current_user.id).count()
 
-    attendance_rate = round((attended_count / total_sessions) * 100, 1) if total_sessions else 0
+@main_bp.route("/dashboard/active.json")
+@login_required
+def dashboard_active():
+    """Cheap poll target: which sessions are open right now? (cached, ETag'd)"""
+    active, built_at = active_sessions()
+    body = {"ok": True, "active": [{
+        "id": s["id"],
+        "room": s["room_name"],
+        "ends_at": s["end_time"].isoformat(),
+        "require_pin": s["require_pin"],
+    } for s in active]}
+    etag = _summary_etag(body)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    return _revalidate(jsonify(body), etag, built_at)
+
+
+def _student_summary(student_id):
+    """Everything the student dashboard shows, built from cached parts."""
+    ttl = current_app.config["DASHBOARD_CACHE_SECONDS"]
+
+    def build_shared():
+        rooms = db.session.query(Room.id, Room.name, User.name).outerjoin(
+            User, User.id == Room.created_by
+        ).order_by(Room.id).all()
+        return {
+            "live_sessions": AttendanceSlot.query.count(),
+            "rooms": [{"id": rid, "name": name, "creator_name": creator} for rid, name, creator in rooms],
+        }
+
+    def build_student():
+        archived_sessions, archived_attended = archived_totals_for_student(student_id)
+        live_attended = AttendanceRecord.query.filter_by(student_id=student_id).count()
+        return {"archived_sessions": archived_sessions, "attended": live_attended + archived_attended}
+
+    active, active_at = active_sessions()
+    shared, shared_at = cache.get_or_set("dashboard.shared", build_shared, ttl,
+                                         tags=("attendance_slots", "rooms", "users"))
+    mine, mine_at = cache.get_or_set(f"dashboard.student:{student_id}", build_student, ttl,
+                                     tags=(student_tag(student_id), "term_student_summaries", "term_room_summaries"))
+
+    total_sessions = shared["live_sessions"] + mine["archived_sessions"]
+    attended = mine["attended"]
+    summary = {
+        "active": active,
+        "total_sessions": total_sessions,
+        "attended": attended,
+        "attendance_rate": round((attended / total_sessions) * 100, 1) if total_sessions else 0,
+        "rooms": shared["rooms"],
+    }
+    return summary, max(active_at, shared_at, mine_at)
 
-    rooms = Room.query.all()
 
-    return render_template(
-        "student/dashboard.html",
-        user=current_user,
-        active=active,
-        total_sessions=total_sessions,
-        attended=attended_count,
-        attendance_rate=attendance_rate,
-        rooms=rooms
-    )
+def _summary_etag(*parts):
+    raw = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _revalidate(resp, etag, built_at):
+    resp.set_etag(etag)
+    resp.last_modified = datetime.fromtimestamp(built_at, timezone.utc)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def _not_modified(etag):
+    resp = current_app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
 
 # ---------------------------------------------------------------------
@@ -78,45 +146,64 @@ def account():
 def room_detail(room_id):
     """Show room details and past sessions"""
     room = Room.query.get_or_404(room_id)
-    sessions = AttendanceSlot.query.filter_by(room_id=room_id).order_by(
+    page = request.args.get("page", 1, type=int)
+
+    slot_query = AttendanceSlot.query.filter_by(room_id=room_id)
+    pagination = sessions_with_counts(slot_query).order_by(
         AttendanceSlot.start_time.desc()
-    ).limit(20).all()
+    ).paginate(page=page, per_page=20, error_out=False)
+
+    sessions = session_summaries(pagination.items, enrolled_students())
+    room_stats = stats.room_summary(room_id)
+    archived = archived_terms_for_room(room_id)
     
-    return render_template("room_detail.html", room=room, sessions=sessions)
+    return render_template(
+        "room_detail.html",
+        room=room,
+        sessions=sessions,
+        pagination=pagination,
+        room_stats=room_stats,
+        archived=archived
+    )
 
 
 # ---------------------------------------------------------------------
 # STUDENT: MARK ATTENDANCE
 # ---------------------------------------------------------------------
 @main_bp.route("/attendance/mark", methods=["POST"])
+@idempotent
+@rate_limited("mark")
 @login_required
 def mark_attendance():
     """
     Expect JSON:
     {
         fingerprint: <visitorId>,
+        slot_id: <slot being marked; required unless a PIN is given>,
         pin: <optional>,
         qr_token: <optional>,
         method: "pin" | "qr"
     }
+    Retries carrying the same Idempotency-Key header get the first response back.
     """
     # Check if user is banned
     if current_user.is_banned:
         return jsonify({"ok": False, "msg": "Your account is banned"}), 403
     
-    data = request.get_json() or {}
+    data = request.get_json()
+    if not isinstance(data, dict):
+        data = {}
     fingerprint = data.get("fingerprint")
     method = data.get("method", "pin")
     now = datetime.utcnow()
 
-    # active slot lookup
-    slot = AttendanceSlot.query.filter(
-        AttendanceSlot.is_active == True,
-        AttendanceSlot.start_time <= now,
-        AttendanceSlot.end_time >= now
-    ).order_by(AttendanceSlot.start_time.desc()).first()
+    # slot lookup: primary key when the client knows the slot,
+    # otherwise the indexed PIN -> active slot lookup
+    slot = find_markable_slot(data.get("slot_id"), data.get("pin"), now)
 
     if not slot:
+        if data.get("pin") and not data.get("slot_id"):
+            return jsonify({"ok": False, "msg": "Invalid PIN"}), 403
         return jsonify({"ok": False, "msg": "No active session"}), 400
 
     # PIN Method
@@ -131,11 +218,18 @@ def mark_attendance():
         if not token or token != slot.qr_token:
             return jsonify({"ok": False, "msg": "Invalid QR token"}), 403
 
-    # Check duplicate
-    exists = AttendanceRecord.query.filter_by(slot_id=slot.id, student_id=current_user.id).first()
+    # Check duplicate: the slot's presence bitmap, else the database
+    exists = presence.contains(slot, current_user.id)
+    if exists is None:
+        exists = AttendanceRecord.query.filter_by(slot_id=slot.id, student_id=current_user.id).first()
     if exists:
         return jsonify({"ok": False, "msg": "Already marked"}), 200
 
+    # One device marking for several students in the same slot
+    fp_hash = fingerprint_hash(fingerprint)
+    if used_by_other_student(slot.id, fp_hash, current_user.id):
+        return jsonify({"ok": False, "msg": "This device was already used by another student"}), 403
+
     # Fingerprint check
     if current_user.device_fingerprint:
         if fingerprint and fingerprint != current_user.device_fingerprint:
@@ -146,31 +240,92 @@ def mark_attendance():
             current_user.device_fingerprint = fingerprint
             db.session.add(current_user)
 
-    # Save attendance
-    rec = AttendanceRecord(
-        slot_id=slot.id,
-        student_id=current_user.id,
-        timestamp=now,
-        fingerprint=fingerprint,
-        method=method
-    )
-    db.session.add(rec)
-    db.session.commit()
+    # Claim the student's bit; of two concurrent requests only one gets it
+    if presence.add(slot, current_user.id) is False:
+        return jsonify({"ok": False, "msg": "Already marked"}), 200
+
+    try:
+        # Event-log mode: acknowledge once the mark is durably appended;
+        # the projector writes the AttendanceRecord row
+        if event_log.enabled:
+            if db.session.dirty:
+                db.session.commit()         # first-mark device fingerprint
+            event_log.append(
+                "mark",
+                slot_id=slot.id,
+                student_id=current_user.id,
+                timestamp=now.isoformat(),
+                fingerprint_hash=fp_hash,
+                method=method
+            )
+            return jsonify({"ok": True, "msg": "Attendance recorded", "timestamp": now.isoformat()})
+
+        # Save attendance
+        rec = AttendanceRecord(
+            slot_id=slot.id,
+            student_id=current_user.id,
+            timestamp=now,
+            fingerprint_hash=fp_hash,
+            method=method
+        )
+        db.session.add(rec)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request stored this student's mark first
+        db.session.rollback()
+        return jsonify({"ok": False, "msg": "Already marked"}), 200
+    except Exception:
+        presence.discard(slot, current_user.id)
+        raise
 
     return jsonify({"ok": True, "msg": "Attendance recorded", "timestamp": rec.timestamp.isoformat()})
 
 
+# ---------------------------------------------------------------------
+# STUDENT: SYNC QUEUED (OFFLINE) MARKS
+# ---------------------------------------------------------------------
+@main_bp.route("/attendance/sync", methods=["POST"])
+@idempotent
+@rate_limited("sync")
+@login_required
+def sync_attendance():
+    """
+    Expect JSON:
+    {
+        marks: [{ticket: <signed ticket from the QR page>, fingerprint: <visitorId>}, ...]
+    }
+    Marks are checked against the slot's original time window.
+    """
+    if current_user.is_banned:
+        return jsonify({"ok": False, "msg": "Your account is banned"}), 403
+
+    data = request.get_json()
+    marks = (data.get("marks") or []) if isinstance(data, dict) else None
+    if not isinstance(marks, list):
+        return jsonify({"ok": False, "msg": "marks must be a list"}), 400
+
+    limit = current_app.config["OFFLINE_SYNC_MAX_MARKS"]
+    if len(marks) > limit:
+        return jsonify({"ok": False, "msg": f"At most {limit} marks per request"}), 400
+
+    results = sync_marks(current_user, marks)
+    return jsonify({"ok": True, "results": results})
+
+
 # ---------------------------------------------------------------------
 # STUDENT: ATTENDANCE HISTORY
 # ---------------------------------------------------------------------
 @main_bp.route("/attendance/history")
 @login_required
 def history():
-    records = AttendanceRecord.query.filter_by(
-        student_id=current_user.id
-    ).order_by(AttendanceRecord.timestamp.desc()).all()
+    page = request.args.get("page", 1, type=int)
+    pagination = history_page(current_user.id, page)
+
+    # Older terms only exist as summary rows
+    archived = archived_history_for_student(current_user.id)
 
-    return render_template("student/history.html", records=records)
+    return render_template("student/history.html", records=pagination.items,
+                           pagination=pagination, archived=archived)
 
 
 # ---------------------------------------------------------------------
@@ -198,12 +353,8 @@ def slot_qr(slot_id):
         _external=True
     )
 
-    img = qrcode.make(qr_url)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-
-    return current_app.response_class(buf.getvalue(), mimetype="image/png")
+    # Rendered once per URL (pre-rendered for timetable slots)
+    return current_app.response_class(qr_png(qr_url), mimetype="image/png")
 
 
 # ---------------------------------------------------------------------
@@ -219,4 +370,9 @@ def qr_mark():
     slot_id = request.args.get("slot_id")
     token = request.args.get("token")
 
-    return render_template("student/qr_mark.html", slot_id=slot_id, token=token)
\ No newline at end of file
+    # Signed now, so the mark can be queued and synced if the network fails
+    ticket = None
+    if slot_id and slot_id.isdigit() and token:
+        ticket = issue_ticket(slot_id, token, current_user.id)
+
+    return render_template("student/qr_mark.html", slot_id=slot_id, token=token, ticket=ticket)
\ No newline at end of file
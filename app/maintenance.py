@@ -0,0 +1,370 @@
+# app/maintenance.py
+"""
+Database maintenance for production (fix_database.py menu): size
+reports, index health against the hot queries, VACUUM/ANALYZE,
+integrity checks and online index builds. Works on SQLite and
+Postgres; every function uses the current tenant's database.
+"""
+
+import json
+import re
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord, Room, User
+
+# Tables whose size grows with the term; a full scan of these is a regression
+LARGE_TABLES = {"attendance_records", "attendance_slots", "users"}
+
+
+def dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _autocommit():
+    """A connection outside any transaction (VACUUM, CREATE INDEX CONCURRENTLY)."""
+    return db.session.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+# ---------------------------------------------------------------------
+# PLANS
+# ---------------------------------------------------------------------
+def explain(conn, statement, parameters):
+    """Plan text lines and the large tables it scans in full."""
+    name = conn.dialect.name
+    if name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        lines = [row[-1] for row in rows]
+        scans = set()
+        for line in lines:
+            # Walking a partial index only visits the rows it holds (open slots, pending ones)
+            m = re.match(r"SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", line)
+            if m and m.group(1) in LARGE_TABLES and m.group(2) not in partial_indexes():
+                scans.add(m.group(1))
+        return lines, scans
+
+    if name == "postgresql":
+        # enable_seqscan=off: a Seq Scan left in the plan means no usable index exists
+        with conn.begin_nested():
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        lines, scans = [], set()
+
+        def walk(node, depth):
+            relation = node.get("Relation Name")
+            lines.append("  " * depth + node["Node Type"] + (f" on {relation}" if relation else "")
+                         + (f" using {node['Index Name']}" if node.get("Index Name") else ""))
+            if node["Node Type"] == "Seq Scan" and relation in LARGE_TABLES:
+                scans.add(relation)
+            for child in node.get("Plans", ()):
+                walk(child, depth + 1)
+
+        walk(plan[0]["Plan"], 0)
+        return lines, scans
+
+    return [f"(EXPLAIN not supported on {name})"], set()
+
+
+def hot_queries():
+    """The statements behind the busiest pages and jobs, with placeholder ids."""
+    now = datetime.utcnow()
+    teacher = db.aliased(User)
+    return {
+        "mark: duplicate check": select(AttendanceRecord.id).where(
+            AttendanceRecord.slot_id == 1, AttendanceRecord.student_id == 1).limit(1),
+        "mark: shared device check": select(func.count(AttendanceRecord.id)).where(
+            AttendanceRecord.slot_id == 1, AttendanceRecord.fingerprint_hash == "x"),
+        "mark: PIN lookup": select(AttendanceSlot.id).where(
+            AttendanceSlot.is_active == True, AttendanceSlot.pin_code == "00000"),
+        "dashboard: active session": select(AttendanceSlot.id).where(
+            AttendanceSlot.is_active == True, AttendanceSlot.start_time <= now,
+            AttendanceSlot.end_time >= now).order_by(AttendanceSlot.start_time.desc()).limit(1),
+        "slot feed": select(User.name, AttendanceRecord.timestamp).join(
+            User, User.id == AttendanceRecord.student_id).where(
+            AttendanceRecord.slot_id == 1).order_by(AttendanceRecord.timestamp.desc()).limit(50),
+        "student history": select(Room.name, AttendanceRecord.timestamp, teacher.name).select_from(
+            AttendanceRecord).join(AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id).join(
+            Room, Room.id == AttendanceSlot.room_id).outerjoin(
+            teacher, teacher.id == AttendanceSlot.opened_by).where(
+            AttendanceRecord.student_id == 1).order_by(
+            AttendanceRecord.timestamp.desc(), AttendanceRecord.id.desc()).limit(20),
+        "room sessions": select(AttendanceSlot.id).where(AttendanceSlot.room_id == 1).order_by(
+            AttendanceSlot.start_time.desc()).limit(20),
+        "teacher dashboard: sessions": select(func.count(AttendanceSlot.id)).join(
+            Room, Room.id == AttendanceSlot.room_id).where(Room.created_by == 1),
+        "stats sweep": select(AttendanceSlot.id).where(
+            AttendanceSlot.stats_applied == False,
+            (AttendanceSlot.is_active == False) | (AttendanceSlot.end_time < now),
+        ).order_by(AttendanceSlot.id).limit(200),
+        "expire slots": select(AttendanceSlot.id).where(
+            AttendanceSlot.is_active == True, AttendanceSlot.end_time < now,
+        ).order_by(AttendanceSlot.end_time).limit(500),
+    }
+
+
+def _driver_sql(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    if conn.dialect.name == "sqlite":
+        params = {k: v.isoformat(" ") if isinstance(v, datetime) else v for k, v in params.items()}
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return str(compiled), params
+
+
+def hot_query_plans():
+    """[(name, plan lines, large tables scanned)] for every hot query."""
+    conn = db.session.connection()
+    out = []
+    for name, stmt in hot_queries().items():
+        statement, params = _driver_sql(conn, stmt)
+        lines, scans = explain(conn, statement, params)
+        out.append((name, lines, scans))
+    db.session.rollback()
+    return out
+
+
+# ---------------------------------------------------------------------
+# SIZES
+# ---------------------------------------------------------------------
+def table_sizes():
+    """
+    {"tables": [{name, rows, bytes, index_bytes}], "indexes": [{name, table, bytes, scans}]}
+    bytes are None where the database cannot tell (SQLite without dbstat).
+    """
+    conn = db.session.connection()
+    tables, indexes = [], []
+
+    if dialect() == "postgresql":
+        for name, rows, size, index_size in conn.execute(text(
+            "SELECT relname, n_live_tup, pg_table_size(relid), pg_indexes_size(relid) "
+            "FROM pg_stat_user_tables ORDER BY pg_total_relation_size(relid) DESC"
+        )):
+            tables.append({"name": name, "rows": rows, "bytes": size, "index_bytes": index_size})
+        for name, table, size, scans in conn.execute(text(
+            "SELECT indexrelname, relname, pg_relation_size(indexrelid), idx_scan "
+            "FROM pg_stat_user_indexes ORDER BY pg_relation_size(indexrelid) DESC"
+        )):
+            indexes.append({"name": name, "table": table, "bytes": size, "scans": scans})
+        db.session.rollback()
+        return {"tables": tables, "indexes": indexes}
+
+    pages = {}
+    try:
+        pages = dict(conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all())
+    except Exception:
+        db.session.rollback()       # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        conn = db.session.connection()
+
+    insp = inspect(conn)
+    for table in insp.get_table_names():
+        rows = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+        table_indexes = [ix["name"] for ix in insp.get_indexes(table)]
+        for ix in table_indexes:
+            indexes.append({"name": ix, "table": table, "bytes": pages.get(ix), "scans": None})
+        index_bytes = sum(pages.get(ix) or 0 for ix in table_indexes)
+        tables.append({"name": table, "rows": rows, "bytes": pages.get(table),
+                       "index_bytes": index_bytes if pages else None})
+    db.session.rollback()
+    tables.sort(key=lambda t: ((t["bytes"] or 0) + (t["index_bytes"] or 0), t["rows"]), reverse=True)
+    indexes.sort(key=lambda i: i["bytes"] or 0, reverse=True)
+    return {"tables": tables, "indexes": indexes}
+
+
+# ---------------------------------------------------------------------
+# INDEX HEALTH
+# ---------------------------------------------------------------------
+def declared_indexes():
+    """Every index the models declare, by name."""
+    return {ix.name: ix for table in db.metadata.sorted_tables for ix in table.indexes}
+
+
+def partial_indexes():
+    return {name for name, ix in declared_indexes().items()
+            if ix.dialect_options["sqlite"]["where"] is not None}
+
+
+def index_report():
+    """
+    missing:  indexes the models declare that this database lacks
+              (create_all() only adds indexes with their table)
+    invalid:  Postgres indexes left INVALID by a failed concurrent build
+    scans:    hot queries that still scan a large table in full
+    unused:   indexes no hot query plan uses; on Postgres only those
+              with zero scans since the statistics were reset
+    """
+    conn = db.session.connection()
+    insp = inspect(conn)
+    present = {ix["name"] for table in insp.get_table_names() for ix in insp.get_indexes(table)}
+    missing = sorted(name for name in declared_indexes() if name not in present)
+
+    plans = hot_query_plans()
+    conn = db.session.connection()
+    used = {name for _, lines, _ in plans for line in lines for name in present if name in line}
+    scans = [(name, sorted(tables)) for name, _, tables in plans if tables]
+
+    invalid, zero_scans = [], None
+    if dialect() == "postgresql":
+        invalid = [name for (name,) in conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE NOT i.indisvalid AND n.nspname = current_schema()"
+        ))]
+        zero_scans = {name for (name,) in conn.execute(text(
+            "SELECT s.indexrelname FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid "
+            "WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary"
+        ))}
+
+    # Unique and automatic indexes enforce constraints; never report those as unused
+    candidates = {name for name in present if name in declared_indexes()
+                  and not declared_indexes()[name].unique}
+    unused = sorted(candidates - used if zero_scans is None else candidates & zero_scans)
+    db.session.rollback()
+    return {"missing": missing, "invalid": invalid, "scans": scans, "unused": unused}
+
+
+def build_index(name):
+    """
+    Create one declared index without blocking writes where the
+    database allows it: CREATE INDEX CONCURRENTLY on Postgres (an
+    INVALID leftover of an interrupted build is dropped first). SQLite
+    has no online build; readers carry on, writers wait for it.
+    """
+    index = declared_indexes().get(name)
+    if index is None:
+        raise ValueError(f"No index named {name} in the models")
+
+    db.session.rollback()
+    with _autocommit() as conn:
+        if conn.dialect.name == "postgresql":
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"), {"name": name}).scalar()
+            if valid is False:
+                conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            index.dialect_options["postgresql"]["concurrently"] = True
+            try:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            finally:
+                index.dialect_options["postgresql"]["concurrently"] = False
+        else:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        conn.exec_driver_sql(f'ANALYZE "{index.table.name}"')
+
+
+# ---------------------------------------------------------------------
+# VACUUM / ANALYZE
+# ---------------------------------------------------------------------
+def vacuum(full=False):
+    """
+    Reclaim space and refresh planner statistics; returns what was done.
+
+    Postgres: VACUUM (ANALYZE) of every table, which runs alongside
+    traffic. SQLite: incremental vacuum (when auto_vacuum=INCREMENTAL),
+    a WAL checkpoint, ANALYZE and PRAGMA optimize; `full` runs VACUUM,
+    which rewrites the file and blocks writers until it finishes.
+    """
+    done = []
+    db.session.rollback()
+    with _autocommit() as conn:
+        if conn.dialect.name == "postgresql":
+            for table in inspect(conn).get_table_names():
+                conn.exec_driver_sql(f'VACUUM (ANALYZE) "{table}"')
+            done.append("VACUUM (ANALYZE) on every table")
+            return done
+
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if full:
+            conn.exec_driver_sql("VACUUM")
+            done.append(f"VACUUM (reclaimed {free} free pages)")
+        elif conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            conn.exec_driver_sql("PRAGMA incremental_vacuum")
+            done.append(f"incremental vacuum ({free} free pages)")
+        elif free:
+            done.append(f"{free} free pages left: auto_vacuum is not INCREMENTAL, a full VACUUM reclaims them")
+
+        if conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal":
+            busy, log, moved = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+            done.append(f"WAL checkpoint ({moved}/{log} frames{', busy' if busy else ''})")
+
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        done.append("ANALYZE + PRAGMA optimize")
+    return done
+
+
+# ---------------------------------------------------------------------
+# INTEGRITY
+# ---------------------------------------------------------------------
+def _orphan_records():
+    return select(AttendanceRecord.id).outerjoin(
+        AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id).outerjoin(
+        User, User.id == AttendanceRecord.student_id).where(
+        (AttendanceSlot.id.is_(None)) | (User.id.is_(None)))
+
+
+def _duplicate_marks():
+    """Every mark after the first of a (slot, student) pair."""
+    first = select(func.min(AttendanceRecord.id)).group_by(
+        AttendanceRecord.slot_id, AttendanceRecord.student_id).scalar_subquery()
+    pairs = select(AttendanceRecord.slot_id, AttendanceRecord.student_id).group_by(
+        AttendanceRecord.slot_id, AttendanceRecord.student_id).having(func.count() > 1).subquery()
+    return select(AttendanceRecord.id, AttendanceRecord.slot_id).join(
+        pairs, (pairs.c.slot_id == AttendanceRecord.slot_id) & (pairs.c.student_id == AttendanceRecord.student_id)
+    ).where(AttendanceRecord.id.notin_(first))
+
+
+def integrity_report():
+    """Counts of problems; none of the checks write."""
+    report = {
+        "orphaned_records": db.session.execute(
+            select(func.count()).select_from(_orphan_records().subquery())).scalar(),
+        "duplicate_marks": db.session.execute(
+            select(func.count()).select_from(_duplicate_marks().subquery())).scalar(),
+        "orphaned_slots": db.session.query(func.count(AttendanceSlot.id)).outerjoin(
+            Room, Room.id == AttendanceSlot.room_id).filter(Room.id.is_(None)).scalar(),
+        "wrong_final_counts": db.session.query(func.count(AttendanceSlot.id)).filter(
+            AttendanceSlot.final_count.isnot(None),
+            AttendanceSlot.final_count != select(func.count(AttendanceRecord.id)).where(
+                AttendanceRecord.slot_id == AttendanceSlot.id).scalar_subquery(),
+        ).scalar(),
+    }
+    if dialect() == "sqlite":
+        report["quick_check"] = db.session.execute(text("PRAGMA quick_check")).scalar()
+    db.session.rollback()
+    return report
+
+
+def repair_integrity():
+    """
+    Delete orphaned records and all but the first mark of each
+    duplicate pair, then correct the touched slots' final_count.
+    Returns (orphans deleted, duplicates deleted). RoomStats keeps the
+    old figures until rebuild_stats.py runs.
+    """
+    orphans = [rid for (rid,) in db.session.execute(_orphan_records())]
+    dupes = db.session.execute(_duplicate_marks()).all()
+    for i in range(0, len(orphans), 500):
+        db.session.execute(delete(AttendanceRecord).where(AttendanceRecord.id.in_(orphans[i:i + 500])))
+    dupe_ids = [rid for rid, _ in dupes]
+    for i in range(0, len(dupe_ids), 500):
+        db.session.execute(delete(AttendanceRecord).where(AttendanceRecord.id.in_(dupe_ids[i:i + 500])))
+
+    touched = sorted({slot_id for _, slot_id in dupes})
+    for i in range(0, len(touched), 500):
+        chunk = touched[i:i + 500]
+        counts = dict(db.session.query(AttendanceRecord.slot_id, func.count(AttendanceRecord.id)).filter(
+            AttendanceRecord.slot_id.in_(chunk)).group_by(AttendanceRecord.slot_id).all())
+        db.session.query(AttendanceSlot).filter(
+            AttendanceSlot.id.in_(chunk), AttendanceSlot.final_count.isnot(None)
+        ).update({AttendanceSlot.final_count: case(
+            *[(AttendanceSlot.id == sid, n) for sid, n in counts.items()],
+            else_=AttendanceSlot.final_count,
+        )}, synchronize_session=False)
+    db.session.commit()
+    return len(orphans), len(dupe_ids)
@@ -0,0 +1,132 @@
+# app/migrations.py
+
+from sqlalchemy import inspect, literal, text
+
+from . import db
+from .devices import fingerprint_hash
+from .models import AttendanceRecord
+
+
+def _columns(table):
+    return {c["name"] for c in inspect(db.session.connection()).get_columns(table)}
+
+
+def missing_columns():
+    """
+    Columns the models declare on tables that already exist but lack
+    them, as {table: [column, ...]}. create_all() only adds whole
+    tables, so these are what an older database still needs.
+    """
+    existing = set(inspect(db.session.connection()).get_table_names())
+    missing = {}
+    for table in db.metadata.sorted_tables:
+        if table.name in existing:
+            have = _columns(table.name)
+            columns = [c.name for c in table.columns if c.name not in have]
+            if columns:
+                missing[table.name] = columns
+    return missing
+
+
+def add_missing_columns():
+    """
+    ALTER TABLE ... ADD COLUMN for everything missing_columns() lists,
+    with the model's scalar default filled into existing rows (NOT NULL
+    is kept only when there is one). Returns ["table.column", ...].
+    """
+    dialect = db.session.connection().dialect
+    added = []
+    for table_name, names in missing_columns().items():
+        table = db.metadata.tables[table_name]
+        for name in names:
+            column = table.columns[name]
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(dialect)}"
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if default is not None:
+                value = literal(default, column.type).compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+                ddl += f" DEFAULT {value}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            db.session.execute(text(ddl))
+            added.append(f"{table_name}.{name}")
+    db.session.commit()
+    return added
+
+
+def missing_unique_indexes():
+    """
+    Unique indexes the models declare on tables that already exist but
+    lack them. create_all() skips existing tables' indexes, and a unique
+    one cannot be built over duplicate rows, so these need unique_marks().
+    """
+    inspector = inspect(db.session.connection())
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        have = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        missing += [ix.name for ix in table.indexes if ix.unique and ix.name not in have]
+    return missing
+
+
+def unique_marks():
+    """
+    Build the unique (slot_id, student_id) index on attendance_records:
+    delete duplicate marks first (maintenance.repair_integrity, which
+    also drops orphaned records), then replace the plain index it
+    supersedes. Returns the number of duplicates deleted; a no-op once
+    the index exists.
+    """
+    from .maintenance import repair_integrity
+
+    name = "uq_attendance_records_slot_student"
+    if name not in missing_unique_indexes():
+        return 0
+    _, dupes = repair_integrity()
+    index = next(ix for ix in AttendanceRecord.__table__.indexes if ix.name == name)
+    index.create(db.session.connection(), checkfirst=True)
+    db.session.execute(text("DROP INDEX IF EXISTS ix_attendance_records_slot_student"))
+    db.session.commit()
+    return dupes
+
+
+def hash_fingerprints(batch=2000):
+    """
+    Move attendance_records from the raw `fingerprint` column to
+    `fingerprint_hash`: add the new column, hash the stored values in
+    batches (one commit each), then drop the old column and build the
+    (slot_id, fingerprint_hash) index. Safe to re-run after an
+    interruption; a no-op once the old column is gone.
+
+    Returns the number of records hashed.
+    """
+    columns = _columns("attendance_records")
+    if "fingerprint" not in columns:
+        return 0
+    if "fingerprint_hash" not in columns:
+        db.session.execute(text("ALTER TABLE attendance_records ADD COLUMN fingerprint_hash VARCHAR(64)"))
+        db.session.commit()
+
+    hashed, last_id = 0, 0
+    while True:
+        rows = db.session.execute(text(
+            "SELECT id, fingerprint FROM attendance_records "
+            "WHERE id > :last AND fingerprint IS NOT NULL AND fingerprint_hash IS NULL "
+            "ORDER BY id LIMIT :n"
+        ), {"last": last_id, "n": batch}).all()
+        if not rows:
+            break
+        db.session.execute(
+            text("UPDATE attendance_records SET fingerprint_hash = :h WHERE id = :id"),
+            [{"id": rid, "h": fingerprint_hash(fp)} for rid, fp in rows]
+        )
+        db.session.commit()
+        hashed += len(rows)
+        last_id = rows[-1][0]
+
+    db.session.execute(text("ALTER TABLE attendance_records DROP COLUMN fingerprint"))
+    index = next(ix for ix in AttendanceRecord.__table__.indexes if ix.name == "ix_attendance_records_slot_fp")
+    index.create(db.session.connection(), checkfirst=True)
+    db.session.commit()
+    return hashed
@@ -2,6 +2,12 @@ from datetime import datetime, timedelta
 from flask_login import UserMixin
 from . import db
 
+# Bump whenever tables or columns change: the first boot against an
+# older database runs create_all() and records the new version, unless
+# existing tables lack columns or unique indexes (fix_database.py
+# option 15 adds those).
+SCHEMA_VERSION = 4
+
 
 # ---------------------------
 # USER MODEL
@@ -79,6 +85,31 @@ class Room(db.Model):
 # ---------------------------
 class AttendanceSlot(db.Model):
     __tablename__ = "attendance_slots"
+    __table_args__ = (
+        # Only open slots are indexed; expired ones are closed by the scheduler
+        db.Index(
+            "ix_attendance_slots_active_start",
+            "start_time",
+            postgresql_where=db.text("is_active"),
+            sqlite_where=db.text("is_active = 1"),
+        ),
+        # PIN -> open slot lookup when marking by PIN
+        db.Index(
+            "ix_attendance_slots_active_pin",
+            "pin_code",
+            postgresql_where=db.text("is_active"),
+            sqlite_where=db.text("is_active = 1"),
+        ),
+        # a room's sessions, newest first (room pages, teacher dashboard)
+        db.Index("ix_attendance_slots_room_start", "room_id", "start_time"),
+        # slots the stats sweep has not folded in yet
+        db.Index(
+            "ix_attendance_slots_stats_pending",
+            "id",
+            postgresql_where=db.text("NOT stats_applied"),
+            sqlite_where=db.text("stats_applied = 0"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -97,6 +128,13 @@ class AttendanceSlot(db.Model):
     # QR token
     qr_token = db.Column(db.String(64))
 
+    # Filled in when the slot is closed (by a teacher or the scheduler)
+    closed_at = db.Column(db.DateTime)
+    final_count = db.Column(db.Integer)
+
+    # Set once the slot has been folded into RoomStats
+    stats_applied = db.Column(db.Boolean, default=False, nullable=False)
+
     attendance_records = db.relationship("AttendanceRecord", backref="slot", lazy=True)
 
     def __repr__(self):
@@ -108,6 +146,15 @@ class AttendanceSlot(db.Model):
 # ---------------------------
 class AttendanceRecord(db.Model):
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        # one mark per student per slot; also serves per-slot counts and
+        # the duplicate-mark check (replaces ix_attendance_records_slot_student)
+        db.Index("uq_attendance_records_slot_student", "slot_id", "student_id", unique=True),
+        # shared-device check on the mark path
+        db.Index("ix_attendance_records_slot_fp", "slot_id", "fingerprint_hash"),
+        # a student's history, newest first
+        db.Index("ix_attendance_records_student_time", "student_id", "timestamp"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -115,8 +162,171 @@ class AttendanceRecord(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    fingerprint = db.Column(db.String(500))
+    fingerprint_hash = db.Column(db.String(64))  # sha256 hex, see app.devices
     method = db.Column(db.String(20))  # pin or qr
 
     def __repr__(self):
-        return f"<AttendanceRecord user={self.student_id} slot={self.slot_id}>"
\ No newline at end of file
+        return f"<AttendanceRecord user={self.student_id} slot={self.slot_id}>"
+
+
+# ---------------------------
+# ROOM STATS (precomputed)
+# ---------------------------
+class RoomStats(db.Model):
+    """
+    Incrementally maintained per-room histograms, updated by
+    app.stats when a slot closes. Read as-is by the dashboards.
+    """
+    __tablename__ = "room_stats"
+
+    room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"), primary_key=True)
+
+    sessions = db.Column(db.Integer, default=0, nullable=False)
+    marks = db.Column(db.Integer, default=0, nullable=False)
+
+    # counts per ARRIVAL_BUCKETS entry (seconds after slot start)
+    arrival_buckets = db.Column(db.JSON, nullable=False, default=list)
+    # 7 x 24 grid (weekday x hour, UTC) of [sessions, marks]
+    turnout = db.Column(db.JSON, nullable=False, default=list)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    room = db.relationship("Room", backref=db.backref("stats", uselist=False))
+
+    def __repr__(self):
+        return f"<RoomStats room={self.room_id} sessions={self.sessions}>"
+
+
+
+# ---------------------------
+# SCHEDULER LEASE
+# ---------------------------
+class SchedulerLease(db.Model):
+    """Single-row lock deciding which worker runs background jobs."""
+    __tablename__ = "scheduler_leases"
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<SchedulerLease {self.name} holder={self.holder}>"
+
+
+# ---------------------------
+# TERMS & ARCHIVE SUMMARIES
+# ---------------------------
+class Term(db.Model):
+    """
+    A teaching term. Once archived, its slots and records are moved to
+    a compressed file (see app.archive) and only summary rows remain.
+    """
+    __tablename__ = "terms"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)   # exclusive
+
+    archived_at = db.Column(db.DateTime)
+    archive_path = db.Column(db.String(500))
+    sessions_archived = db.Column(db.Integer, default=0)
+    records_archived = db.Column(db.Integer, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def is_archived(self):
+        return self.archived_at is not None
+
+    def __repr__(self):
+        return f"<Term {self.name}>"
+
+
+class TermRoomSummary(db.Model):
+    __tablename__ = "term_room_summaries"
+
+    term_id = db.Column(db.Integer, db.ForeignKey("terms.id"), primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"), primary_key=True)
+
+    sessions = db.Column(db.Integer, default=0, nullable=False)
+    marks = db.Column(db.Integer, default=0, nullable=False)
+
+    term = db.relationship("Term")
+    room = db.relationship("Room")
+
+
+class TermStudentSummary(db.Model):
+    __tablename__ = "term_student_summaries"
+
+    term_id = db.Column(db.Integer, db.ForeignKey("terms.id"), primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True, index=True)
+
+    attended = db.Column(db.Integer, default=0, nullable=False)
+
+
+# ---------------------------
+# EVENT LOG CHECKPOINTS
+# ---------------------------
+class EventLogOffset(db.Model):
+    """How far the projector has applied each event-log segment (bytes)."""
+    __tablename__ = "event_log_offsets"
+
+    segment = db.Column(db.String(200), primary_key=True)
+    offset = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EventLogOffset {self.segment}@{self.offset}>"
+
+
+# ---------------------------
+# TIMETABLE
+# ---------------------------
+class TimetableEntry(db.Model):
+    """A weekly class: the scheduler opens a slot for it on time."""
+    __tablename__ = "timetable_entries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"), nullable=False, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+
+    weekday = db.Column(db.Integer, nullable=False)          # 0 = Monday, local time
+    start_time = db.Column(db.Time, nullable=False)          # local time (TIMETABLE_TIMEZONE)
+    duration_min = db.Column(db.Integer, default=5, nullable=False)
+    require_pin = db.Column(db.Boolean, default=False, nullable=False)
+    is_enabled = db.Column(db.Boolean, default=True, nullable=False)
+
+    # UTC start of the last occurrence a slot was opened for (claim marker)
+    last_opened_for = db.Column(db.DateTime)
+    last_slot_id = db.Column(db.Integer)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    room = db.relationship("Room", backref="timetable_entries")
+
+    WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    @property
+    def weekday_name(self):
+        return self.WEEKDAYS[self.weekday]
+
+    def __repr__(self):
+        return f"<TimetableEntry room={self.room_id} {self.weekday_name} {self.start_time}>"
+
+
+# ---------------------------
+# SCHEMA VERSION
+# ---------------------------
+class SchemaVersion(db.Model):
+    """Versions stamped by app.startup.check_schema, newest last."""
+    __tablename__ = "schema_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchemaVersion {self.version}>"
@@ -0,0 +1,175 @@
+# app/offline.py
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import tuple_
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord
+from .devices import fingerprint_hash
+from .presence import presence
+from .slots import account_late_marks, insert_marks
+from .tenants import tenant_scoped
+
+TICKET_SALT = "offline-mark"
+
+
+def _serializer():
+    # Tickets of one institution do not verify at another
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=tenant_scoped(TICKET_SALT))
+
+
+def issue_ticket(slot_id, token, user_id, now=None):
+    """
+    Signed proof that `user_id` opened the mark page for `slot_id` with
+    `token` at `now`. The page keeps it so a failed mark can be queued
+    on the phone and synced later.
+    """
+    now = now or datetime.utcnow()
+    return _serializer().dumps({
+        "slot_id": int(slot_id),
+        "token": token,
+        "user_id": int(user_id),
+        "at": now.isoformat(),
+    })
+
+
+def read_ticket(ticket):
+    try:
+        return _serializer().loads(ticket, max_age=current_app.config["OFFLINE_TICKET_MAX_AGE"])
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+# ---------------------------------------------------------------------
+# BATCH SYNC
+# ---------------------------------------------------------------------
+def sync_marks(user, items, method="qr"):
+    """
+    Validate and store a batch of queued marks for `user` with one slot
+    query, one duplicate query and one multi-row INSERT. Each item is
+    {"ticket": str, "fingerprint": str}. Returns one result per item.
+    """
+    results = [None] * len(items)
+    tickets = {}
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"ok": False, "msg": "Invalid mark"}
+            continue
+        ticket, fingerprint = item.get("ticket"), item.get("fingerprint")
+        if not isinstance(ticket, str) or not isinstance(fingerprint, (str, type(None))):
+            results[i] = {"ok": False, "msg": "Invalid mark"}
+            continue
+        data = read_ticket(ticket)
+        if not data or data.get("user_id") != user.id:
+            results[i] = {"ok": False, "msg": "Invalid ticket"}
+            continue
+        try:
+            data["at"] = datetime.fromisoformat(data["at"])
+        except (KeyError, TypeError, ValueError):
+            results[i] = {"ok": False, "msg": "Invalid ticket"}
+            continue
+        tickets[i] = (data, fingerprint)
+
+    slot_ids = {d["slot_id"] for d, _ in tickets.values()}
+    # Row locks keep this ordered against a concurrent stats fold-in
+    slots = {s.id: s for s in AttendanceSlot.query.filter(
+        AttendanceSlot.id.in_(slot_ids)
+    ).with_for_update()} if slot_ids else {}
+
+    existing = set()
+    if slot_ids:
+        existing = {r.slot_id for r in db.session.query(AttendanceRecord.slot_id).filter(
+            AttendanceRecord.student_id == user.id,
+            AttendanceRecord.slot_id.in_(slot_ids)
+        )}
+
+    grace = timedelta(seconds=current_app.config["OFFLINE_GRACE_SECONDS"])
+    rows = []
+    for i, (data, fingerprint) in tickets.items():
+        slot = slots.get(data["slot_id"])
+        at = data["at"]
+
+        if not slot or data.get("token") != slot.qr_token:
+            results[i] = {"ok": False, "msg": "Invalid QR token"}
+            continue
+        # Judged against the slot's original window, not the sync time;
+        # a teacher closing the session early ends the window there
+        end = min(filter(None, (slot.end_time, slot.closed_at)), default=None)
+        if slot.start_time and at < slot.start_time:
+            results[i] = {"ok": False, "msg": "Session had not started"}
+            continue
+        if end and at > end + grace:
+            results[i] = {"ok": False, "msg": "Session had ended"}
+            continue
+        if user.device_fingerprint and fingerprint and fingerprint != user.device_fingerprint:
+            results[i] = {"ok": False, "msg": "Device fingerprint mismatch"}
+            continue
+        if slot.id in existing:
+            results[i] = {"ok": False, "msg": "Already marked"}
+            continue
+
+        existing.add(slot.id)
+        rows.append({
+            "slot_id": slot.id,
+            "student_id": user.id,
+            "timestamp": at,
+            "fingerprint_hash": fingerprint_hash(fingerprint),
+            "method": method,
+        })
+        results[i] = {"ok": True, "msg": "Attendance recorded", "timestamp": at.isoformat()}
+
+    # Drop marks whose device already marked the same slot for someone else
+    shared = set()
+    keyed = [(r["slot_id"], r["fingerprint_hash"]) for r in rows if r["fingerprint_hash"]]
+    if keyed:
+        shared = set(db.session.query(
+            AttendanceRecord.slot_id, AttendanceRecord.fingerprint_hash
+        ).filter(
+            tuple_(AttendanceRecord.slot_id, AttendanceRecord.fingerprint_hash).in_(keyed),
+            AttendanceRecord.student_id != user.id
+        ).all())
+    if shared:
+        kept = []
+        for i, res in enumerate(results):
+            if not res["ok"]:
+                continue
+            data, _ = tickets[i]
+            row = next(r for r in rows if r["slot_id"] == data["slot_id"])
+            if (row["slot_id"], row["fingerprint_hash"]) in shared:
+                results[i] = {"ok": False, "msg": "This device was already used by another student"}
+            else:
+                kept.append(row)
+        rows = kept
+
+    if not rows:
+        db.session.rollback()
+        return results
+
+    if not user.device_fingerprint:
+        accepted = [tickets[i][1] for i, res in enumerate(results) if res["ok"]]
+        first_fp = next((fp for fp in accepted if fp), None)
+        if first_fp:
+            user.device_fingerprint = first_fp
+
+    stored = insert_marks(rows)
+    if len(stored) < len(rows):
+        # Marked meanwhile through another request
+        lost = {r["slot_id"] for r in rows} - {r["slot_id"] for r in stored}
+        for i, (data, _) in tickets.items():
+            if data["slot_id"] in lost and results[i]["ok"]:
+                results[i] = {"ok": False, "msg": "Already marked"}
+        rows = stored
+
+    # Slots that were already closed / folded into RoomStats
+    for row in rows:
+        account_late_marks(slots[row["slot_id"]], [row["timestamp"]])
+
+    db.session.commit()
+
+    for row in rows:
+        presence.add(slots[row["slot_id"]], user.id)
+    return results
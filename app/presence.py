@@ -0,0 +1,155 @@
+# app/presence.py
+
+from datetime import datetime, timedelta
+
+from . import db
+from .cache import cache, SocketBackend
+from .models import AttendanceSlot, AttendanceRecord, User
+from .tenants import tenant_scoped
+
+# Keep a slot's bitmap this long after it ends (late feed polls, offline sync)
+KEEP_AFTER_END = timedelta(hours=1)
+
+
+class Presence:
+    """
+    Who has marked each open slot, as a bitmap over student ids held in
+    the cache backend: the duplicate check on the mark path, the live
+    count and the "not yet marked" list cost no query.
+
+    The bitmap is loaded from attendance_records when the slot opens
+    (or on first use after a restart or eviction) and every accepted
+    mark sets its bit atomically, so two concurrent requests for the
+    same student cannot both get through. It must be shared by every
+    worker to be trusted: PRESENCE_ENABLED=auto turns it on only with
+    CACHE_URL=unix://... (cache_server.py); "1" forces it for a
+    single-process server. Whenever it is off or the backend fails,
+    every method returns None and callers query the database as before.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.roster_seconds = 600
+        self.loads = 0
+        self.hits = 0
+        self.unavailable = 0
+
+    def init_app(self, app):
+        mode = app.config["PRESENCE_ENABLED"]
+        self.enabled = app.config["CACHE_ENABLED"] and (
+            mode == "1" or (mode == "auto" and isinstance(cache.backend, SocketBackend))
+        )
+        self.roster_seconds = app.config["PRESENCE_ROSTER_SECONDS"]
+
+    @staticmethod
+    def _key(slot_id):
+        return tenant_scoped(f"presence:{slot_id}")
+
+    @staticmethod
+    def _ttl(slot):
+        end = (slot.end_time or datetime.utcnow()) + KEEP_AFTER_END
+        return max((end - datetime.utcnow()).total_seconds(), 60)
+
+    def _call(self, op, *args):
+        if not self.enabled:
+            return None
+        try:
+            return getattr(cache.backend, op)(*args)
+        except Exception:
+            self.unavailable += 1
+            return None
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def load(self, slot):
+        """Fill the slot's bitmap from the database; returns the count or None."""
+        if not self.enabled:
+            return None
+        ids = [sid for (sid,) in db.session.query(AttendanceRecord.student_id).filter(
+            AttendanceRecord.slot_id == slot.id)]
+        self.loads += 1
+        return self._call("bitmap_load", self._key(slot.id), ids, self._ttl(slot))
+
+    def add(self, slot, student_id):
+        """
+        Claim `student_id`'s mark: True if newly set, False if it was
+        already there (reject as a duplicate), None when unavailable.
+        """
+        found = self._call("bitmap_add", self._key(slot.id), student_id, self._ttl(slot))
+        return None if found is None else not found[0]
+
+    def discard(self, slot, student_id):
+        """Undo add() when the mark was not stored after all."""
+        self._call("bitmap_discard", self._key(slot.id), student_id)
+
+    # -------------------------
+    # Reads (load on a miss)
+    # -------------------------
+    def _read(self, slot, op, *args):
+        found = self._call(op, self._key(slot.id), *args)
+        if found is None or not found[1]:
+            if self.load(slot) is None:
+                return None
+            found = self._call(op, self._key(slot.id), *args)
+            if found is None or not found[1]:
+                return None
+        self.hits += 1
+        return found[0]
+
+    def contains(self, slot, student_id):
+        """Whether `student_id` has marked `slot`; None when unknown."""
+        if not self.enabled:
+            return None
+        # A set bit is conclusive even before the bitmap is loaded
+        found = self._call("bitmap_test", self._key(slot.id), student_id)
+        if found is not None and (found[0] or found[1]):
+            self.hits += 1
+            return found[0]
+        return self._read(slot, "bitmap_test", student_id)
+
+    def count(self, slot):
+        if not self.enabled:
+            return None
+        return self._read(slot, "bitmap_count")
+
+    def missing(self, slot):
+        """Roster students (see roster()) who have not marked; None when unknown."""
+        if not self.enabled:
+            return None
+        people = roster(slot.room_id, slot.id)
+        ids = self._read(slot, "bitmap_missing", [p[0] for p in people])
+        if ids is None:
+            return None
+        absent = set(ids)
+        return [p for p in people if p[0] in absent]
+
+    def stats(self):
+        return {"enabled": self.enabled, "loads": self.loads, "hits": self.hits, "unavailable": self.unavailable}
+
+
+presence = Presence()
+
+
+def roster(room_id, slot_id):
+    """
+    (id, name, email) of the students expected in a room: everyone who
+    marked one of its earlier sessions (there is no enrolment table).
+    Cached for PRESENCE_ROSTER_SECONDS.
+    """
+    def build():
+        rows = db.session.query(User.id, User.name, User.email).join(
+            AttendanceRecord, AttendanceRecord.student_id == User.id
+        ).join(AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id).filter(
+            AttendanceSlot.room_id == room_id,
+            AttendanceSlot.id < slot_id,
+            User.is_banned == False,
+        ).distinct().order_by(User.name).all()
+        return [tuple(r) for r in rows]
+
+    return cache.get_or_set(f"presence.roster:{room_id}:{slot_id}", build, presence.roster_seconds)[0]
+
+
+def init_presence(app):
+    """Called by create_app() inside __init__.py"""
+    presence.init_app(app)
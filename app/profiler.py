@@ -0,0 +1,265 @@
+# app/profiler.py
+
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from flask import request
+
+# Frames from these directories are shown relative to them
+_PATH_ROOTS = sorted({os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+                     | {p for p in sys.path if p and os.path.isdir(p)}, key=len, reverse=True)
+
+
+def _short(filename):
+    for root in _PATH_ROOTS:
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+class Profiler:
+    """
+    Statistical profiler for a live worker (admin, /admin/profiler).
+
+    A sampler thread reads sys._current_frames() every
+    PROFILER_INTERVAL_MS and counts whole stacks; nothing is traced, so
+    the request threads run at full speed. A session either samples
+    every thread for N seconds, or only the threads serving the next N
+    requests to one endpoint. When it ends it writes to PROFILER_DIR:
+
+      <name>.collapsed   one "frame;frame;frame count" line per stack
+                         (flamegraph.pl / speedscope input)
+      <name>.svg         flamegraph, rendered here
+      <name>.txt         per-function self / total sample table
+
+    Per worker process: a session only sees the worker that received
+    the request to start it.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.interval = 0.01
+        self.max_seconds = 120
+        self._lock = threading.Lock()
+        self._session = None
+        self.last = None            # summary of the last finished session
+
+    def init_app(self, app):
+        self.directory = app.config["PROFILER_DIR"]
+        self.interval = app.config["PROFILER_INTERVAL_MS"] / 1000.0
+        self.max_seconds = app.config["PROFILER_MAX_SECONDS"]
+
+    # -------------------------
+    # Control
+    # -------------------------
+    def start(self, seconds=None, endpoint=None, requests=None):
+        """Start a timed session, or one covering the next `requests` calls to `endpoint`."""
+        with self._lock:
+            if self._session:
+                raise RuntimeError("A profiling session is already running in this worker")
+            seconds = min(seconds or self.max_seconds, self.max_seconds)
+            session = {
+                "name": f"{datetime.utcnow():%Y%m%d-%H%M%S}-{os.getpid()}"
+                        + (f"-{endpoint}" if endpoint else ""),
+                "pid": os.getpid(),
+                "started": time.time(),
+                "deadline": time.monotonic() + seconds,
+                "endpoint": endpoint,
+                "remaining": requests,
+                "threads": set(),   # request mode: idents currently serving the endpoint
+                "stacks": Counter(),
+                "samples": 0,
+                "stop": threading.Event(),
+            }
+            self._session = session
+        threading.Thread(target=self._sample, args=(session,), name="profiler", daemon=True).start()
+        return self.status()
+
+    def stop(self):
+        session = self._session
+        if session:
+            session["stop"].set()
+        return session is not None
+
+    def status(self):
+        session = self._session
+        if not session:
+            return {"running": False, "pid": os.getpid(), "last": self.last}
+        return {
+            "running": True,
+            "pid": session["pid"],
+            "name": session["name"],
+            "endpoint": session["endpoint"],
+            "requests_left": session["remaining"],
+            "seconds_left": max(0, round(session["deadline"] - time.monotonic(), 1)),
+            "samples": session["samples"],
+            "last": self.last,
+        }
+
+    # -------------------------
+    # Request mode hooks
+    # -------------------------
+    def before_request(self):
+        session = self._session
+        if not session or not session["endpoint"] or request.endpoint != session["endpoint"]:
+            return
+        with self._lock:
+            if session["remaining"] <= 0:
+                return
+            session["remaining"] -= 1
+            session["threads"].add(threading.get_ident())
+            request.environ["profiler.sampled"] = True
+
+    def teardown_request(self, exc=None):
+        session = self._session
+        if not session or not request.environ.get("profiler.sampled"):
+            return
+        with self._lock:
+            session["threads"].discard(threading.get_ident())
+            if session["remaining"] <= 0 and not session["threads"]:
+                session["stop"].set()
+
+    # -------------------------
+    # Sampler thread
+    # -------------------------
+    def _sample(self, session):
+        me = threading.get_ident()
+        request_mode = bool(session["endpoint"])
+        stacks = session["stacks"]
+        try:
+            while not session["stop"].wait(self.interval):
+                if time.monotonic() >= session["deadline"]:
+                    break
+                wanted = session["threads"] if request_mode else None
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or (wanted is not None and ident not in wanted):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{_short(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+                    session["samples"] += 1
+        finally:
+            with self._lock:
+                self._session = None
+            self.last = self._write(session)
+
+    # -------------------------
+    # Output
+    # -------------------------
+    def _write(self, session):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, session["name"])
+        stacks = session["stacks"]
+
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + ".svg", "w") as f:
+            f.write(flamegraph(stacks, title=session["name"]))
+        with open(base + ".txt", "w") as f:
+            f.write(function_table(stacks, self.interval))
+
+        return {
+            "name": session["name"],
+            "samples": session["samples"],
+            "seconds": round(time.time() - session["started"], 1),
+            "files": [session["name"] + ext for ext in (".svg", ".collapsed", ".txt")],
+        }
+
+    def files(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = [n for n in os.listdir(self.directory) if n.endswith((".svg", ".collapsed", ".txt"))]
+        return sorted(names, reverse=True)
+
+
+profiler = Profiler()
+
+
+def function_table(stacks, interval):
+    """Per-function samples: self (leaf frame) and total (anywhere on the stack)."""
+    own, total = Counter(), Counter()
+    samples = sum(stacks.values())
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    lines = [
+        f"{samples} samples, {interval * 1000:g} ms interval (~{samples * interval:.1f} thread-seconds)",
+        "",
+        f"{'self':>7} {'self%':>6} {'total':>7} {'total%':>6}  function",
+    ]
+    for frame, n in sorted(total.items(), key=lambda kv: (own[kv[0]], kv[1]), reverse=True):
+        lines.append(f"{own[frame]:>7} {own[frame] * 100 / samples:>5.1f}% "
+                     f"{n:>7} {n * 100 / samples:>5.1f}%  {frame}")
+    if not samples:
+        lines.append("(no samples: nothing ran in the profiled threads)")
+    return "\n".join(lines) + "\n"
+
+
+def flamegraph(stacks, title="", width=1200, row=16):
+    """A static SVG flamegraph (root at the bottom) of collapsed stacks."""
+    root = {"children": {}, "value": 0}
+    for stack, count in stacks.items():
+        node = root
+        node["value"] += count
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"children": {}, "value": 0})
+            node["value"] += count
+
+    def depth(node):
+        return 1 + max((depth(c) for c in node["children"].values()), default=0)
+
+    levels = depth(root)
+    height = (levels + 2) * row
+    total = root["value"] or 1
+    scale = (width - 20) / total
+    rects = []
+
+    def draw(name, node, x, level):
+        w = node["value"] * scale
+        if w < 0.5:
+            return
+        y = height - (level + 1) * row
+        hue = zlib.crc32(name.encode()) % 40
+        label = html.escape(name)
+        pct = node["value"] * 100 / total
+        rects.append(
+            f'<g><title>{label} ({node["value"]} samples, {pct:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" rx="2" '
+            f'fill="hsl({hue},85%,{55 + hue // 4}%)"/>'
+            + (f'<text x="{x + 3:.1f}" y="{y + row - 4}">{html.escape(name[:int(w / 7)])}</text>'
+               if w > 35 else "")
+            + "</g>"
+        )
+        cx = x
+        for child_name, child in sorted(node["children"].items()):
+            draw(child_name, child, cx, level + 1)
+            cx += child["value"] * scale
+
+    draw("all", root, 10, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        f'<text x="10" y="14" font-size="13">{html.escape(title)} - {total} samples</text>'
+        + "".join(rects) + "</svg>\n"
+    )
+
+
+def init_profiler(app):
+    """Called by create_app() inside __init__.py"""
+    profiler.init_app(app)
+    app.before_request(profiler.before_request)
+    app.teardown_request(profiler.teardown_request)
@@ -0,0 +1,183 @@
+# app/queries.py
+"""
+Shared read queries used by more than one blueprint.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+
+from sqlalchemy import func
+
+from . import db
+from .cache import cache, cached
+from .models import AttendanceSlot, AttendanceRecord, User, Room, TermRoomSummary
+
+# Plain rows for the read-heavy pages: column selects mapped onto
+# namedtuples, no ORM instances, identity map or lazy relationships.
+FeedRow = namedtuple("FeedRow", "name email timestamp method")
+HistoryRow = namedtuple("HistoryRow", "room_name timestamp method teacher_name")
+
+FEED_LIMIT = 200
+HISTORY_PER_PAGE = 50
+ACTIVE_LIMIT = 20
+
+
+def active_sessions():
+    """
+    The open slots (newest ACTIVE_LIMIT) as plain data, shared by every
+    student; each one is marked by its own id. Returns (list, built_at);
+    the timetable scheduler warms this entry as its slots open.
+    """
+    def build():
+        now = datetime.utcnow()
+        rows = db.session.query(
+            AttendanceSlot.id, AttendanceSlot.end_time, AttendanceSlot.require_pin,
+            AttendanceSlot.pin_code, Room.name, User.name
+        ).join(Room, Room.id == AttendanceSlot.room_id).outerjoin(
+            User, User.id == AttendanceSlot.opened_by
+        ).filter(
+            AttendanceSlot.is_active == True,
+            AttendanceSlot.start_time <= now,
+            AttendanceSlot.end_time >= now
+        ).order_by(AttendanceSlot.start_time.desc()).limit(ACTIVE_LIMIT).all()
+        return [{
+            "id": row[0], "end_time": row[1], "require_pin": row[2],
+            "pin_code": row[3], "room_name": row[4], "teacher_name": row[5],
+        } for row in rows]
+
+    ttl = current_app.config["ACTIVE_SLOT_CACHE_SECONDS"]
+    active, built_at = cache.get_or_set("dashboard.open", build, ttl,
+                                       tags=("attendance_slots", "dashboard.active"))
+    # Do not serve a session past its end while the entry is still fresh
+    now = datetime.utcnow()
+    return [s for s in active if s["end_time"] >= now], built_at
+
+
+@cached(60, tags=("users",))
+def enrolled_students():
+    """Students expected at a session (no enrolment table yet)."""
+    return User.query.filter_by(role="student", is_banned=False).count()
+
+
+def sessions_with_counts(slot_query):
+    """
+    Turn a query of AttendanceSlot rows into (slot, present) rows.
+    The counts come from one grouped subquery limited to the same
+    slots, so records are counted in SQL and never loaded.
+    """
+    slot_ids = slot_query.with_entities(AttendanceSlot.id).order_by(None).subquery()
+
+    counts = db.session.query(
+        AttendanceRecord.slot_id.label("slot_id"),
+        func.count(AttendanceRecord.id).label("present"),
+    ).filter(
+        AttendanceRecord.slot_id.in_(db.select(slot_ids.c.id))
+    ).group_by(AttendanceRecord.slot_id).subquery()
+
+    return slot_query.outerjoin(
+        counts, counts.c.slot_id == AttendanceSlot.id
+    ).add_columns(func.coalesce(counts.c.present, 0).label("present"))
+
+
+def session_summaries(rows, roster_size):
+    """Attach present/absent numbers to (slot, present) rows."""
+    out = []
+    for slot, present in rows:
+        out.append({
+            "slot": slot,
+            "present": present,
+            "absent": max(roster_size - present, 0),
+            "rate": round(present * 100 / roster_size, 1) if roster_size else 0,
+        })
+    return out
+
+
+def rooms_with_stats(room_query):
+    """
+    Turn a query of Room rows into (room, sessions, last_session, marks)
+    rows in one statement: grouped subqueries over slots, records and
+    archived term summaries are outer-joined onto the rooms.
+    """
+    room_ids = room_query.with_entities(Room.id).order_by(None).subquery()
+    in_rooms = db.select(room_ids.c.id)
+
+    slots = db.session.query(
+        AttendanceSlot.room_id.label("room_id"),
+        func.count(AttendanceSlot.id).label("sessions"),
+        func.max(AttendanceSlot.start_time).label("last_session"),
+    ).filter(AttendanceSlot.room_id.in_(in_rooms)).group_by(AttendanceSlot.room_id).subquery()
+
+    marks = db.session.query(
+        AttendanceSlot.room_id.label("room_id"),
+        func.count(AttendanceRecord.id).label("marks"),
+    ).join(AttendanceRecord, AttendanceRecord.slot_id == AttendanceSlot.id).filter(
+        AttendanceSlot.room_id.in_(in_rooms)
+    ).group_by(AttendanceSlot.room_id).subquery()
+
+    archived = db.session.query(
+        TermRoomSummary.room_id.label("room_id"),
+        func.sum(TermRoomSummary.sessions).label("sessions"),
+        func.sum(TermRoomSummary.marks).label("marks"),
+    ).filter(TermRoomSummary.room_id.in_(in_rooms)).group_by(TermRoomSummary.room_id).subquery()
+
+    return room_query.outerjoin(slots, slots.c.room_id == Room.id).outerjoin(
+        marks, marks.c.room_id == Room.id
+    ).outerjoin(archived, archived.c.room_id == Room.id).add_columns(
+        (func.coalesce(slots.c.sessions, 0) + func.coalesce(archived.c.sessions, 0)).label("sessions"),
+        slots.c.last_session,
+        (func.coalesce(marks.c.marks, 0) + func.coalesce(archived.c.marks, 0)).label("marks"),
+    )
+
+
+def room_summaries(rows):
+    """Template/JSON-friendly dicts for rooms_with_stats() rows."""
+    out = []
+    for room, sessions, last_session, marks in rows:
+        out.append({
+            "room": room,
+            "sessions": sessions,
+            "last_session": last_session,
+            "marks": marks,
+            "avg_turnout": round(marks / sessions, 1) if sessions else 0,
+        })
+    return out
+
+
+def slot_feed_rows(slot_id, limit=FEED_LIMIT):
+    """Newest marks of a slot, at most `limit`."""
+    rows = db.session.query(
+        User.name, User.email, AttendanceRecord.timestamp, AttendanceRecord.method
+    ).join(User, User.id == AttendanceRecord.student_id).filter(
+        AttendanceRecord.slot_id == slot_id
+    ).order_by(AttendanceRecord.timestamp.desc()).limit(limit)
+    return [FeedRow._make(r) for r in rows]
+
+
+def slot_export_rows(slot_id):
+    """Every mark of a slot, streamed from the cursor in batches."""
+    rows = db.session.query(
+        User.name, User.email, AttendanceRecord.timestamp, AttendanceRecord.method
+    ).join(User, User.id == AttendanceRecord.student_id).filter(
+        AttendanceRecord.slot_id == slot_id
+    ).order_by(AttendanceRecord.timestamp)
+    for r in rows.yield_per(250):
+        yield FeedRow._make(r)
+
+
+def history_page(student_id, page, per_page=HISTORY_PER_PAGE):
+    """One page of a student's marks; pagination.items are HistoryRows."""
+    teacher = db.aliased(User)
+    query = db.session.query(
+        Room.name, AttendanceRecord.timestamp, AttendanceRecord.method, teacher.name
+    ).select_from(AttendanceRecord).join(
+        AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id
+    ).join(Room, Room.id == AttendanceSlot.room_id).outerjoin(
+        teacher, teacher.id == AttendanceSlot.opened_by
+    ).filter(AttendanceRecord.student_id == student_id).order_by(
+        AttendanceRecord.timestamp.desc(), AttendanceRecord.id.desc()
+    )
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination.items = [HistoryRow._make(r) for r in pagination.items]
+    return pagination
@@ -0,0 +1,192 @@
+# app/ratelimit.py
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import request, session, current_app, jsonify
+
+from .tenants import tenant_scoped
+
+
+def parse_rate(value):
+    """'10/60' -> (capacity 10, refill period 60s). Empty or '0' disables."""
+    if not value or value.strip() in ("0", "off"):
+        return None
+    count, _, period = value.partition("/")
+    return int(count), float(period or 60)
+
+
+# ---------------------------------------------------------------------
+# BACKENDS
+# ---------------------------------------------------------------------
+class MemoryBackend:
+    """Per-process token buckets, pruned least-recently-used first."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now=None):
+        """Spend one token; returns (allowed, seconds until next token)."""
+        now = now or time.monotonic()
+        rate = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def size(self):
+        return len(self._buckets)
+
+
+class RedisBackend:
+    """Token buckets shared by all workers through Redis (optional dependency)."""
+
+    SCRIPT = """
+    local b = redis.call('HMGET', KEYS[1], 't', 'u')
+    local cap, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(b[1]) or cap
+    local updated = tonumber(b[2]) or now
+    tokens = math.min(cap, tokens + (now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then tokens = tokens - 1; allowed = 1 end
+    redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(cap / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATELIMIT_STORAGE_URL points at Redis but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, period, now=None):
+        rate = capacity / period
+        allowed, tokens = self._take(keys=[f"rl:{key}"], args=[capacity, rate, now or time.time()])
+        return bool(allowed), 0 if allowed else (1 - float(tokens)) / rate
+
+    def size(self):
+        return None
+
+
+# ---------------------------------------------------------------------
+# LIMITER
+# ---------------------------------------------------------------------
+class RateLimiter:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.enabled = True
+        self.rules = {}             # rule name -> (capacity, period)
+        self.allowed = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def init_app(self, app):
+        self.enabled = app.config["RATELIMIT_ENABLED"]
+        url = app.config["RATELIMIT_STORAGE_URL"]
+        if url.startswith("redis://") or url.startswith("rediss://"):
+            self.backend = RedisBackend(url)
+        self.rules = {}
+        for name, value in app.config["RATELIMITS"].items():
+            rate = parse_rate(value)
+            if rate:
+                self.rules[name] = rate
+
+    def hit(self, rule, ident):
+        """Spend a token for `ident` under `rule`; returns retry-after or None."""
+        limit = self.rules.get(rule)
+        if not self.enabled or not limit or ident is None:
+            return None
+        allowed, retry = self.backend.take(f"{rule}:{ident}", *limit)
+        if allowed:
+            self.allowed[rule] += 1
+            return None
+        self.rejected[rule] += 1
+        return retry
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "tracked_keys": self.backend.size(),
+            "rules": {
+                name: {
+                    "limit": f"{cap}/{int(period)}s",
+                    "allowed": self.allowed[name],
+                    "rejected": self.rejected[name],
+                }
+                for name, (cap, period) in self.rules.items()
+            },
+        }
+
+
+limiter = RateLimiter()
+
+
+def _client_ip():
+    # First hop of X-Forwarded-For only when running behind a trusted proxy
+    if current_app.config["RATELIMIT_TRUST_PROXY"]:
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr
+
+
+def _user_ident():
+    user_id = session.get("_user_id")
+    return tenant_scoped(user_id) if user_id is not None else None
+
+
+def rate_limited(scope):
+    """
+    Admission control for `scope` ("mark" or "sync"): checks the
+    <scope>_user, <scope>_ip and, for marks, slot and PIN buckets using
+    only the session cookie and request body. Place it above
+    @login_required so a refused request costs no user query; anonymous
+    requests only spend the per-IP buckets, never a class's shared slot
+    bucket or someone's user and PIN buckets.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                data = {}
+            user = _user_ident()
+            checks = [(f"{scope}_ip", _client_ip())]
+            if user is not None:
+                checks.append((f"{scope}_user", user))
+                if scope == "mark" and data.get("slot_id") not in (None, ""):
+                    checks.append(("mark_slot", tenant_scoped(str(data.get("slot_id")))))
+            if scope == "mark" and data.get("pin"):
+                # PIN guesses get their own, much smaller budget
+                if user is not None:
+                    checks.append(("pin_user", user))
+                checks.append(("pin_ip", _client_ip()))
+
+            for rule, ident in checks:
+                retry = limiter.hit(rule, ident)
+                if retry is not None:
+                    resp = jsonify({"ok": False, "msg": "Too many attempts, please slow down"})
+                    resp.status_code = 429
+                    resp.headers["Retry-After"] = str(max(int(retry + 0.999), 1))
+                    return resp
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_ratelimit(app):
+    """Called by create_app() inside __init__.py"""
+    limiter.init_app(app)
@@ -0,0 +1,313 @@
+# app/rebuild.py
+"""
+Full rebuild of the maintained aggregates from the attendance tables:
+AttendanceSlot.final_count (per slot) and RoomStats (per room, with
+archived terms read back from their archive files).
+
+The work is split into partitions (room id ranges or term date ranges
+of live slots, plus one per archived term) that rebuild_stats.py runs
+across a process pool. Each partition streams its records, writes the
+final_count values that changed and returns a partial RoomStats per
+room; partials are checkpointed to a JSON file so an interrupted run
+resumes where it stopped. finish() merges them and replaces RoomStats
+in one transaction.
+
+Everything is counted "as of" the run's start: slots that finish
+later are left (or put back) with stats_applied = False and the
+scheduled sweep folds them in on top, so the rebuild is safe to run
+while the app is serving.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import case, delete, or_, select, update
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord, Room, RoomStats, Term
+from .stats import bucket_for, empty_buckets, empty_turnout
+
+CHUNK = 5000
+
+
+class RebuildError(Exception):
+    pass
+
+
+def finished_before(as_of):
+    """Slots that count as finished at `as_of`; the same rule for reads and the final fix-up."""
+    return or_(
+        AttendanceSlot.end_time < as_of,
+        (AttendanceSlot.is_active == False)
+        & or_(AttendanceSlot.closed_at.is_(None), AttendanceSlot.closed_at < as_of),
+    )
+
+
+# ---------------------------------------------------------------------
+# PLAN
+# ---------------------------------------------------------------------
+def plan(by="room", partitions=16):
+    """
+    Partitions for one rebuild, as JSON-able dicts:
+
+      {"kind": "rooms", "lo": 1, "hi": 250}          room_id range (inclusive)
+      {"kind": "period", "lo": iso|None, "hi": iso|None}   start_time range [lo, hi)
+      {"kind": "archive", "term_id": 3}              an archived term's file
+    """
+    parts = []
+    if by == "room":
+        room_ids = [rid for (rid,) in db.session.query(Room.id).order_by(Room.id)]
+        size = max(1, -(-len(room_ids) // partitions))
+        for i in range(0, len(room_ids), size):
+            chunk = room_ids[i:i + size]
+            parts.append({"kind": "rooms", "lo": chunk[0], "hi": chunk[-1]})
+    elif by == "term":
+        # Term boundaries cut time into disjoint intervals, so overlapping
+        # terms and the gaps between them are each counted once
+        cuts = sorted({d for t in Term.query.all() for d in (t.start_date, t.end_date)})
+        bounds = [None] + cuts + [None]
+        for lo, hi in zip(bounds, bounds[1:]):
+            parts.append({"kind": "period",
+                          "lo": lo.isoformat() if lo else None,
+                          "hi": hi.isoformat() if hi else None})
+    else:
+        raise RebuildError(f"Unknown partitioning {by!r} (room or term)")
+
+    for term in Term.query.filter(Term.archived_at.isnot(None)).order_by(Term.start_date):
+        if not term.archive_path or not os.path.exists(term.archive_path):
+            raise RebuildError(f"Archive file of term {term.name} is missing ({term.archive_path}); "
+                               f"its sessions would be dropped from RoomStats")
+        parts.append({"kind": "archive", "term_id": term.id})
+    return parts
+
+
+def partition_name(part):
+    if part["kind"] == "rooms":
+        return f"rooms {part['lo']}-{part['hi']}"
+    if part["kind"] == "period":
+        return f"{(part['lo'] or '…')[:10]} → {(part['hi'] or '…')[:10]}"
+    return f"archived term {part['term_id']}"
+
+
+# ---------------------------------------------------------------------
+# PARTIALS
+# ---------------------------------------------------------------------
+def _fold(partial, room_id, start, stamps):
+    """Add one finished slot and its mark timestamps to `partial`."""
+    room = partial.setdefault(str(room_id), {"sessions": 0, "marks": 0,
+                                             "buckets": empty_buckets(), "turnout": {}})
+    room["sessions"] += 1
+    room["marks"] += len(stamps)
+    if start:
+        for t in stamps:
+            room["buckets"][bucket_for(max((t - start).total_seconds(), 0))] += 1
+        cell = room["turnout"].setdefault(f"{start.weekday()},{start.hour}", [0, 0])
+        cell[0] += 1
+        cell[1] += len(stamps)
+
+
+def _live(part, as_of):
+    """Stream a partition's finished slots with their records; fix final_count on the way."""
+    query = select(
+        AttendanceSlot.id, AttendanceSlot.room_id, AttendanceSlot.start_time,
+        AttendanceSlot.is_active, AttendanceSlot.final_count, AttendanceRecord.timestamp,
+    ).outerjoin(AttendanceRecord, AttendanceRecord.slot_id == AttendanceSlot.id).where(finished_before(as_of))
+
+    if part["kind"] == "rooms":
+        query = query.where(AttendanceSlot.room_id.between(part["lo"], part["hi"]))
+    else:
+        if part["lo"]:
+            query = query.where(AttendanceSlot.start_time >= datetime.fromisoformat(part["lo"]))
+        if part["hi"]:
+            query = query.where(AttendanceSlot.start_time < datetime.fromisoformat(part["hi"]))
+    query = query.order_by(AttendanceSlot.id).execution_options(yield_per=CHUNK)
+
+    partial, fixes = {}, []
+    counts = {"slots": 0, "records": 0, "final_counts": 0}
+    current, stamps = None, []
+
+    def close(slot):
+        slot_id, room_id, start, is_active, final_count = slot
+        _fold(partial, room_id, start, stamps)
+        counts["slots"] += 1
+        counts["records"] += len(stamps)
+        if not is_active and final_count != len(stamps):
+            fixes.append({"id": slot_id, "final_count": len(stamps)})
+
+    # Rows arrive grouped by slot; fixes are written once the cursor is drained
+    for row in db.session.execute(query):
+        if current is None or row.id != current[0]:
+            if current is not None:
+                close(current)
+            current, stamps = row[:5], []
+        if row.timestamp is not None:
+            stamps.append(row.timestamp)
+    if current is not None:
+        close(current)
+    db.session.commit()
+
+    for i in range(0, len(fixes), CHUNK):
+        db.session.execute(update(AttendanceSlot), fixes[i:i + CHUNK])
+        db.session.commit()
+    counts["final_counts"] = len(fixes)
+    return partial, counts
+
+
+def _archived(part):
+    from .archive import read_archive
+
+    term = db.session.get(Term, part["term_id"])
+    partial = {}
+    counts = {"slots": 0, "records": 0, "final_counts": 0}
+    slots, stamps = {}, {}
+
+    def flush():
+        for slot_id, (room_id, start) in slots.items():
+            _fold(partial, room_id, start, stamps.get(slot_id, []))
+            counts["slots"] += 1
+        slots.clear()
+        stamps.clear()
+
+    # The file holds chunks of slot rows, each followed by their records
+    for row in read_archive(term):
+        if row["type"] == "slot":
+            if stamps:
+                flush()
+            start = row["start_time"]
+            slots[row["id"]] = (row["room_id"], datetime.fromisoformat(start) if start else None)
+        elif row["type"] == "record" and row["timestamp"]:
+            stamps.setdefault(row["slot_id"], []).append(datetime.fromisoformat(row["timestamp"]))
+            counts["records"] += 1
+    flush()
+    return partial, counts
+
+
+def run_partition(part, as_of):
+    """Rebuild one partition; returns (partial RoomStats by room, counts)."""
+    if part["kind"] == "archive":
+        return _archived(part)
+    return _live(part, as_of)
+
+
+def merge(partials):
+    merged = {}
+    for partial in partials:
+        for room_id, p in partial.items():
+            room = merged.setdefault(int(room_id), {"sessions": 0, "marks": 0,
+                                                    "buckets": empty_buckets(), "turnout": {}})
+            room["sessions"] += p["sessions"]
+            room["marks"] += p["marks"]
+            room["buckets"] = [a + b for a, b in zip(room["buckets"], p["buckets"])]
+            for key, (s, m) in p["turnout"].items():
+                cell = room["turnout"].setdefault(key, [0, 0])
+                cell[0] += s
+                cell[1] += m
+    return merged
+
+
+# ---------------------------------------------------------------------
+# FINAL WRITE
+# ---------------------------------------------------------------------
+def _upsert_room_stats(rows):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        db.session.execute(delete(RoomStats).where(RoomStats.room_id.in_([r["room_id"] for r in rows])))
+        db.session.execute(RoomStats.__table__.insert(), rows)
+        return
+
+    stmt = insert(RoomStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RoomStats.room_id],
+        set_={c: stmt.excluded[c] for c in ("sessions", "marks", "arrival_buckets", "turnout", "updated_at")},
+    )
+    db.session.execute(stmt, rows)
+
+
+def finish(partials, as_of):
+    """
+    Replace RoomStats with the merged partials and align stats_applied
+    with what was counted, in one transaction. Returns the room count.
+    """
+    merged = merge(partials)
+    now = datetime.utcnow()
+    rows = []
+    for room_id, room in merged.items():
+        turnout = empty_turnout()
+        for key, (s, m) in room["turnout"].items():
+            d, h = map(int, key.split(","))
+            turnout[d][h] = [s, m]
+        rows.append({"room_id": room_id, "sessions": room["sessions"], "marks": room["marks"],
+                     "arrival_buckets": room["buckets"], "turnout": turnout, "updated_at": now})
+
+    try:
+        # Slots finishing after as_of are not in the new rows: hand them back to the sweep
+        counted = finished_before(as_of)
+        db.session.execute(
+            update(AttendanceSlot)
+            .where(AttendanceSlot.stats_applied != case((counted, True), else_=False))
+            .values(stats_applied=case((counted, True), else_=False))
+        )
+        for i in range(0, len(rows), CHUNK):
+            _upsert_room_stats(rows[i:i + CHUNK])
+        stale = delete(RoomStats)
+        if merged:
+            stale = stale.where(RoomStats.room_id.notin_(list(merged)))
+        db.session.execute(stale)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+# ---------------------------------------------------------------------
+# CHECKPOINT
+# ---------------------------------------------------------------------
+class Checkpoint:
+    """
+    Plan, as_of and finished partitions of one rebuild, rewritten
+    atomically after every partition. Deleted once finish() succeeds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            self.state = json.load(f)
+        self.state["as_of"] = datetime.fromisoformat(self.state["as_of"])
+        return self.state
+
+    def begin(self, by, parts, as_of):
+        self.state = {"by": by, "as_of": as_of, "parts": parts, "done": {}}
+        self.save()
+        return self.state
+
+    def complete(self, index, partial, counts):
+        self.state["done"][str(index)] = {"partial": partial, "counts": counts}
+        self.save()
+
+    def pending(self):
+        return [(i, part) for i, part in enumerate(self.state["parts"]) if str(i) not in self.state["done"]]
+
+    def partials(self):
+        return [done["partial"] for done in self.state["done"].values()]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(self.state, as_of=self.state["as_of"].isoformat()), f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
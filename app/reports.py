@@ -0,0 +1,75 @@
+# app/reports.py
+
+import csv
+import io
+
+from . import db
+from .models import AttendanceSlot, AttendanceRecord, User
+
+
+def room_matrix(room_id):
+    """
+    Yield the room x student attendance sheet row by row: a header,
+    one row per student (1 = present) with total and percentage, then a
+    per-session totals row.
+
+    Built from one query over the room's records ordered by student, so
+    only the current student's row and the per-session totals are held
+    in memory.
+    """
+    sessions = db.session.query(AttendanceSlot.id, AttendanceSlot.start_time).filter(
+        AttendanceSlot.room_id == room_id
+    ).order_by(AttendanceSlot.start_time, AttendanceSlot.id).all()
+
+    column = {sid: i for i, (sid, _) in enumerate(sessions)}
+    n = len(sessions)
+    per_session = [0] * n
+
+    yield ["Student Name", "Email"] + [
+        start.strftime("%Y-%m-%d %H:%M") if start else f"#{sid}" for sid, start in sessions
+    ] + ["Attended", "Attendance %"]
+
+    def finish(name, email, marks):
+        attended = sum(marks)
+        pct = round(attended * 100 / n, 1) if n else 0
+        return [name, email] + marks + [attended, pct]
+
+    records = db.session.query(
+        User.id, User.name, User.email, AttendanceRecord.slot_id
+    ).join(AttendanceRecord, AttendanceRecord.student_id == User.id).join(
+        AttendanceSlot, AttendanceSlot.id == AttendanceRecord.slot_id
+    ).filter(AttendanceSlot.room_id == room_id).order_by(User.name, User.id)
+
+    current = None
+    name = email = None
+    marks = None
+    students = 0
+    for user_id, user_name, user_email, slot_id in records.yield_per(2000):
+        if user_id != current:
+            if current is not None:
+                yield finish(name, email, marks)
+            current, name, email = user_id, user_name, user_email
+            marks = [0] * n
+            students += 1
+        i = column.get(slot_id)
+        if i is not None and not marks[i]:
+            marks[i] = 1
+            per_session[i] += 1
+    if current is not None:
+        yield finish(name, email, marks)
+
+    total = sum(per_session)
+    yield ["Present per session", f"{students} students"] + per_session + [
+        total, round(total * 100 / (n * students), 1) if n and students else 0
+    ]
+
+
+def stream_csv(rows):
+    """Yield CSV text one row at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
@@ -0,0 +1,132 @@
+# app/scheduler.py
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import SchedulerLease
+from .tenants import tenants, tenant_context
+
+LEASE_NAME = "scheduler"
+
+
+class Scheduler:
+    """
+    Tiny in-process job runner. Every worker process runs the loop, but
+    only the holder of the SchedulerLease row executes jobs, so a
+    multi-worker gunicorn deployment runs each job once. The lease
+    lives in the default database; each job runs once per tenant.
+    """
+
+    def __init__(self):
+        self._jobs = []             # [name, interval_seconds, func, next_run]
+        self._app = None
+        self._tick = 5
+        self._lease_ttl = timedelta(seconds=30)
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def holder_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        self._app = app
+        self._tick = app.config["SCHEDULER_TICK_SECONDS"]
+        self._lease_ttl = timedelta(seconds=max(self._tick * 6, 30))
+
+    def add_job(self, name, interval, func):
+        """Register `func` to run every `interval` seconds (inside an app context)."""
+        self._jobs.append([name, interval, func, 0.0])
+
+    def start(self):
+        if self._app is None or not self._app.config["SCHEDULER_ENABLED"]:
+            return
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="scheduler", daemon=True).start()
+
+    # -------------------------
+    # Leader lease
+    # -------------------------
+    def acquire_lease(self, now=None):
+        """Take or renew the lease; True if this process is the leader."""
+        now = now or datetime.utcnow()
+        me = self.holder_id
+        expires = now + self._lease_ttl
+
+        taken = db.session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == LEASE_NAME)
+            .where((SchedulerLease.holder == me) | (SchedulerLease.expires_at < now))
+            .values(holder=me, expires_at=expires)
+        ).rowcount
+        if taken:
+            db.session.commit()
+            return True
+
+        if db.session.get(SchedulerLease, LEASE_NAME) is None:
+            try:
+                db.session.add(SchedulerLease(name=LEASE_NAME, holder=me, expires_at=expires))
+                db.session.commit()
+                return True
+            except IntegrityError:
+                pass
+        db.session.rollback()
+        return False
+
+    # -------------------------
+    # Loop
+    # -------------------------
+    def run_due(self, now=None):
+        now = now or time.monotonic()
+        for job in self._jobs:
+            name, interval, func, next_run = job
+            if now < next_run:
+                continue
+            job[3] = now + interval
+            for tenant in tenants.keys():
+                with tenant_context(self._app, tenant):
+                    try:
+                        func()
+                    except Exception as e:
+                        db.session.rollback()
+                        self._app.logger.warning("Scheduled job %s failed for %s: %s", name, tenant, e)
+
+    def _run(self):
+        while True:
+            with self._app.app_context():
+                try:
+                    if self.acquire_lease():
+                        self.run_due()
+                except Exception as e:
+                    db.session.rollback()
+                    self._app.logger.warning("Scheduler tick failed: %s", e)
+                finally:
+                    db.session.remove()
+            time.sleep(self._tick)
+
+
+scheduler = Scheduler()
+
+
+def init_scheduler(app):
+    """Called by create_app() inside __init__.py"""
+    from .slots import expire_slots
+
+    scheduler.init_app(app)
+    scheduler.add_job("expire_slots", app.config["SCHEDULER_TICK_SECONDS"], expire_slots)
+
+    @app.before_request
+    def start_scheduler():
+        scheduler.start()
@@ -0,0 +1,177 @@
+# app/slots.py
+
+import secrets
+from datetime import datetime
+
+from flask import current_app
+from flask.signals import Namespace
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .cache import cached
+from .models import AttendanceSlot, AttendanceRecord
+
+_signals = Namespace()
+
+# Sent after a slot is closed and committed, with slot_id and room_id.
+# Caches and aggregates subscribe to this to evict / update themselves.
+slot_closed = _signals.signal("slot-closed")
+
+# Largest primary key a driver accepts (signed 64-bit); larger ids overflow
+MAX_ID = 2 ** 63 - 1
+
+
+def find_markable_slot(slot_id=None, pin=None, now=None):
+    """
+    Resolve the slot a mark is aimed at: by primary key when slot_id is
+    given (QR payloads, dashboard), else by PIN among open slots. Either
+    way the cost does not depend on how many sessions are running.
+    """
+    now = now or datetime.utcnow()
+    slot = None
+
+    if slot_id not in (None, ""):
+        try:
+            slot_id = int(slot_id)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if not 0 < slot_id <= MAX_ID:
+            return None
+        slot = db.session.get(AttendanceSlot, slot_id)
+    elif pin:
+        slot = AttendanceSlot.query.filter(
+            AttendanceSlot.pin_code == str(pin),
+            AttendanceSlot.is_active == True
+        ).order_by(AttendanceSlot.start_time.desc()).first()
+
+    if not slot or not slot.is_active:
+        return None
+    if slot.start_time and slot.start_time > now:
+        return None
+    if slot.end_time and slot.end_time < now:
+        return None
+    return slot
+
+
+def unused_pin(attempts=20):
+    """A 5-digit PIN not held by any open slot, so PIN lookups are unambiguous."""
+    pin = None
+    for _ in range(attempts):
+        pin = f"{secrets.randbelow(100000):05d}"
+        taken = db.session.query(AttendanceSlot.query.filter(
+            AttendanceSlot.pin_code == pin,
+            AttendanceSlot.is_active == True
+        ).exists()).scalar()
+        if not taken:
+            return pin
+    return pin
+
+
+@cached(15 * 60)
+def qr_png(url):
+    """PNG bytes of a QR code for `url`; a slot's URL never changes, so render once."""
+    import io
+    import qrcode
+
+    img = qrcode.make(url)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _final_counts(slot_ids):
+    rows = db.session.query(
+        AttendanceRecord.slot_id, func.count(AttendanceRecord.id)
+    ).filter(AttendanceRecord.slot_id.in_(slot_ids)).group_by(AttendanceRecord.slot_id).all()
+    return dict(rows)
+
+
+def _announce(slots):
+    app = current_app._get_current_object()
+    for slot in slots:
+        slot_closed.send(app, slot_id=slot.id, room_id=slot.room_id)
+
+
+def finalize_slot(slot, when=None):
+    """Close one slot and store its final attendance count."""
+    slot.is_active = False
+    slot.closed_at = when or datetime.utcnow()
+    slot.final_count = _final_counts([slot.id]).get(slot.id, 0)
+    db.session.commit()
+    _announce([slot])
+    return slot
+
+
+def expire_slots(now=None, limit=500):
+    """
+    Close active slots whose end_time has passed. Run periodically
+    by the scheduler so is_active stays an accurate, narrow filter.
+    """
+    now = now or datetime.utcnow()
+    expired = AttendanceSlot.query.filter(
+        AttendanceSlot.is_active == True,
+        AttendanceSlot.end_time < now
+    ).order_by(AttendanceSlot.end_time).limit(limit).all()
+    if not expired:
+        return 0
+
+    counts = _final_counts([s.id for s in expired])
+    for slot in expired:
+        slot.is_active = False
+        slot.closed_at = slot.end_time
+        slot.final_count = counts.get(slot.id, 0)
+    db.session.commit()
+
+    _announce(expired)
+    return len(expired)
+
+
+def insert_marks(rows):
+    """
+    Insert attendance_records rows in the caller's transaction. Rows a
+    concurrent request already stored (the unique slot + student index
+    rejects them) are skipped; returns the rows actually inserted.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(AttendanceRecord), rows)
+        return rows
+    except IntegrityError:
+        pass
+    # Some row lost a race: insert one by one to keep the others
+    inserted = []
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(AttendanceRecord), [row])
+            inserted.append(row)
+        except IntegrityError:
+            continue
+    return inserted
+
+
+def account_late_marks(slot, stamps):
+    """
+    Keep final_count and RoomStats right when marks land on a slot that
+    was already finalised (offline sync, event-log projection). Runs in
+    the caller's transaction after the records are inserted; lock the
+    slot row first.
+    """
+    from . import stats
+
+    if not stamps:
+        return
+    db.session.execute(
+        update(AttendanceSlot)
+        .where(AttendanceSlot.id == slot.id, AttendanceSlot.final_count.isnot(None))
+        .values(final_count=AttendanceSlot.final_count + len(stamps))
+    )
+    # Not slot.stats_applied, which may predate the insert: a concurrent
+    # apply_slot() has either committed by now or will count these rows
+    # (on SQLite the insert holds the write lock)
+    applied = db.session.execute(
+        select(AttendanceSlot.stats_applied).where(AttendanceSlot.id == slot.id)
+    ).scalar()
+    if applied:
+        stats.apply_late_marks(slot, stamps)
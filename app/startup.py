@@ -0,0 +1,97 @@
+# app/startup.py
+
+import importlib
+
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from . import db
+from .migrations import missing_columns, missing_unique_indexes
+from .models import SchemaVersion, SCHEMA_VERSION
+from .tenants import tenants, tenant_context, engines
+
+# Imported on first use by the routes that need them (see auth.google,
+# main.slot_qr); warm_up() loads them ahead of time.
+HEAVY_MODULES = (
+    "authlib.integrations.flask_client",
+    "requests",
+    "qrcode",
+    "PIL.Image",
+    "PIL.PngImagePlugin",
+)
+
+
+def _current_version():
+    try:
+        return db.session.query(SchemaVersion.version).order_by(SchemaVersion.id.desc()).limit(1).scalar()
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()       # table missing: pre-versioning or empty database
+        return None
+
+
+def check_schema(app):
+    """
+    One SELECT against schema_version instead of create_all() on every
+    boot. SCHEMA_CHECK=create (default) creates missing tables and
+    stamps the version when it is behind, but refuses to start while
+    existing tables lack columns or unique indexes (create_all() cannot
+    add them);
+    "strict" refuses to start whenever the version is behind; "off"
+    skips the check. Every tenant database is checked.
+    """
+    mode = app.config["SCHEMA_CHECK"]
+    if mode == "off":
+        return
+
+    try:
+        for key in tenants.keys():
+            with tenant_context(app, key):
+                _check_tenant(app, key, mode)
+    finally:
+        # Never hand a pooled connection to forked workers (--preload)
+        with app.app_context():
+            for engine in engines():
+                engine.dispose()
+
+
+def _check_tenant(app, key, mode):
+    current = _current_version()
+    if current == SCHEMA_VERSION:
+        return
+    if current is not None and current > SCHEMA_VERSION:
+        app.logger.warning("Database schema of %s is v%s, newer than this code (v%s)", key, current, SCHEMA_VERSION)
+        return
+    if mode == "strict":
+        raise RuntimeError(
+            f"Database schema of {key} is v{current}, code expects v{SCHEMA_VERSION}; "
+            "run the migration or start once with SCHEMA_CHECK=create"
+        )
+    db.metadata.create_all(db.session.connection())
+    db.session.commit()
+    missing = missing_columns()
+    if missing:
+        columns = ", ".join(f"{table}.{c}" for table, names in missing.items() for c in names)
+        raise RuntimeError(
+            f"Database schema of {key} lacks columns the code needs ({columns}); "
+            "back it up and run python fix_database.py, option 15 (Upgrade Schema)"
+        )
+    unique = missing_unique_indexes()
+    if unique:
+        raise RuntimeError(
+            f"Database schema of {key} lacks unique indexes the code needs ({', '.join(unique)}); "
+            "back it up and run python fix_database.py, option 15 (Upgrade Schema)"
+        )
+    db.session.add(SchemaVersion(version=SCHEMA_VERSION))
+    db.session.commit()
+    app.logger.info("Database schema of %s created/updated to v%s", key, SCHEMA_VERSION)
+
+
+def warm_up():
+    """
+    Import the lazily-loaded modules now. gunicorn.conf.py calls this
+    in the --preload parent so workers fork with them already shared.
+    """
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
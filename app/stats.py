@@ -0,0 +1,247 @@
+# app/stats.py
+
+import os
+import queue
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+
+from . import db
+from .models import Room, AttendanceSlot, AttendanceRecord, RoomStats
+from .tenants import current_tenant, tenant_context
+
+# Upper bounds (seconds after slot start) of the arrival-latency buckets;
+# the last bucket is open-ended.
+ARRIVAL_BUCKETS = [30, 60, 120, 180, 300, 600]
+ARRIVAL_LABELS = ["<30s", "30-60s", "1-2m", "2-3m", "3-5m", "5-10m", "10m+"]
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def empty_buckets():
+    return [0] * (len(ARRIVAL_BUCKETS) + 1)
+
+
+def empty_turnout():
+    return [[[0, 0] for _ in range(24)] for _ in range(7)]
+
+
+def bucket_for(seconds):
+    for i, bound in enumerate(ARRIVAL_BUCKETS):
+        if seconds < bound:
+            return i
+    return len(ARRIVAL_BUCKETS)
+
+
+# ---------------------------------------------------------------------
+# INCREMENTAL UPDATE
+# ---------------------------------------------------------------------
+def apply_slot(slot_id):
+    """
+    Fold one finished slot into its room's RoomStats. The slot is
+    claimed with a conditional UPDATE so it is counted exactly once,
+    even with several workers running this job.
+    """
+    claimed = db.session.execute(
+        update(AttendanceSlot)
+        .where(AttendanceSlot.id == slot_id, AttendanceSlot.stats_applied == False)
+        .values(stats_applied=True)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return False
+
+    slot = db.session.get(AttendanceSlot, slot_id)
+    stamps = [t for (t,) in db.session.query(AttendanceRecord.timestamp).filter(
+        AttendanceRecord.slot_id == slot_id
+    )]
+
+    stats = db.session.query(RoomStats).filter_by(room_id=slot.room_id).with_for_update().first()
+    if not stats:
+        stats = RoomStats(room_id=slot.room_id, sessions=0, marks=0,
+                          arrival_buckets=empty_buckets(), turnout=empty_turnout())
+        db.session.add(stats)
+
+    buckets = list(stats.arrival_buckets or empty_buckets())
+    for t in stamps:
+        if t and slot.start_time:
+            buckets[bucket_for(max((t - slot.start_time).total_seconds(), 0))] += 1
+
+    turnout = [[list(cell) for cell in row] for row in (stats.turnout or empty_turnout())]
+    if slot.start_time:
+        cell = turnout[slot.start_time.weekday()][slot.start_time.hour]
+        cell[0] += 1
+        cell[1] += len(stamps)
+
+    # Reassign so SQLAlchemy sees the JSON columns as changed
+    stats.arrival_buckets = buckets
+    stats.turnout = turnout
+    stats.sessions = (stats.sessions or 0) + 1
+    stats.marks = (stats.marks or 0) + len(stamps)
+    stats.updated_at = datetime.utcnow()
+
+    db.session.commit()
+    return True
+
+
+def apply_late_marks(slot, stamps):
+    """
+    Add marks that arrived after `slot` was already folded in (offline
+    sync). Runs inside the caller's transaction; the caller commits.
+    """
+    stats = db.session.query(RoomStats).filter_by(room_id=slot.room_id).with_for_update().first()
+    if not stats or not stamps:
+        return
+
+    buckets = list(stats.arrival_buckets or empty_buckets())
+    for t in stamps:
+        if t and slot.start_time:
+            buckets[bucket_for(max((t - slot.start_time).total_seconds(), 0))] += 1
+
+    turnout = [[list(cell) for cell in row] for row in (stats.turnout or empty_turnout())]
+    if slot.start_time:
+        turnout[slot.start_time.weekday()][slot.start_time.hour][1] += len(stamps)
+
+    stats.arrival_buckets = buckets
+    stats.turnout = turnout
+    stats.marks = (stats.marks or 0) + len(stamps)
+    stats.updated_at = datetime.utcnow()
+
+
+def pending_slot_ids(now=None, limit=200):
+    """Finished slots (closed or past end_time) not yet folded in."""
+    now = now or datetime.utcnow()
+    rows = db.session.query(AttendanceSlot.id).filter(
+        AttendanceSlot.stats_applied == False,
+        (AttendanceSlot.is_active == False) | (AttendanceSlot.end_time < now)
+    ).order_by(AttendanceSlot.id).limit(limit).all()
+    return [r.id for r in rows]
+
+
+def catch_up():
+    applied = 0
+    for slot_id in pending_slot_ids():
+        if apply_slot(slot_id):
+            applied += 1
+    return applied
+
+
+# ---------------------------------------------------------------------
+# READ HELPERS (for templates)
+# ---------------------------------------------------------------------
+def summarize(stats_rows):
+    """Merge one or more RoomStats rows into a template-friendly dict."""
+    buckets = empty_buckets()
+    turnout = empty_turnout()
+    sessions = marks = 0
+
+    for st in stats_rows:
+        if not st:
+            continue
+        sessions += st.sessions or 0
+        marks += st.marks or 0
+        for i, n in enumerate(st.arrival_buckets or []):
+            buckets[i] += n
+        for d, row in enumerate(st.turnout or []):
+            for h, (s, m) in enumerate(row):
+                turnout[d][h][0] += s
+                turnout[d][h][1] += m
+
+    if not sessions:
+        return None
+
+    peak = max(buckets) or 1
+    hours = sorted({h for row in turnout for h, (s, _) in enumerate(row) if s})
+    grid = []
+    for d, row in enumerate(turnout):
+        cells = []
+        for h in hours:
+            s, m = row[h]
+            cells.append(round(m / s, 1) if s else None)
+        grid.append({"day": WEEKDAYS[d], "cells": cells})
+
+    return {
+        "sessions": sessions,
+        "marks": marks,
+        "avg_turnout": round(marks / sessions, 1),
+        "arrival": [
+            {"label": label, "count": n, "pct": round(n * 100 / peak)}
+            for label, n in zip(ARRIVAL_LABELS, buckets)
+        ],
+        "hours": hours,
+        "heatmap": [row for row in grid if any(c is not None for c in row["cells"])],
+    }
+
+
+def room_summary(room_id):
+    return summarize([db.session.get(RoomStats, room_id)])
+
+
+def teacher_summary(teacher_id):
+    rows = RoomStats.query.join(Room, Room.id == RoomStats.room_id).filter(
+        Room.created_by == teacher_id
+    ).all()
+    return summarize(rows)
+
+
+# ---------------------------------------------------------------------
+# BACKGROUND WORKER
+# ---------------------------------------------------------------------
+class StatsWorker:
+    """
+    Applies closed slots as they are queued. Slots missed here (e.g. a
+    worker restarted with a non-empty queue) are picked up by the
+    scheduled catch_up() sweep.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._app = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+
+    def enqueue(self, slot_id):
+        self.start()
+        self._queue.put((current_tenant(), slot_id))
+
+    def start(self):
+        if self._thread_pid == os.getpid() or self._app is None:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="room-stats", daemon=True).start()
+
+    def _run(self):
+        while True:
+            tenant, slot_id = self._queue.get()
+            with tenant_context(self._app, tenant):
+                try:
+                    apply_slot(slot_id)
+                except Exception as e:
+                    db.session.rollback()
+                    self._app.logger.warning("Room stats update failed: %s", e)
+                finally:
+                    db.session.remove()
+
+
+worker = StatsWorker()
+
+
+def _on_slot_closed(app, slot_id, room_id, **extra):
+    worker.enqueue(slot_id)
+
+
+def init_stats(app):
+    """Called by create_app() inside __init__.py"""
+    from .scheduler import scheduler
+    from .slots import slot_closed
+
+    worker.init_app(app)
+    slot_closed.connect(_on_slot_closed, app)
+    scheduler.add_job("room_stats_sweep", app.config["STATS_SWEEP_SECONDS"], catch_up)
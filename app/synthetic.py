@@ -0,0 +1,183 @@
+# app/synthetic.py
+"""
+Synthetic institution data for load and query-plan testing: users,
+rooms that meet weekly, closed slots and their marks, bulk-inserted
+with executemany in chunks (no ORM objects per row).
+
+Used by generate_data.py (CLI) and query_plans.py.
+"""
+
+import hashlib
+import random
+import secrets
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, update, text
+
+from . import db
+from .models import User, Room, AttendanceSlot, AttendanceRecord, Term
+
+CHUNK = 20000
+
+
+def _chunks(rows, size=CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _arrival_seconds(rng, duration):
+    """Most students arrive in the first minute or two, with a long tail."""
+    return min(rng.lognormvariate(3.8, 0.8), duration - 1)
+
+
+def _fast_sqlite():
+    # Bulk load only: no fsync per commit, journal in memory
+    if db.session.get_bind().dialect.name == "sqlite":
+        db.session.execute(text("PRAGMA synchronous=OFF"))
+        db.session.execute(text("PRAGMA journal_mode=MEMORY"))
+
+
+def generate(students=2000, teachers=40, rooms=60, sessions=40, roster=80, turnout=0.8,
+             terms=1, duration_min=10, seed=1, end=None, progress=None):
+    """
+    Load one institution's worth of history and return the row counts.
+
+    Every room meets `sessions` times, weekly on a fixed weekday and
+    hour, ending at `end` (default now), split evenly into `terms`
+    Term rows. Each room has a random roster of `roster` students;
+    each student attends with their own probability around `turnout`.
+    `progress(stage, done, total)` is called as rows are written.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda stage, done, total: None)
+    end = end or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    first_week = end - timedelta(weeks=sessions)
+    domain = current_app.config.get("ALLOWED_DOMAIN") or "example.edu"
+    prefix = f"syn{seed}"
+    now = datetime.utcnow()
+
+    _fast_sqlite()
+
+    # Users
+    db.session.execute(insert(User), [
+        {"name": f"Teacher {i}", "email": f"{prefix}-t{i}@{domain}", "role": "teacher",
+         "is_banned": False, "created_at": first_week}
+        for i in range(teachers)
+    ])
+    for done, batch in enumerate(_chunks(
+        {"name": f"Student {i}", "email": f"{prefix}-s{i}@{domain}", "role": "student",
+         "is_banned": False, "created_at": first_week}
+        for i in range(students)
+    )):
+        db.session.execute(insert(User), batch)
+        progress("users", min((done + 1) * CHUNK, students), students)
+    db.session.commit()
+
+    teacher_ids = [uid for (uid,) in db.session.query(User.id).filter(
+        User.email.like(f"{prefix}-t%")).order_by(User.id)]
+    student_ids = [uid for (uid,) in db.session.query(User.id).filter(
+        User.email.like(f"{prefix}-s%")).order_by(User.id)]
+    fingerprints = {sid: hashlib.sha256(f"{prefix}-device-{sid}".encode()).hexdigest() for sid in student_ids}
+    propensity = {sid: rng.betavariate(turnout * 10, (1 - turnout) * 10) for sid in student_ids}
+
+    # Rooms and terms
+    db.session.execute(insert(Room), [
+        {"name": f"{prefix.upper()} Course {i:04d}", "created_by": teacher_ids[i % len(teacher_ids)],
+         "created_at": first_week}
+        for i in range(rooms)
+    ])
+    room_rows = db.session.query(Room.id, Room.created_by).filter(
+        Room.name.like(f"{prefix.upper()} Course %")).order_by(Room.id).all()
+
+    weeks_per_term = -(-sessions // terms)
+    for t in range(terms):
+        db.session.add(Term(
+            name=f"{prefix} term {t + 1}",
+            start_date=first_week + timedelta(weeks=t * weeks_per_term),
+            end_date=min(first_week + timedelta(weeks=(t + 1) * weeks_per_term), end + timedelta(days=7)),
+        ))
+    db.session.commit()
+
+    # Slots: each room has a weekly meeting time
+    duration = timedelta(minutes=duration_min)
+    meeting = {room_id: timedelta(days=rng.randrange(5), hours=rng.randrange(8, 18))
+               for room_id, _ in room_rows}
+    total_slots = rooms * sessions
+    written = 0
+    for batch in _chunks(
+        {
+            "room_id": room_id, "opened_by": teacher_id,
+            "start_time": first_week + timedelta(weeks=w) + meeting[room_id],
+            "end_time": first_week + timedelta(weeks=w) + meeting[room_id] + duration,
+            "closed_at": first_week + timedelta(weeks=w) + meeting[room_id] + duration,
+            "is_active": False, "stats_applied": False,
+            "require_pin": w % 5 == 0, "pin_code": f"{rng.randrange(100000):05d}" if w % 5 == 0 else None,
+            "qr_token": secrets.token_urlsafe(24),
+        }
+        for room_id, teacher_id in room_rows for w in range(sessions)
+    ):
+        db.session.execute(insert(AttendanceSlot), batch)
+        written += len(batch)
+        progress("slots", written, total_slots)
+    db.session.commit()
+
+    room_ids = [room_id for room_id, _ in room_rows]
+    slots = db.session.query(AttendanceSlot.id, AttendanceSlot.room_id, AttendanceSlot.start_time).filter(
+        AttendanceSlot.room_id.in_(room_ids)).order_by(AttendanceSlot.id).all()
+
+    # Marks
+    rosters = {room_id: rng.sample(student_ids, min(roster, len(student_ids))) for room_id in room_ids}
+    seconds = duration.total_seconds()
+    counts = {}
+
+    def records():
+        for slot_id, room_id, start in slots:
+            n = 0
+            for sid in rosters[room_id]:
+                if rng.random() >= propensity[sid]:
+                    continue
+                n += 1
+                yield {
+                    "slot_id": slot_id, "student_id": sid,
+                    "timestamp": start + timedelta(seconds=_arrival_seconds(rng, seconds)),
+                    "fingerprint_hash": fingerprints[sid],
+                    "method": "pin" if rng.random() < 0.15 else "qr",
+                }
+            counts[slot_id] = n
+
+    expected = int(len(slots) * roster * turnout)
+    written = 0
+    for batch in _chunks(records()):
+        db.session.execute(insert(AttendanceRecord), batch)
+        db.session.commit()
+        written += len(batch)
+        progress("records", written, expected)
+
+    # Final counts, as finalize_slot() would have stored them
+    for batch in _chunks(({"id": slot_id, "final_count": n} for slot_id, n in counts.items())):
+        db.session.execute(update(AttendanceSlot), batch)
+    db.session.commit()
+
+    # Sign-ins spread over the term
+    for batch in _chunks(({"id": uid, "last_login": now - timedelta(hours=rng.randrange(24 * 14))}
+                          for uid in student_ids + teacher_ids)):
+        db.session.execute(update(User), batch)
+    db.session.commit()
+
+    return {
+        "users": len(student_ids) + len(teacher_ids),
+        "rooms": len(room_rows),
+        "terms": terms,
+        "slots": len(slots),
+        "records": written,
+        "teacher_ids": teacher_ids,
+        "student_ids": student_ids,
+        "room_ids": room_ids,
+    }
@@ -0,0 +1,302 @@
+# app/tailwind.py
+"""
+Build-time generator for the subset of Tailwind (v3) utilities the
+templates use. It replaces the in-browser Play CDN compiler: only
+classes found in the scanned files are emitted ("purged" output).
+"""
+
+import re
+
+# ---------------------------------------------------------------------
+# THEME
+# ---------------------------------------------------------------------
+SCREENS = [("sm", "640px"), ("md", "768px"), ("lg", "1024px"), ("xl", "1280px")]
+
+_PALETTE = {
+    "slate": "f8fafc f1f5f9 e2e8f0 cbd5e1 94a3b8 64748b 475569 334155 1e293b 0f172a",
+    "gray": "f9fafb f3f4f6 e5e7eb d1d5db 9ca3af 6b7280 4b5563 374151 1f2937 111827",
+    "red": "fef2f2 fee2e2 fecaca fca5a5 f87171 ef4444 dc2626 b91c1c 991b1b 7f1d1d",
+    "amber": "fffbeb fef3c7 fde68a fcd34d fbbf24 f59e0b d97706 b45309 92400e 78350f",
+    "yellow": "fefce8 fef9c3 fef08a fde047 facc15 eab308 ca8a04 a16207 854d0e 713f12",
+    "green": "f0fdf4 dcfce7 bbf7d0 86efac 4ade80 22c55e 16a34a 15803d 166534 14532d",
+    "teal": "f0fdfa ccfbf1 99f6e4 5eead4 2dd4bf 14b8a6 0d9488 0f766e 115e59 134e4a",
+    "cyan": "ecfeff cffafe a5f3fc 67e8f9 22d3ee 06b6d4 0891b2 0e7490 155e75 164e63",
+    "blue": "eff6ff dbeafe bfdbfe 93c5fd 60a5fa 3b82f6 2563eb 1d4ed8 1e40af 1e3a8a",
+    "indigo": "eef2ff e0e7ff c7d2fe a5b4fc 818cf8 6366f1 4f46e5 4338ca 3730a3 312e81",
+}
+COLORS = {"white": "#fff", "black": "#000", "transparent": "transparent", "current": "currentColor"}
+for _name, _hexes in _PALETTE.items():
+    for _shade, _hex in zip((50, 100, 200, 300, 400, 500, 600, 700, 800, 900), _hexes.split()):
+        COLORS[f"{_name}-{_shade}"] = f"#{_hex}"
+
+FONT_SIZES = {
+    "xs": ("0.75rem", "1rem"), "sm": ("0.875rem", "1.25rem"), "base": ("1rem", "1.5rem"),
+    "lg": ("1.125rem", "1.75rem"), "xl": ("1.25rem", "1.75rem"), "2xl": ("1.5rem", "2rem"),
+    "3xl": ("1.875rem", "2.25rem"), "4xl": ("2.25rem", "2.5rem"), "5xl": ("3rem", "1"),
+    "6xl": ("3.75rem", "1"), "7xl": ("4.5rem", "1"), "8xl": ("6rem", "1"), "9xl": ("8rem", "1"),
+}
+FONT_WEIGHTS = {"light": "300", "normal": "400", "medium": "500", "semibold": "600", "bold": "700"}
+MAX_WIDTHS = {
+    "xs": "20rem", "sm": "24rem", "md": "28rem", "lg": "32rem", "xl": "36rem", "2xl": "42rem",
+    "3xl": "48rem", "4xl": "56rem", "5xl": "64rem", "6xl": "72rem", "7xl": "80rem", "full": "100%",
+}
+RADII = {"": "0.25rem", "sm": "0.125rem", "md": "0.375rem", "lg": "0.5rem", "xl": "0.75rem",
+         "2xl": "1rem", "full": "9999px", "none": "0px"}
+SHADOWS = {
+    "sm": "0 1px 2px 0 rgb(0 0 0 / 0.05)",
+    "": "0 1px 3px 0 rgb(0 0 0 / 0.1), 0 1px 2px -1px rgb(0 0 0 / 0.1)",
+    "md": "0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1)",
+    "lg": "0 10px 15px -3px rgb(0 0 0 / 0.1), 0 4px 6px -4px rgb(0 0 0 / 0.1)",
+    "xl": "0 20px 25px -5px rgb(0 0 0 / 0.1), 0 8px 10px -6px rgb(0 0 0 / 0.1)",
+    "none": "0 0 #0000",
+}
+
+PREFLIGHT = """*,::before,::after{box-sizing:border-box;border-width:0;border-style:solid;border-color:#e5e7eb}
+html{line-height:1.5;-webkit-text-size-adjust:100%;tab-size:4;font-family:ui-sans-serif,system-ui,-apple-system,"Segoe UI",Roboto,"Helvetica Neue",Arial,sans-serif}
+body{margin:0;line-height:inherit}
+hr{height:0;color:inherit;border-top-width:1px}
+h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}
+a{color:inherit;text-decoration:inherit}
+b,strong{font-weight:bolder}
+code,kbd,samp,pre{font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,monospace;font-size:1em}
+small{font-size:80%}
+table{text-indent:0;border-color:inherit;border-collapse:collapse}
+button,input,optgroup,select,textarea{font-family:inherit;font-size:100%;font-weight:inherit;line-height:inherit;color:inherit;margin:0;padding:0}
+button,select{text-transform:none}
+button,[type=button],[type=reset],[type=submit]{-webkit-appearance:button;background-color:transparent;background-image:none}
+blockquote,dl,dd,h1,h2,h3,h4,h5,h6,hr,figure,p,pre{margin:0}
+fieldset{margin:0;padding:0}
+ol,ul,menu{list-style:none;margin:0;padding:0}
+textarea{resize:vertical}
+input::placeholder,textarea::placeholder{opacity:1;color:#9ca3af}
+button,[role=button]{cursor:pointer}
+:disabled{cursor:default}
+img,svg,video,canvas,audio,iframe,embed,object{display:block;vertical-align:middle}
+img,video{max-width:100%;height:auto}
+[hidden]{display:none}
+"""
+
+
+# ---------------------------------------------------------------------
+# UTILITIES
+# ---------------------------------------------------------------------
+def _space(v):
+    if v == "px":
+        return "1px"
+    if v == "0":
+        return "0px"
+    try:
+        n = float(v)
+    except ValueError:
+        return None
+    return f"{n / 4:g}rem"
+
+
+def _arbitrary(v):
+    if v.startswith("[") and v.endswith("]"):
+        return v[1:-1].replace("_", " ")
+    return None
+
+
+def _color(v):
+    return COLORS.get(v) or _arbitrary(v)
+
+
+def _size(v):
+    if v == "full":
+        return "100%"
+    if v == "auto":
+        return "auto"
+    if v == "screen":
+        return "100vh"
+    return _space(v) or _arbitrary(v)
+
+
+_SIDES = {"": [""], "x": ["-left", "-right"], "y": ["-top", "-bottom"],
+          "t": ["-top"], "b": ["-bottom"], "l": ["-left"], "r": ["-right"]}
+_BORDER_SIDES = {"": [""], "x": ["-left", "-right"], "y": ["-top", "-bottom"],
+                 "t": ["-top"], "b": ["-bottom"], "l": ["-left"], "r": ["-right"]}
+
+_STATIC = {
+    "block": "display:block", "inline-block": "display:inline-block", "inline": "display:inline",
+    "flex": "display:flex", "inline-flex": "display:inline-flex", "grid": "display:grid",
+    "table": "display:table", "hidden": "display:none",
+    "static": "position:static", "fixed": "position:fixed", "absolute": "position:absolute",
+    "relative": "position:relative", "sticky": "position:sticky",
+    "flex-row": "flex-direction:row", "flex-col": "flex-direction:column",
+    "flex-wrap": "flex-wrap:wrap", "flex-1": "flex:1 1 0%", "flex-none": "flex:none",
+    "items-start": "align-items:flex-start", "items-center": "align-items:center",
+    "items-end": "align-items:flex-end",
+    "justify-start": "justify-content:flex-start", "justify-center": "justify-content:center",
+    "justify-end": "justify-content:flex-end", "justify-between": "justify-content:space-between",
+    "overflow-hidden": "overflow:hidden", "overflow-auto": "overflow:auto",
+    "overflow-x-auto": "overflow-x:auto", "overflow-y-auto": "overflow-y:auto",
+    "table-auto": "table-layout:auto", "table-fixed": "table-layout:fixed",
+    "text-left": "text-align:left", "text-center": "text-align:center", "text-right": "text-align:right",
+    "uppercase": "text-transform:uppercase", "underline": "text-decoration-line:underline",
+    "no-underline": "text-decoration-line:none", "italic": "font-style:italic",
+    "truncate": "overflow:hidden;text-overflow:ellipsis;white-space:nowrap",
+    "whitespace-nowrap": "white-space:nowrap", "break-all": "word-break:break-all",
+    "font-mono": "font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,monospace",
+    "font-sans": "font-family:ui-sans-serif,system-ui,sans-serif",
+    "cursor-pointer": "cursor:pointer",
+    "transition": "transition-property:color,background-color,border-color,text-decoration-color,fill,stroke,"
+                  "opacity,box-shadow,transform,filter;transition-timing-function:cubic-bezier(0.4,0,0.2,1);"
+                  "transition-duration:150ms",
+    "outline-none": "outline:2px solid transparent;outline-offset:2px",
+    "border": "border-width:1px",
+    "mx-auto": "margin-left:auto;margin-right:auto",
+    "w-auto": "width:auto",
+}
+
+
+def _rules():
+    """(pattern, builder) in output order; builder returns declarations or None."""
+    def sides(prop, table, value_fn):
+        def build(m):
+            value = value_fn(m.group(2))
+            if value is None:
+                return None
+            return ";".join(f"{prop}{s}:{value}" for s in table[m.group(1)])
+        return build
+
+    return [
+        (r"(static|fixed|absolute|relative|sticky)", None),
+        (r"(top|right|bottom|left|inset)-(.+)", lambda m: (
+            f"{'top:{0};right:{0};bottom:{0};left:{0}' if m.group(1) == 'inset' else m.group(1) + ':{0}'}"
+            .format(_size(m.group(2))) if _size(m.group(2)) else None)),
+        (r"z-(\d+)", lambda m: f"z-index:{m.group(1)}"),
+        (r"col-span-(\d+)", lambda m: f"grid-column:span {m.group(1)} / span {m.group(1)}"),
+        (r"(m)([xytblr]?)-(.+)", lambda m: sides("margin", _SIDES, _size)(re.match(r"(\w?)-(.+)", f"{m.group(2)}-{m.group(3)}"))),
+        (r"(block|inline-block|inline|flex|inline-flex|grid|table|hidden)", None),
+        (r"h-(.+)", lambda m: f"height:{_size(m.group(1))}" if _size(m.group(1)) else None),
+        (r"w-(.+)", lambda m: f"width:{_size(m.group(1))}" if _size(m.group(1)) else None),
+        (r"max-w-(.+)", lambda m: f"max-width:{MAX_WIDTHS.get(m.group(1)) or _arbitrary(m.group(1))}"
+            if MAX_WIDTHS.get(m.group(1)) or _arbitrary(m.group(1)) else None),
+        (r"(flex-1|flex-none|flex-row|flex-col|flex-wrap)", None),
+        (r"(table-auto|table-fixed)", None),
+        (r"(cursor-pointer)", None),
+        (r"grid-cols-(\d+)", lambda m: f"grid-template-columns:repeat({m.group(1)},minmax(0,1fr))"),
+        (r"(items-\w+|justify-\w+)", None),
+        (r"gap-(.+)", lambda m: f"gap:{_space(m.group(1))}" if _space(m.group(1)) else None),
+        (r"space-([xy])-(.+)", None),   # handled in _selector_rule
+        (r"(overflow-[\w-]+|truncate|whitespace-nowrap|break-all)", None),
+        (r"rounded(?:-(\w+))?", lambda m: f"border-radius:{RADII[m.group(1) or '']}"
+            if (m.group(1) or "") in RADII else None),
+        (r"(border)", None),
+        (r"border-([xytblr])(?:-(\d+))?", lambda m: ";".join(
+            f"border{s}-width:{m.group(2) or 1}px" for s in _BORDER_SIDES[m.group(1)])),
+        (r"border-(\d+)", lambda m: f"border-width:{m.group(1)}px"),
+        (r"border-(.+)", lambda m: f"border-color:{_color(m.group(1))}" if _color(m.group(1)) else None),
+        (r"bg-(.+)", lambda m: f"background-color:{_color(m.group(1))}" if _color(m.group(1)) else None),
+        (r"p([xytblr]?)-(.+)", sides("padding", _SIDES, _space)),
+        (r"(text-left|text-center|text-right)", None),
+        (r"(font-mono|font-sans)", None),
+        (r"text-(xs|sm|base|lg|\dxl|xl)", lambda m: "font-size:{0};line-height:{1}".format(*FONT_SIZES[m.group(1)])
+            if m.group(1) in FONT_SIZES else None),
+        (r"font-(\w+)", lambda m: f"font-weight:{FONT_WEIGHTS[m.group(1)]}" if m.group(1) in FONT_WEIGHTS else None),
+        (r"(uppercase|italic)", None),
+        (r"text-(.+)", lambda m: f"color:{_color(m.group(1))}" if _color(m.group(1)) else None),
+        (r"(underline|no-underline)", None),
+        (r"opacity-(\d+)", lambda m: f"opacity:{int(m.group(1)) / 100:g}"),
+        (r"shadow(?:-(\w+))?", lambda m: f"box-shadow:{SHADOWS[m.group(1) or '']}"
+            if (m.group(1) or "") in SHADOWS else None),
+        (r"(outline-none)", None),
+        (r"(transition)", None),
+    ]
+
+
+_RULES = [(re.compile(p + r"$"), b) for p, b in _rules()]
+_VARIANTS = {"hover": ":hover", "focus": ":focus", "active": ":active", "disabled": ":disabled"}
+_SCREEN_PX = dict(SCREENS)
+
+
+def _escape(cls):
+    return re.sub(r"([^a-zA-Z0-9_-])", r"\\\1", cls)
+
+
+def _declarations(utility):
+    """(order, declarations, selector suffix) for a bare utility, or None."""
+    if utility in ("mx-auto", "w-auto"):
+        order = 4 if utility == "mx-auto" else 7
+        return order, _STATIC[utility], ""
+    m = re.match(r"space-([xy])-(.+)$", utility)
+    if m and _space(m.group(2)):
+        prop = "margin-top" if m.group(1) == "y" else "margin-left"
+        return 15, f"{prop}:{_space(m.group(2))}", " > :not([hidden]) ~ :not([hidden])"
+    for order, (pattern, build) in enumerate(_RULES):
+        m = pattern.match(utility)
+        if not m:
+            continue
+        if build is None:
+            decls = _STATIC.get(utility)
+        else:
+            try:
+                decls = build(m)
+            except (KeyError, AttributeError, TypeError):
+                decls = None
+        if decls:
+            return order, decls, ""
+    return None
+
+
+def parse(cls):
+    """Split 'md:hover:text-sm' into (screen, pseudo, utility) or None."""
+    *variants, utility = cls.split(":") if not cls.startswith("[") else [cls]
+    screen = pseudo = ""
+    for v in variants:
+        if v in _SCREEN_PX and not screen:
+            screen = v
+        elif v in _VARIANTS and not pseudo:
+            pseudo = _VARIANTS[v]
+        else:
+            return None
+    return screen, pseudo, utility
+
+
+def generate(candidates):
+    """
+    CSS for every candidate string that is a known utility. Returns
+    (css, classes) where classes are the ones emitted.
+    """
+    plain, states, screens = [], [], {s: [] for s, _ in SCREENS}
+    emitted = []
+    for cls in sorted(set(candidates)):
+        parsed = parse(cls)
+        if not parsed:
+            continue
+        screen, pseudo, utility = parsed
+        found = _declarations(utility)
+        if not found:
+            continue
+        order, decls, suffix = found
+        rule = (order, f".{_escape(cls)}{pseudo}{suffix}{{{decls}}}")
+        if screen:
+            screens[screen].append(rule)
+        elif pseudo:
+            states.append(rule)
+        else:
+            plain.append(rule)
+        emitted.append(cls)
+
+    out = [r for _, r in sorted(plain)] + [r for _, r in sorted(states)]
+    for screen, px in SCREENS:
+        if screens[screen]:
+            out.append(f"@media (min-width:{px}){{" + "".join(r for _, r in sorted(screens[screen])) + "}")
+    return "\n".join(out) + "\n", emitted
+
+
+_TOKEN = re.compile(r"[^\s\"'`<>{}=,;]+")
+
+
+def candidates(text):
+    """Every token in a template/script that could be a class name."""
+    return {t.strip("()") if not t.endswith("])") else t for t in _TOKEN.findall(text)}
+
+
+def class_attributes(text):
+    """Tokens that appear inside class="..." attributes (for reporting)."""
+    found = set()
+    for value in re.findall(r'class="([^"]*)"', text):
+        found.update(t for t in value.split() if "{" not in t and "}" not in t and "'" not in t)
+    return found
@@ -1,13 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, abort, stream_with_context
 from flask_login import login_required, current_user
-from .models import Room, AttendanceSlot, AttendanceRecord, User
+from .models import Room, AttendanceSlot, AttendanceRecord, User, TimetableEntry
 from . import db
+from . import stats
+from .slots import finalize_slot, unused_pin
+from .presence import presence
+from .archive import archived_totals_for_teacher
+from .reports import room_matrix, stream_csv
+from .xlsx import stream_xlsx
+from .queries import (
+    sessions_with_counts, session_summaries, enrolled_students, rooms_with_stats, room_summaries,
+    slot_feed_rows, slot_export_rows, FEED_LIMIT,
+)
 from datetime import datetime, timedelta
-import random, secrets
+import secrets
 
 teacher_bp = Blueprint("teacher", __name__)
 
-print("✓ Teacher blueprint created")
 
 @teacher_bp.before_request
 def ensure_teacher():
@@ -28,17 +37,16 @@ def dashboard():
     total_rooms = Room.query.filter_by(created_by=current_user.id).count()
     
     # Get all students
-    total_students = User.query.filter_by(role="student", is_banned=False).count()
+    total_students = enrolled_students()
     
-    # Calculate average attendance across all sessions
-    all_slots = AttendanceSlot.query.join(Room).filter(Room.created_by == current_user.id).all()
-    total_attendance = 0
-    total_possible = 0
-    
-    for slot in all_slots:
-        attended = AttendanceRecord.query.filter_by(slot_id=slot.id).count()
-        total_attendance += attended
-        total_possible += total_students
+    # Calculate average attendance across all sessions (two COUNTs, no per-slot queries)
+    total_slots = AttendanceSlot.query.join(Room).filter(Room.created_by == current_user.id).count()
+    total_attendance = AttendanceRecord.query.join(AttendanceSlot).join(Room).filter(
+        Room.created_by == current_user.id
+    ).count()
+    archived_slots, archived_marks = archived_totals_for_teacher(current_user.id)
+    total_attendance += archived_marks
+    total_possible = (total_slots + archived_slots) * total_students
     
     avg_attendance = round((total_attendance / total_possible) * 100, 1) if total_possible else 0
     
@@ -50,10 +58,16 @@ def dashboard():
         AttendanceSlot.end_time >= now
     ).join(Room).filter(Room.created_by == current_user.id).first()
     
-    # Get recent sessions
-    recent_sessions = AttendanceSlot.query.join(Room).filter(
-        Room.created_by == current_user.id
-    ).order_by(AttendanceSlot.start_time.desc()).limit(5).all()
+    # Get recent sessions with their attendance counts
+    recent_query = AttendanceSlot.query.join(Room).filter(Room.created_by == current_user.id)
+    recent_sessions = session_summaries(
+        sessions_with_counts(recent_query).options(db.contains_eager(AttendanceSlot.room))
+        .order_by(AttendanceSlot.start_time.desc()).limit(5).all(),
+        total_students
+    )
+
+    # Precomputed arrival / turnout histograms across this teacher's rooms
+    room_stats = stats.teacher_summary(current_user.id)
     
     return render_template(
         "teacher/dashboard.html",
@@ -61,17 +75,48 @@ def dashboard():
         total_students=total_students,
         avg_attendance=avg_attendance,
         active_session=active_session,
-        recent_sessions=recent_sessions
+        recent_sessions=recent_sessions,
+        room_stats=room_stats
     )
 
 
 # ---------------------------------------------------------------------
 # ROOMS MANAGEMENT
 # ---------------------------------------------------------------------
+def _rooms_page():
+    page = request.args.get("page", 1, type=int)
+    room_query = Room.query.filter_by(created_by=current_user.id)
+    pagination = rooms_with_stats(room_query).order_by(Room.created_at.desc()).paginate(
+        page=page, per_page=24, error_out=False
+    )
+    return pagination, room_summaries(pagination.items)
+
+
 @teacher_bp.route("/rooms")
 def rooms():
-    rooms = Room.query.filter_by(created_by=current_user.id).order_by(Room.created_at.desc()).all()
-    return render_template("teacher/rooms.html", rooms=rooms)
+    pagination, rooms = _rooms_page()
+    return render_template("teacher/rooms.html", rooms=rooms, pagination=pagination)
+
+
+@teacher_bp.route("/rooms.json")
+def rooms_json():
+    """Same per-room stats as the rooms page, as JSON"""
+    pagination, rooms = _rooms_page()
+    return jsonify({
+        "ok": True,
+        "page": pagination.page,
+        "pages": pagination.pages,
+        "total": pagination.total,
+        "rooms": [{
+            "id": r["room"].id,
+            "name": r["room"].name,
+            "created_at": r["room"].created_at.isoformat() if r["room"].created_at else None,
+            "sessions": r["sessions"],
+            "last_session": r["last_session"].isoformat() if r["last_session"] else None,
+            "marks": r["marks"],
+            "avg_turnout": r["avg_turnout"],
+        } for r in rooms]
+    })
 
 
 @teacher_bp.route("/rooms/create", methods=["GET","POST"])
@@ -112,7 +157,7 @@ def open_slot():
         qr_token = secrets.token_urlsafe(32)
         
         if require_pin:
-            pin_code = f"{random.randint(0,99999):05d}"
+            pin_code = unused_pin()
         
         slot = AttendanceSlot(
             room_id=room_id, 
@@ -126,6 +171,7 @@ def open_slot():
         )
         db.session.add(slot)
         db.session.commit()
+        presence.load(slot)
         
         flash(f"Attendance slot opened! {'PIN: ' + pin_code if pin_code else ''}", "success")
         return redirect(url_for("teacher.slot_live", slot_id=slot.id))
@@ -142,12 +188,82 @@ def close_slot(slot_id):
     if room.created_by != current_user.id and not current_user.is_admin():
         return jsonify({"ok": False, "msg": "Unauthorized"}), 403
     
-    slot.is_active = False
-    db.session.commit()
+    # Stores the final count and notifies stats/caches via slot_closed
+    finalize_slot(slot)
     
     return jsonify({"ok": True, "msg": "Slot closed"})
 
 
+# ---------------------------------------------------------------------
+# TIMETABLE (slots opened automatically, see timetable.py)
+# ---------------------------------------------------------------------
+@teacher_bp.route("/timetable", methods=["GET","POST"])
+def timetable():
+    rooms = Room.query.filter_by(created_by=current_user.id).order_by(Room.name).all()
+
+    if request.method == "POST":
+        try:
+            room_id = int(request.form.get("room_id"))
+            weekday = int(request.form.get("weekday"))
+            start_time = datetime.strptime(request.form.get("start_time", ""), "%H:%M").time()
+            duration_min = int(request.form.get("duration", "5"))
+        except (TypeError, ValueError):
+            flash("Room, day, time and duration are required", "danger")
+            return redirect(url_for("teacher.timetable"))
+
+        if room_id not in {r.id for r in rooms} or not 0 <= weekday <= 6 or not 1 <= duration_min <= 180:
+            flash("Invalid timetable entry", "danger")
+            return redirect(url_for("teacher.timetable"))
+
+        entry = TimetableEntry(
+            room_id=room_id,
+            created_by=current_user.id,
+            weekday=weekday,
+            start_time=start_time,
+            duration_min=duration_min,
+            require_pin=request.form.get("require_pin") == "on"
+        )
+        db.session.add(entry)
+        db.session.commit()
+        flash("Class added to your timetable", "success")
+        return redirect(url_for("teacher.timetable"))
+
+    entries = TimetableEntry.query.filter_by(created_by=current_user.id).order_by(
+        TimetableEntry.weekday, TimetableEntry.start_time
+    ).all()
+    return render_template(
+        "teacher/timetable.html",
+        rooms=rooms,
+        entries=entries,
+        weekdays=TimetableEntry.WEEKDAYS,
+        timezone=current_app.config["TIMETABLE_TIMEZONE"]
+    )
+
+
+def _own_entry(entry_id):
+    entry = TimetableEntry.query.get_or_404(entry_id)
+    if entry.created_by != current_user.id and not current_user.is_admin():
+        abort(403)
+    return entry
+
+
+@teacher_bp.route("/timetable/<int:entry_id>/toggle", methods=["POST"])
+def toggle_timetable_entry(entry_id):
+    entry = _own_entry(entry_id)
+    entry.is_enabled = not entry.is_enabled
+    db.session.commit()
+    return redirect(url_for("teacher.timetable"))
+
+
+@teacher_bp.route("/timetable/<int:entry_id>/delete", methods=["POST"])
+def delete_timetable_entry(entry_id):
+    entry = _own_entry(entry_id)
+    db.session.delete(entry)
+    db.session.commit()
+    flash("Class removed from your timetable", "success")
+    return redirect(url_for("teacher.timetable"))
+
+
 # ---------------------------------------------------------------------
 # LIVE ATTENDANCE FEED
 # ---------------------------------------------------------------------
@@ -175,26 +291,26 @@ def slot_feed(slot_id):
     if room.created_by != current_user.id and not current_user.is_admin():
         return jsonify({"ok": False, "msg": "Unauthorized"}), 403
     
-    # Get attendance records
-    recs = AttendanceRecord.query.filter_by(slot_id=slot.id).order_by(
-        AttendanceRecord.timestamp.desc()
-    ).limit(200).all()
-    
-    # Build JSON response
-    out = []
-    for r in recs:
-        u = User.query.get(r.student_id)
-        out.append({
-            "name": u.name,
-            "email": u.email,
-            "timestamp": r.timestamp.isoformat(),
-            "method": r.method
-        })
+    # Newest FEED_LIMIT marks as plain rows; the total comes from the
+    # presence bitmap, or is counted in SQL past the first page
+    rows = slot_feed_rows(slot.id)
+    total = presence.count(slot)
+    if total is None:
+        total = len(rows)
+        if total >= FEED_LIMIT:
+            total = AttendanceRecord.query.filter_by(slot_id=slot.id).count()
+    missing = presence.missing(slot) if slot.is_active else None
     
     return jsonify({
         "ok": True, 
-        "records": out,
-        "total": len(out),
+        "records": [{
+            "name": r.name,
+            "email": r.email,
+            "timestamp": r.timestamp.isoformat(),
+            "method": r.method
+        } for r in rows],
+        "total": total,
+        "missing": None if missing is None else [{"name": name, "email": email} for _, name, email in missing],
         "is_active": slot.is_active
     })
 
@@ -213,25 +329,46 @@ def slot_export(slot_id):
         flash("Unauthorized", "danger")
         return redirect(url_for("teacher.dashboard"))
     
-    import csv, io
-    
-    recs = db.session.query(AttendanceRecord, User).join(
-        User, User.id == AttendanceRecord.student_id
-    ).filter(AttendanceRecord.slot_id == slot_id).all()
-    
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["Student Name", "Email", "Timestamp", "Method"])
-    
-    for rec, user in recs:
-        cw.writerow([user.name, user.email, rec.timestamp.isoformat(), rec.method])
-    
-    output = si.getvalue()
+    def rows():
+        yield ["Student Name", "Email", "Timestamp", "Method"]
+        for r in slot_export_rows(slot_id):
+            yield [r.name, r.email, r.timestamp.isoformat(), r.method]
     
     return current_app.response_class(
-        output, 
+        stream_with_context(stream_csv(rows())), 
         mimetype="text/csv", 
         headers={
             "Content-Disposition": f"attachment;filename=attendance_slot_{slot_id}.csv"
         }
-    )
\ No newline at end of file
+    )
+
+
+# ---------------------------------------------------------------------
+# ROOM REPORT (room x student matrix)
+# ---------------------------------------------------------------------
+@teacher_bp.route("/rooms/<int:room_id>/report.<fmt>")
+def room_report(room_id, fmt):
+    """Stream the whole-term attendance sheet for a room as CSV or XLSX"""
+    room = Room.query.get_or_404(room_id)
+    if room.created_by != current_user.id and not current_user.is_admin():
+        flash("Unauthorized", "danger")
+        return redirect(url_for("teacher.dashboard"))
+
+    rows = room_matrix(room.id)
+    filename = f"attendance_room_{room.id}"
+
+    if fmt == "csv":
+        body, mimetype = stream_csv(rows), "text/csv"
+    elif fmt == "xlsx":
+        body = stream_xlsx(rows, sheet_name=room.name)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        abort(404)
+
+    return current_app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment;filename={filename}.{fmt}"
+        }
+    )
@@ -0,0 +1,171 @@
+# app/tenants.py
+"""
+Multi-institution tenancy. Every tenant (institution) has its own
+database, registered as a SQLAlchemy bind under the tenant's key; the
+default tenant is DATABASE_URL / ALLOWED_DOMAIN as before.
+
+A request is routed to a tenant by hostname (TENANTS[key]["hosts"]) or,
+on shared hosts, by the tenant recorded in the session at login from
+the email domain. TenantSession sends every query to that tenant's
+engine, and per-process state (caches, buffers, queues, directories)
+is keyed by tenant, so one worker pool serves several institutions
+without their rows ever sharing a table.
+
+Background work runs once per tenant inside tenant_context().
+"""
+
+import json
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+DEFAULT = "default"
+
+Tenant = namedtuple("Tenant", "key domains hosts public_url")
+
+
+def load_tenants(path):
+    """
+    TENANTS_FILE is JSON of the form
+        {"<key>": {"database_url": "...", "domains": ["uni.edu"],
+                   "hosts": ["attend.uni.edu"], "public_url": "https://attend.uni.edu"}}
+    """
+    if not path:
+        return {}
+    with open(path) as f:
+        config = json.load(f)
+    if DEFAULT in config:
+        raise ValueError(f"Tenant key {DEFAULT!r} is reserved for DATABASE_URL")
+    for key, tenant in config.items():
+        if not tenant.get("database_url"):
+            raise ValueError(f"Tenant {key!r} has no database_url")
+    return config
+
+
+class Tenants:
+    def __init__(self):
+        self.tenants = {DEFAULT: Tenant(DEFAULT, (), (), None)}
+        self._by_domain = {}
+        self._by_host = {}
+
+    def init_app(self, app):
+        """Register the tenant binds; must run before db.init_app()."""
+        allowed = app.config["ALLOWED_DOMAIN"]
+        self.tenants = {DEFAULT: Tenant(DEFAULT, (allowed,) if allowed else (), (), app.config["PUBLIC_URL"])}
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        for key, conf in app.config["TENANTS"].items():
+            self.tenants[key] = Tenant(
+                key,
+                tuple(d.lower() for d in conf.get("domains", ())),
+                tuple(h.lower() for h in conf.get("hosts", ())),
+                conf.get("public_url"),
+            )
+            binds[key] = conf["database_url"]
+        app.config["SQLALCHEMY_BINDS"] = binds
+
+        self._by_domain = {d: t.key for t in self.tenants.values() for d in t.domains}
+        self._by_host = {h: t.key for t in self.tenants.values() for h in t.hosts}
+
+    def keys(self):
+        return list(self.tenants)
+
+    def get(self, key):
+        return self.tenants[key]
+
+    def for_email(self, email):
+        """Tenant key owning the email's domain, or None if no tenant accepts it."""
+        domain = email.rsplit("@", 1)[-1].lower()
+        key = self._by_domain.get(domain)
+        if key is None and not self.tenants[DEFAULT].domains:
+            return DEFAULT          # no ALLOWED_DOMAIN: default tenant takes anyone
+        return key
+
+    def for_host(self, host):
+        return self._by_host.get(host.split(":", 1)[0].lower())
+
+
+tenants = Tenants()
+
+
+def current_tenant():
+    if has_app_context():
+        return g.get("tenant", DEFAULT)
+    return DEFAULT
+
+
+def bind_key(key=None):
+    """SQLAlchemy bind of a tenant (None is the default engine)."""
+    key = key or current_tenant()
+    return None if key == DEFAULT else key
+
+
+def tenant_scoped(value):
+    """Namespace a cache key, tag, or store key by the current tenant."""
+    key = current_tenant()
+    return value if key == DEFAULT else f"{key}/{value}"
+
+
+def tenant_dir(base):
+    """Per-tenant subdirectory of `base` (the default tenant keeps `base` itself)."""
+    key = current_tenant()
+    return base if key == DEFAULT else os.path.join(base, key)
+
+
+def engines():
+    """Every tenant's engine."""
+    from . import db
+    return [db.engines[bind_key(key)] for key in tenants.keys()]
+
+
+@contextmanager
+def tenant_context(app, key):
+    """An app context whose db.session and scoped state belong to tenant `key`."""
+    with app.app_context():
+        g.tenant = key
+        yield
+
+
+def activate(key):
+    """Switch the current request to tenant `key` (login) and remember it."""
+    from . import db
+
+    if current_tenant() != key:
+        db.session.remove()
+    g.tenant = key
+    session["tenant"] = key
+
+
+class TenantSession(Session):
+    """db.session that sends every statement to the current tenant's engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = bind_key()
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _resolve_tenant():
+    host_key = tenants.for_host(request.host)
+    # A login without a tenant (from before tenancy) belongs to DEFAULT
+    session_key = session.get("tenant", DEFAULT if "_user_id" in session else None)
+    if host_key:
+        if session_key is not None and session_key != host_key:
+            # Logged in to another institution: never carry the user id across
+            for key in ("_user_id", "_fresh", "_id", "tenant"):
+                session.pop(key, None)
+        g.tenant = host_key
+    elif session_key in tenants.tenants:
+        g.tenant = session_key
+    else:
+        g.tenant = DEFAULT
+
+
+def init_tenants(app):
+    """Called by create_app() inside __init__.py, before db.init_app()"""
+    tenants.init_app(app)
+    app.before_request(_resolve_tenant)
@@ -0,0 +1,152 @@
+# app/timetable.py
+"""
+Recurring timetable: every TimetableEntry opens an attendance slot on
+its weekday and time without a teacher pressing "Start Session".
+
+The scheduler job runs on the lease holder every tick. An occurrence
+is claimed TIMETABLE_LEAD_SECONDS ahead of its start: the slot row is
+created then (start_time in the future, so it is neither markable nor
+shown on dashboards yet), the QR is rendered into the cache, and a
+timer refreshes the active-slot and roster caches the moment it starts.
+"""
+
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app, url_for
+from sqlalchemy import update, or_
+
+from . import db
+from .cache import cache
+from .presence import presence
+from .models import TimetableEntry, AttendanceSlot
+from .slots import unused_pin, qr_png
+from .tenants import tenants, current_tenant, tenant_context
+
+
+def _tz():
+    return ZoneInfo(current_app.config["TIMETABLE_TIMEZONE"])
+
+
+def occurrences(entry, now, tz):
+    """UTC (naive) start times of `entry` on the local days around `now`."""
+    local_today = now.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    for offset in (-1, 0, 1):
+        day = local_today + timedelta(days=offset)
+        if day.weekday() != entry.weekday:
+            continue
+        local_start = datetime.combine(day, entry.start_time, tzinfo=tz)
+        yield local_start.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _claim(entry, start):
+    """Mark `start` as opened for `entry`; False if another run already did."""
+    return db.session.execute(
+        update(TimetableEntry)
+        .where(TimetableEntry.id == entry.id)
+        .where(or_(TimetableEntry.last_opened_for == None, TimetableEntry.last_opened_for < start))
+        .values(last_opened_for=start)
+    ).rowcount == 1
+
+
+def open_due(now=None):
+    """
+    Create the slot of every enabled entry that starts within the lead
+    time (or started and has not ended, e.g. after downtime). Returns
+    the number of slots opened.
+    """
+    now = now or datetime.utcnow()
+    tz = _tz()
+    lead = timedelta(seconds=current_app.config["TIMETABLE_LEAD_SECONDS"])
+
+    opened = []
+    for entry in TimetableEntry.query.filter_by(is_enabled=True).all():
+        for start in occurrences(entry, now, tz):
+            end = start + timedelta(minutes=entry.duration_min)
+            if not (start - lead <= now < end):
+                continue
+            if entry.last_opened_for and entry.last_opened_for >= start:
+                continue
+            if not _claim(entry, start):
+                continue
+
+            slot = AttendanceSlot(
+                room_id=entry.room_id,
+                opened_by=entry.created_by,
+                start_time=start,
+                end_time=end,
+                is_active=True,
+                pin_code=unused_pin() if entry.require_pin else None,
+                qr_token=secrets.token_urlsafe(32),
+                require_pin=entry.require_pin
+            )
+            db.session.add(slot)
+            db.session.flush()
+            entry.last_slot_id = slot.id
+            opened.append(slot)
+
+    if not opened:
+        db.session.rollback()
+        return 0
+    db.session.commit()
+
+    for slot in opened:
+        presence.load(slot)
+        prerender_qr(slot)
+        _at_start(slot.id, slot.start_time)
+    return len(opened)
+
+
+# ---------------------------------------------------------------------
+# PRE-WARMING
+# ---------------------------------------------------------------------
+def prerender_qr(slot):
+    """
+    Render the slot's QR into the cache under the URL main.slot_qr will
+    build. Needs the tenant's public_url (PUBLIC_URL for the default
+    tenant) outside a request.
+    """
+    base_url = tenants.get(current_tenant()).public_url
+    if not base_url:
+        return
+    with current_app.test_request_context(base_url=base_url):
+        url = url_for("main.qr_mark", slot_id=slot.id, token=slot.qr_token, _external=True)
+    qr_png(url)
+
+
+def warm_started():
+    """Rebuild the active-slot and roster entries now that a slot has started."""
+    from .queries import active_sessions, enrolled_students
+
+    # Dashboards read in the lead window cached "no session"; drop that
+    cache.invalidate("dashboard.active")
+    active_sessions()
+    enrolled_students()
+
+
+def _at_start(slot_id, start):
+    app = current_app._get_current_object()
+    tenant = current_tenant()
+
+    def run():
+        with tenant_context(app, tenant):
+            try:
+                warm_started()
+            except Exception as e:
+                app.logger.warning("Timetable warm-up for slot %s failed: %s", slot_id, e)
+            finally:
+                db.session.remove()
+
+    delay = max(0.0, (start - datetime.utcnow()).total_seconds())
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.start()
+
+
+def init_timetable(app):
+    """Called by create_app() inside __init__.py"""
+    from .scheduler import scheduler
+
+    scheduler.add_job("timetable", app.config["SCHEDULER_TICK_SECONDS"], open_due)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Shared cache server
+Serves one LRU cache on a Unix socket so every gunicorn worker on the
+host shares entries and invalidations. Start it before the app and
+set CACHE_URL=unix:///path/to/cache.sock.
+"""
+
+import sys
+
+from app.cache import serve
+
+path = sys.argv[1] if len(sys.argv) > 1 else "/tmp/attendance-cache.sock"
+max_entries = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+server = serve(path, max_entries)
+print(f"Cache server listening on {path} (max {max_entries} entries, Ctrl+C to stop)")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    print("\nStopped.")
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Database Utility Script
-Run this to reset database, create admin, or check configuration
+Run this to reset database, create admin, check configuration, or
+maintain a production database (sizes, indexes, vacuum, integrity)
 """
 
 import sys
@@ -166,6 +167,317 @@ def check_config():
         print("❌ Some configuration is missing. Check your .env file.")
 
 
+def shared_devices():
+    """Report groups of students who marked from the same device"""
+    print("📱 Shared Device Report\n")
+
+    from datetime import datetime
+    from app import create_app
+    from app.devices import shared_device_clusters
+
+    since_raw = input("From date (YYYY-MM-DD, blank for all): ").strip()
+    until_raw = input("To date   (YYYY-MM-DD, blank for all): ").strip()
+    try:
+        since = datetime.strptime(since_raw, '%Y-%m-%d') if since_raw else None
+        until = datetime.strptime(until_raw, '%Y-%m-%d') if until_raw else None
+    except ValueError:
+        print("❌ Invalid date")
+        return
+
+    app = create_app()
+
+    with app.app_context():
+        clusters = shared_device_clusters(since, until)
+
+        if not clusters:
+            print("✅ No shared devices found.")
+            return
+
+        print(f"Found {len(clusters)} group(s) of students sharing devices:\n")
+        for i, g in enumerate(clusters, 1):
+            print(f"#{i}: {len(g['students'])} students, {g['devices']} device(s), {g['marks']} marks")
+            for u in g['students']:
+                print(f"     - {u.email}")
+
+
+def create_term():
+    """Define a term (date range) that can later be archived"""
+    print("🗓️  Create Term")
+
+    from datetime import datetime
+
+    name = input("Term name (e.g. Autumn 2026): ").strip()
+    try:
+        start = datetime.strptime(input("Start date (YYYY-MM-DD): ").strip(), '%Y-%m-%d')
+        end = datetime.strptime(input("End date   (YYYY-MM-DD, exclusive): ").strip(), '%Y-%m-%d')
+    except ValueError:
+        print("❌ Invalid date")
+        return
+
+    if not name or end <= start:
+        print("❌ Name required and end date must be after start date")
+        return
+
+    from app import create_app, db
+    from app.models import Term
+
+    app = create_app()
+
+    with app.app_context():
+        if Term.query.filter_by(name=name).first():
+            print(f"❌ Term already exists: {name}")
+            return
+        db.session.add(Term(name=name, start_date=start, end_date=end))
+        db.session.commit()
+        print(f"✅ Created term: {name}")
+
+
+def archive_term():
+    """Move a finished term's sessions to an archive file + summary rows"""
+    print("📦 Archive Term\n")
+
+    from app import create_app
+    from app.models import Term
+    from app.archive import archive_term as do_archive, ArchiveError
+
+    app = create_app()
+
+    with app.app_context():
+        terms = Term.query.filter(Term.archived_at.is_(None)).order_by(Term.start_date).all()
+        if not terms:
+            print("No unarchived terms.")
+            return
+
+        for t in terms:
+            print(f"  {t.id:<4} {t.name:<25} {t.start_date:%Y-%m-%d} → {t.end_date:%Y-%m-%d}")
+
+        choice = input("\nTerm ID to archive: ").strip()
+        term = Term.query.get(int(choice)) if choice.isdigit() else None
+        if not term:
+            print("❌ Unknown term")
+            return
+
+        confirm = input(f"Archive {term.name}? Its sessions leave the live tables. (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("Cancelled.")
+            return
+
+        try:
+            do_archive(term)
+        except ArchiveError as e:
+            print(f"❌ {e}")
+            return
+
+        print(f"✅ Archived {term.sessions_archived} sessions / {term.records_archived} records")
+        print(f"   File: {term.archive_path}")
+
+
+def replay_event_log():
+    """Re-apply the whole attendance event log to the tables"""
+    print("🔁 Replay Event Log\n")
+
+    from app import create_app
+    from app.eventlog import replay
+
+    app = create_app()
+
+    with app.app_context():
+        directory = app.config["EVENT_LOG_DIR"]
+        confirm = input(f"Re-apply every event in {directory} and rebuild final counts and room stats? (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("Cancelled.")
+            return
+        print(f"✅ Re-applied {replay(directory)} events, aggregates rebuilt")
+
+
+def _size(n):
+    if n is None:
+        return "?"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def size_report():
+    """Rows and on-disk size of every table and index"""
+    print("📏 Table & Index Sizes\n")
+
+    from app import create_app
+    from app.maintenance import table_sizes
+
+    app = create_app()
+
+    with app.app_context():
+        sizes = table_sizes()
+
+        print(f"{'Table':<28} {'Rows':>12} {'Data':>10} {'Indexes':>10}")
+        print("-" * 64)
+        for t in sizes["tables"]:
+            print(f"{t['name']:<28} {t['rows']:>12,} {_size(t['bytes']):>10} {_size(t['index_bytes']):>10}")
+
+        print(f"\n{'Index':<44} {'Size':>10} {'Scans':>10}")
+        print("-" * 66)
+        for ix in sizes["indexes"]:
+            scans = "-" if ix["scans"] is None else f"{ix['scans']:,}"
+            print(f"{ix['name']:<44} {_size(ix['bytes']):>10} {scans:>10}")
+
+
+def index_health():
+    """Missing, invalid and unused indexes, and hot queries that scan"""
+    print("🩺 Index Health\n")
+
+    from app import create_app
+    from app.maintenance import index_report, dialect
+
+    app = create_app()
+
+    with app.app_context():
+        report = index_report()
+
+        if report["missing"]:
+            print("Missing (declared by the models, absent here; build with option 12):")
+            for name in report["missing"]:
+                print(f"  ✗ {name}")
+        if report["invalid"]:
+            print("Invalid (interrupted concurrent build; option 12 rebuilds them):")
+            for name in report["invalid"]:
+                print(f"  ✗ {name}")
+        if report["scans"]:
+            print("Hot queries scanning a whole large table:")
+            for name, tables in report["scans"]:
+                print(f"  ✗ {name}: {', '.join(tables)}")
+        if report["unused"]:
+            if dialect() == "postgresql":
+                print("Unused (no scans since statistics were reset; candidates to drop):")
+            else:
+                print("Not used by any hot query (SQLite keeps no usage counts):")
+            for name in report["unused"]:
+                print(f"  · {name}")
+
+        if not (report["missing"] or report["invalid"] or report["scans"]):
+            print("✅ Every hot query is served by an index.")
+
+
+def build_indexes():
+    """Create missing or invalid indexes without taking the app down"""
+    print("🏗️  Build Missing Indexes\n")
+
+    from app import create_app
+    from app.maintenance import index_report, build_index, dialect
+
+    app = create_app()
+
+    with app.app_context():
+        report = index_report()
+        names = report["missing"] + [n for n in report["invalid"] if n not in report["missing"]]
+        if not names:
+            print("✅ No missing or invalid indexes.")
+            return
+
+        for name in names:
+            print(f"  {name}")
+        how = "CONCURRENTLY (writes continue)" if dialect() == "postgresql" else "while writers wait (SQLite)"
+        confirm = input(f"\nBuild {len(names)} index(es) {how}? (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("Cancelled.")
+            return
+
+        for name in names:
+            print(f"  building {name} ...", end="", flush=True)
+            build_index(name)
+            print(" ✓")
+        print("✅ Indexes built")
+
+
+def vacuum_database():
+    """Reclaim space and refresh planner statistics"""
+    print("🧹 Vacuum / Analyze\n")
+
+    from app import create_app
+    from app.maintenance import vacuum, dialect
+
+    app = create_app()
+
+    with app.app_context():
+        full = False
+        if dialect() == "sqlite":
+            full = input("Full VACUUM? Rewrites the file and blocks writers (yes/no): ").lower() == 'yes'
+        for line in vacuum(full=full):
+            print(f"✓ {line}")
+
+
+def integrity_check():
+    """Find orphaned and duplicate attendance records, optionally repair"""
+    print("🔎 Integrity Check\n")
+
+    from app import create_app
+    from app.maintenance import integrity_report, repair_integrity
+
+    app = create_app()
+
+    with app.app_context():
+        report = integrity_report()
+        labels = {
+            "orphaned_records": "Records without their slot or student",
+            "duplicate_marks": "Duplicate marks (same slot and student)",
+            "orphaned_slots": "Sessions without their room",
+            "wrong_final_counts": "Closed sessions with a wrong final count",
+            "quick_check": "SQLite quick_check",
+        }
+        for key, value in report.items():
+            ok = value == "ok" if key == "quick_check" else not value
+            print(f"{'✓' if ok else '✗'} {labels[key]}: {value}")
+
+        if not (report["orphaned_records"] or report["duplicate_marks"]):
+            return
+
+        confirm = input("\nDelete orphaned records and all but the first duplicate mark? (yes/no): ")
+        if confirm.lower() != 'yes':
+            print("Cancelled.")
+            return
+        orphans, dupes = repair_integrity()
+        print(f"✅ Deleted {orphans} orphaned and {dupes} duplicate records")
+        print("   Run python rebuild_stats.py to bring RoomStats in line.")
+
+
+def upgrade_schema():
+    """Bring a database created by an older version up to the models"""
+    print("⬆️  Upgrade Schema\n")
+
+    # The startup schema check would refuse the old database this upgrades
+    os.environ["SCHEMA_CHECK"] = "off"
+
+    from app import create_app, db
+    from app.migrations import hash_fingerprints, add_missing_columns, unique_marks
+    from app.startup import check_schema
+    from app.tenants import tenants, tenant_context
+
+    app = create_app()
+
+    confirm = input("Migrate every institution's database in place? Back it up first (yes/no): ")
+    if confirm.lower() != 'yes':
+        print("Cancelled.")
+        return
+
+    for key in tenants.keys():
+        with tenant_context(app, key):
+            print(f"[{key}]")
+            db.create_all()
+            print(f"  ✓ Raw device fingerprints hashed: {hash_fingerprints():,} records")
+            added = add_missing_columns()
+            print(f"  ✓ Columns added: {', '.join(added) or 'none'}")
+            dupes = unique_marks()
+            print(f"  ✓ One mark per student and session enforced: {dupes:,} duplicate marks removed")
+            if dupes:
+                print("    Room statistics still count them; run python rebuild_stats.py")
+
+    # Same check as startup: stamps the version now that nothing is missing
+    app.config["SCHEMA_CHECK"] = "create"
+    check_schema(app)
+    print("✅ Schema upgraded. Build the new indexes with option 12.")
+
+
 def main():
     """Main menu"""
     print("=" * 50)
@@ -177,6 +489,16 @@ def main():
     print("3. Create/Promote Teacher User")
     print("4. List All Users")
     print("5. Check Configuration")
+    print("6. Shared Device Report")
+    print("7. Create Term")
+    print("8. Archive Term")
+    print("9. Replay Event Log")
+    print("10. Table & Index Sizes")
+    print("11. Index Health (hot queries)")
+    print("12. Build Missing Indexes (online)")
+    print("13. Vacuum / Analyze")
+    print("14. Integrity Check")
+    print("15. Upgrade Schema (older database)")
     print("0. Exit")
     print()
     
@@ -193,6 +515,26 @@ def main():
         list_users()
     elif choice == '5':
         check_config()
+    elif choice == '6':
+        shared_devices()
+    elif choice == '7':
+        create_term()
+    elif choice == '8':
+        archive_term()
+    elif choice == '9':
+        replay_event_log()
+    elif choice == '10':
+        size_report()
+    elif choice == '11':
+        index_health()
+    elif choice == '12':
+        build_indexes()
+    elif choice == '13':
+        vacuum_database()
+    elif choice == '14':
+        integrity_check()
+    elif choice == '15':
+        upgrade_schema()
     elif choice == '0':
         print("Goodbye!")
         sys.exit(0)
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+#
+# gunicorn -c gunicorn.conf.py run:app
+#
+# preload_app builds the app once in the master: the schema check runs
+# once, and workers fork from a parent that already has the code (and,
+# via warm_up, the lazily imported modules) in memory.
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+# Recycle workers so heap fragmentation cannot creep past the 512 MB budget
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+
+def when_ready(server):
+    if preload_app:
+        from app.startup import warm_up
+        warm_up()
+
+
+def post_fork(server, worker):
+    # Connections must not be shared with the parent; check_schema()
+    # already disposed its pool, this covers anything opened since.
+    if preload_app:
+        from app.tenants import engines
+        from run import app
+
+        with app.app_context():
+            for engine in engines():
+                engine.dispose(close=False)
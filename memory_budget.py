@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Memory budget check
+Seeds a throwaway SQLite database, then measures the peak Python
+allocation (tracemalloc) of each read-heavy endpoint and the process
+RSS. Exits 1 when an endpoint exceeds its budget.
+
+    python memory_budget.py [students] [sessions]
+
+The container has 512 MB; keeping one worker well under ~120 MB RSS
+is what lets gunicorn run 3-4 of them (see WEB_CONCURRENCY).
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+SESSIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+# Peak KB allocated while serving one request
+BUDGETS_KB = {
+    "feed": 512,
+    "export": 512,
+    "history": 512,
+    "room_detail": 1024,
+    "student_dashboard": 512,
+}
+RSS_BUDGET_MB = float(os.getenv("BUDGET_RSS_MB", "120"))
+
+workdir = tempfile.mkdtemp(prefix="attendance-mem-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+os.environ["SCHEDULER_ENABLED"] = "0"
+os.environ["RATELIMIT_ENABLED"] = "0"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Room, AttendanceSlot, AttendanceRecord  # noqa: E402
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def seed():
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {"name": "Teacher", "email": "teacher@bench.local", "role": "teacher", "created_at": now}
+    ] + [
+        {"name": f"Student {i}", "email": f"s{i}@bench.local", "role": "student", "created_at": now}
+        for i in range(STUDENTS)
+    ])
+    teacher_id = User.query.filter_by(email="teacher@bench.local").one().id
+    student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == "student")]
+
+    room = Room(name="Bench Room", created_by=teacher_id)
+    db.session.add(room)
+    db.session.flush()
+
+    start = now - timedelta(days=SESSIONS)
+    db.session.execute(insert(AttendanceSlot), [{
+        "room_id": room.id, "opened_by": teacher_id, "is_active": False,
+        "start_time": start + timedelta(days=d), "end_time": start + timedelta(days=d, minutes=10),
+        "qr_token": f"bench-{d}",
+    } for d in range(SESSIONS)])
+    slot_ids = [sid for (sid,) in db.session.query(AttendanceSlot.id).order_by(AttendanceSlot.id)]
+
+    for d, slot_id in enumerate(slot_ids):
+        stamp = start + timedelta(days=d, minutes=1)
+        db.session.execute(insert(AttendanceRecord), [{
+            "slot_id": slot_id, "student_id": sid, "timestamp": stamp,
+            "fingerprint_hash": f"{sid:064x}", "method": "qr",
+        } for sid in student_ids])
+    db.session.commit()
+    return teacher_id, student_ids[0], room.id, slot_ids[-1]
+
+
+def client_as(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    return client
+
+
+def measure(client, url):
+    """(peak KB, ms) for one request, after a warm-up request."""
+    client.get(url).close()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    resp = client.get(url)
+    for _ in resp.response:         # drain streamed bodies chunk by chunk
+        pass
+    resp.close()
+    elapsed = (time.perf_counter() - t0) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert resp.status_code == 200, (url, resp.status_code)
+    return peak / 1024, elapsed
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        teacher_id, student_id, room_id, slot_id = seed()
+    base_rss = rss_mb()
+
+    teacher = client_as(app, teacher_id)
+    student = client_as(app, student_id)
+    endpoints = {
+        "feed": (teacher, f"/teacher/slots/{slot_id}/feed"),
+        "export": (teacher, f"/teacher/slots/{slot_id}/export"),
+        "history": (student, "/attendance/history"),
+        "room_detail": (student, f"/rooms/{room_id}"),
+        "student_dashboard": (student, "/dashboard"),
+    }
+
+    failed = False
+    print(f"{STUDENTS} students x {SESSIONS} sessions; RSS after seeding {base_rss:.1f} MB")
+    for name, (client, url) in endpoints.items():
+        peak_kb, ms = measure(client, url)
+        ok = peak_kb <= BUDGETS_KB[name]
+        failed |= not ok
+        print(f"  {'✓' if ok else '✗'} {name:18} peak {peak_kb:8.1f} KB  {ms:7.1f} ms  (budget {BUDGETS_KB[name]} KB)")
+
+    rss = rss_mb()
+    ok = rss <= RSS_BUDGET_MB
+    failed |= not ok
+    print(f"  {'✓' if ok else '✗'} {'process RSS':18} {rss:8.1f} MB  (budget {RSS_BUDGET_MB:.0f} MB)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
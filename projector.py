@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Event-log projector
+Applies appended attendance events to the database tables.
+Run alongside gunicorn when EVENT_LOG_PROJECTOR=external, or with
+--replay to rebuild the tables from the whole log. Every tenant's
+log is projected into that tenant's database.
+"""
+
+import sys
+import time
+
+from app import create_app
+from app.eventlog import project, replay
+from app.tenants import tenants, tenant_context, tenant_dir
+
+app = create_app()
+base = app.config["EVENT_LOG_DIR"]
+
+if "--replay" in sys.argv:
+    for key in tenants.keys():
+        with tenant_context(app, key):
+            directory = tenant_dir(base)
+            print(f"Replaying event log in {directory} ...")
+            print(f"✅ Re-applied {replay(directory)} events")
+    sys.exit(0)
+
+print(f"Projecting events from {base} (Ctrl+C to stop)")
+try:
+    while True:
+        applied = 0
+        for key in tenants.keys():
+            with tenant_context(app, key):
+                applied += project(tenant_dir(base))
+        if not applied:
+            time.sleep(0.5)
+except KeyboardInterrupt:
+    print("\nStopped.")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check
+Seeds a throwaway database with app.synthetic, then serves each hot
+request once and records every SQL statement it ran. Each statement
+is EXPLAINed; a request fails when it issues more statements than its
+budget or when a plan scans a whole large table.
+
+    python query_plans.py [--dump DIR] [-v]
+    QUERY_PLAN_DATABASE_URL=postgresql://.../scratch python query_plans.py
+
+The Postgres run drops and recreates every table in that database, and
+plans with enable_seqscan=off: a Seq Scan left in the plan means there
+is no index the planner could use at all.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+workdir = tempfile.mkdtemp(prefix="attendance-plans-")
+os.environ["DATABASE_URL"] = os.getenv("QUERY_PLAN_DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'plans.db')}"
+os.environ["SCHEDULER_ENABLED"] = "0"
+os.environ["RATELIMIT_ENABLED"] = "0"
+os.environ["CACHE_ENABLED"] = "0"           # count the statements a cold request runs
+os.environ["SCHEMA_CHECK"] = "off"
+
+from datetime import datetime, timedelta  # noqa: E402
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.maintenance import explain  # noqa: E402
+from app.models import AttendanceSlot  # noqa: E402
+from app.synthetic import generate  # noqa: E402
+
+# Statements per request
+BUDGETS = {
+    "mark_attendance": 8,
+    "slot_feed": 4,
+    "history": 4,
+    "teacher_dashboard": 9,
+}
+
+# Known full scans, per request: table -> reason
+ALLOWED_SCANS = {
+    "teacher_dashboard": {
+        "users": "enrolled_students() counts every student (cached in production)",
+    },
+}
+
+
+# ---------------------------------------------------------------------
+# CAPTURE
+# ---------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.statements = []
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.statements.append((statement, parameters, executemany))
+
+
+# ---------------------------------------------------------------------
+# SCENARIOS
+# ---------------------------------------------------------------------
+def client_as(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    return client
+
+
+def seed():
+    counts = generate(students=600, teachers=10, rooms=40, sessions=20, roster=60, seed=7)
+    teacher_id = counts["teacher_ids"][0]
+    room_id = counts["room_ids"][0]
+    now = datetime.utcnow()
+    slot = AttendanceSlot(room_id=room_id, opened_by=teacher_id, start_time=now - timedelta(minutes=1),
+                          end_time=now + timedelta(hours=2), is_active=True, qr_token="plans-token")
+    db.session.add(slot)
+    db.session.commit()
+
+    # Fresh statistics so both planners see realistic table sizes
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+    return teacher_id, counts["student_ids"], slot.id
+
+
+def scenarios(app, teacher_id, student_ids, slot_id):
+    teacher = client_as(app, teacher_id)
+    students = iter(student_ids)
+
+    def mark():
+        sid = next(students)
+        return client_as(app, sid).post("/attendance/mark", json={
+            "slot_id": slot_id, "qr_token": "plans-token", "method": "qr", "fingerprint": f"plans-{sid}",
+        })
+
+    history_client = client_as(app, student_ids[-1])
+    return {
+        "mark_attendance": mark,
+        "slot_feed": lambda: teacher.get(f"/teacher/slots/{slot_id}/feed"),
+        "history": lambda: history_client.get("/attendance/history"),
+        "teacher_dashboard": lambda: teacher.get("/teacher/dashboard"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statement counts and EXPLAIN plans of the hot requests")
+    parser.add_argument("--dump", help="write each request's statements and plans to DIR/<dialect>/<name>.txt")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    app = create_app()
+    recorder = Recorder()
+    with app.app_context():
+        if db.engine.dialect.name == "postgresql":
+            db.drop_all()
+        db.create_all()
+        teacher_id, student_ids, slot_id = seed()
+        event.listen(db.engine, "before_cursor_execute", recorder)
+        dialect = db.engine.dialect.name
+
+    failed = False
+    print(f"Query plans on {dialect}:")
+    for name, run in scenarios(app, teacher_id, student_ids, slot_id).items():
+        run().close()                    # warm-up: lazy imports, first-request work
+        recorder.statements = []
+        recorder.active = True
+        resp = run()
+        resp.close()
+        recorder.active = False
+
+        report, scans = [], {}
+        with app.app_context(), db.engine.connect() as conn:
+            for statement, parameters, executemany in recorder.statements:
+                report.append(statement.strip())
+                if executemany or not statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+                    report.append("  (not explained)\n")
+                    continue
+                lines, found = explain(conn, statement, parameters)
+                report.extend("  " + line for line in lines)
+                report.append("")
+                for table in found:
+                    scans.setdefault(table, statement.strip().splitlines()[0][:80])
+
+        count = len(recorder.statements)
+        allowed = ALLOWED_SCANS.get(name, {})
+        bad_scans = {t: s for t, s in scans.items() if t not in allowed}
+        ok = resp.status_code < 400 and count <= BUDGETS[name] and not bad_scans
+        failed |= not ok
+
+        print(f"  {'✓' if ok else '✗'} {name:18} {count:3} statements (budget {BUDGETS[name]})  HTTP {resp.status_code}")
+        for table, first_line in bad_scans.items():
+            print(f"      full scan of {table}: {first_line}")
+        for table in scans.keys() & allowed.keys():
+            print(f"      (allowed) full scan of {table}: {allowed[table]}")
+        if args.verbose:
+            print("\n".join("      " + line for line in report))
+        if args.dump:
+            path = os.path.join(args.dump, dialect, f"{name}.txt")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("\n".join(report) + "\n")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
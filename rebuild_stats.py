@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Aggregate rebuild
+Recomputes every slot's final_count and every room's RoomStats from
+the attendance tables (and archived terms' files), e.g. after an
+import or a bug fix. Partitions run across a process pool;
+progress is checkpointed so an interrupted run picks up where it left
+off when started again.
+
+    python rebuild_stats.py                       # rooms split across all cores
+    python rebuild_stats.py --by term --workers 4
+    python rebuild_stats.py --restart             # ignore an old checkpoint
+
+Safe to run while the app is serving: slots that finish during the
+rebuild are folded in afterwards by the scheduled stats sweep.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+
+from app import create_app  # noqa: E402
+from app.rebuild import Checkpoint, RebuildError, finish, partition_name, plan, run_partition  # noqa: E402
+from app.tenants import tenants, tenant_context, tenant_dir, DEFAULT  # noqa: E402
+
+_app = None
+
+
+def _init_worker():
+    global _app
+    os.environ["SCHEMA_CHECK"] = "off"
+    os.environ["ASSETS_BUILD"] = "never"
+    _app = create_app()
+
+
+def _run(tenant, index, part, as_of):
+    with tenant_context(_app, tenant):
+        started = time.perf_counter()
+        partial, counts = run_partition(part, as_of)
+        counts["seconds"] = round(time.perf_counter() - started, 2)
+    return index, partial, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--by", choices=("room", "term"), default="room",
+                        help="split live slots by room id range or by term dates")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--partitions", type=int, default=0,
+                        help="room partitions (default: 4 per worker)")
+    parser.add_argument("--tenant", default=DEFAULT)
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and start over")
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.tenant not in tenants.keys():
+        sys.exit(f"Unknown tenant {args.tenant!r}")
+
+    with tenant_context(app, args.tenant):
+        checkpoint = Checkpoint(os.path.join(tenant_dir(os.path.join(app.instance_path, "rebuild")),
+                                             "room_stats.json"))
+        state = None if args.restart else checkpoint.load()
+        if state and state["by"] != args.by:
+            sys.exit(f"A --by {state['by']} rebuild is in progress; resume it with --by {state['by']} "
+                     f"or pass --restart")
+        if state:
+            print(f"Resuming rebuild as of {state['as_of']:%Y-%m-%d %H:%M:%S} "
+                  f"({len(state['done'])}/{len(state['parts'])} partitions done)")
+        else:
+            try:
+                parts = plan(args.by, args.partitions or args.workers * 4)
+            except RebuildError as e:
+                sys.exit(f"❌ {e}")
+            state = checkpoint.begin(args.by, parts, datetime.utcnow())
+            print(f"Rebuilding {args.tenant} as of {state['as_of']:%Y-%m-%d %H:%M:%S} "
+                  f"in {len(parts)} partitions on {args.workers} workers")
+
+    # Spawned workers build their own app and engines; nothing is shared with this process
+    started = time.perf_counter()
+    totals = {"slots": 0, "records": 0, "final_counts": 0}
+    pending = checkpoint.pending()
+    if pending:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(pending)), mp_context=context,
+                                 initializer=_init_worker) as pool:
+            futures = [pool.submit(_run, args.tenant, index, part, state["as_of"]) for index, part in pending]
+            for future in as_completed(futures):
+                index, partial, counts = future.result()
+                checkpoint.complete(index, partial, counts)
+                for key in totals:
+                    totals[key] += counts[key]
+                rate = totals["records"] / max(time.perf_counter() - started, 1e-6)
+                print(f"  {len(state['done']):>4}/{len(state['parts'])}  "
+                      f"{partition_name(state['parts'][index]):28} {counts['slots']:>9,} slots "
+                      f"{counts['records']:>11,} records  {counts['seconds']:>7.1f}s   "
+                      f"({rate:,.0f} records/s overall)", flush=True)
+
+    with tenant_context(app, args.tenant):
+        rooms = finish(checkpoint.partials(), state["as_of"])
+    checkpoint.remove()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ RoomStats rebuilt for {rooms:,} rooms; {totals['final_counts']:,} final counts corrected "
+          f"({totals['slots']:,} slots, {totals['records']:,} records this run, {elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume from the checkpoint.")
+        sys.exit(130)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Startup budget check
+Measures, in fresh interpreters, how long `import app`, create_app()
+and the first request take, and that none of the lazily imported
+modules were loaded on the way. Exits 1 when a budget is exceeded.
+
+    python startup_budget.py [runs]
+
+Budgets (ms) can be overridden with BUDGET_IMPORT_MS, BUDGET_CREATE_MS
+and BUDGET_FIRST_REQUEST_MS.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BUDGETS = {
+    "import_ms": float(os.getenv("BUDGET_IMPORT_MS", "300")),
+    "create_ms": float(os.getenv("BUDGET_CREATE_MS", "150")),
+    "first_request_ms": float(os.getenv("BUDGET_FIRST_REQUEST_MS", "100")),
+}
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app()
+t2 = time.perf_counter()
+resp = flask_app.test_client().get("/")
+t3 = time.perf_counter()
+from app.startup import HEAVY_MODULES
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "status": resp.status_code,
+    "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+
+_DB = os.path.join(tempfile.mkdtemp(prefix="attendance-startup-"), "budget.db")
+
+
+def probe():
+    # Throwaway SQLite file: the first probe creates it, the rest hit the version check
+    env = dict(os.environ, SCHEDULER_ENABLED="0", DATABASE_URL=f"sqlite:///{_DB}")
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        sys.exit(2)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    probe()                                     # warm the .pyc / OS caches
+    results = [probe() for _ in range(runs)]
+
+    failed = False
+    print(f"Startup timings, median of {runs} runs:")
+    for key, budget in BUDGETS.items():
+        value = statistics.median(r[key] for r in results)
+        ok = value <= budget
+        failed |= not ok
+        print(f"  {'✓' if ok else '✗'} {key:18} {value:7.1f} ms  (budget {budget:.0f} ms)")
+
+    heavy = sorted({m for r in results for m in r["heavy_loaded"]})
+    if heavy:
+        failed = True
+        print(f"  ✗ loaded at startup: {', '.join(heavy)}")
+    else:
+        print("  ✓ no heavy modules loaded before first use")
+
+    statuses = {r["status"] for r in results}
+    if statuses != {200}:
+        failed = True
+        print(f"  ✗ first request returned {statuses}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()